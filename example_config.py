@@ -6,7 +6,11 @@
 # Copy this file to 'config.py', then edit 'config.py' to
 # set your preferences.
 
-GAME_CHANNEL = '#triviachannel'
+# Channels to play in. Each channel gets its own game, started and stopped
+# separately; questions and scores are shared between them.
+GAME_CHANNELS = ['#triviachannel']
+# or a comma separated list
+# GAME_CHANNELS = ['#triviachannel', '#moretrivia']
 
 # Nick of person running this bot? (the nick included here will be
 # automatically added to the list of ADMINS)
@@ -19,14 +23,80 @@ ADMINS = ['admin']
 
 Q_DIR = './questions/'
 
+# Optional compiled question corpus, built from Q_DIR with
+# utils/compile_corpus.py. If the file exists it is used instead of
+# reading Q_DIR directly. Recompile after editing the question files.
+CORPUS = './questions.corpus'
+
+# How often (in seconds) to check the question files, or the compiled
+# corpus, for changes. Changed files are rescanned in the background and
+# the new questions swapped in without a restart. ?reload checks now.
+# 0 turns the checks off; a question read from a file edited since it was
+# indexed still starts a reload.
+RELOAD_INTERVAL = 60
+
+# Number of questions loaded ahead of time in a background thread, so
+# moving to the next question never waits on disk.
+PREFETCH_DEPTH = 3
+
 SAVE_DIR = './savedata/'
 
+# Score changes are appended to SAVE_DIR/scores.journal in batches every
+# SCORE_COMMIT_INTERVAL seconds, and folded into SAVE_DIR/scores.json every
+# SCORE_COMPACT_INTERVAL seconds (and on ?save and ?stop).
+SCORE_COMMIT_INTERVAL = 5
+SCORE_COMPACT_INTERVAL = 600
+
+# Keep scores in SAVE_DIR/scores.json ('journal') or in an SQLite database,
+# SAVE_DIR/scores.db ('sqlite'). SQLite suits channels with a very large
+# number of players, since it doesn't load every score into memory. A new
+# database imports any existing scores.json.
+SCORE_BACKEND = 'journal'
+
+# Metrics (counters, latency histograms and gauges) are always kept and
+# can be read with ?stats. To export them in the Prometheus text format,
+# name a file to rewrite every METRICS_INTERVAL seconds, and/or a port to
+# serve them on at http://127.0.0.1:<port>/.
+# METRICS_FILE = './savedata/metrics.prom'
+# METRICS_PORT = 9107
+METRICS_INTERVAL = 60
+
+# Flood control, as (rate, burst): each player may send burst guesses (or
+# commands) at once, then rate a second. Lines over the limit are dropped
+# unread and counted; ?flood shows how many. None turns a limit off.
+# Admins are never limited.
+GUESS_FLOOD_LIMIT = (2, 6)
+COMMAND_FLOOD_LIMIT = (0.2, 3)
+
+# How each question fares (asked, solved, after how many clues and how
+# quickly, skipped) is recorded in SAVE_DIR/telemetry. With
+# BALANCE_QUESTIONS, questions nobody solves or that are often skipped are
+# mostly passed over, and those of middling difficulty come up most.
+BALANCE_QUESTIONS = True
+
+# Number of players listed by ?standings. Players outside the top also see
+# their own rank and the players either side of them.
+STANDINGS_SIZE = 10
+
 IDENT_STRING = 'password'
 
-# Time (in seconds) between clues, and the wait time between questions.
-# If ?skip is used, the interval doesn't apply
+# Time (in seconds) between clues.
 WAIT_INTERVAL = 30
 
+# Time (in seconds) to wait after the question and after each of the three
+# clues. Defaults to WAIT_INTERVAL for each.
+# CLUE_INTERVALS = [30, 30, 30, 30]
+
+# Once a question is answered or revealed, the next one is asked after
+# this many seconds, rather than at the next fixed tick.
+POST_WIN_DELAY = 5
+
+# With ADAPTIVE_PACING, a channel that usually answers quickly gets its
+# clues sooner: the wait is 1.5 times the channel's average solve time,
+# but never longer than CLUE_INTERVALS or shorter than MIN_CLUE_INTERVAL.
+ADAPTIVE_PACING = True
+MIN_CLUE_INTERVAL = 10
+
 # Colorize the text so it contrasts with the channel text.
 # This makes it easier to play the game when people are chatting.
 #
@@ -35,7 +105,9 @@ WAIT_INTERVAL = 30
 # A more in-depth explanation is at http://en.wikichip.org/wiki/irc/colors
 COLOR_CODE = '\00308,01'
 
-# How fast will the bot output messages to the channel
+# How fast will the bot output messages to the channel. Game lines are
+# always sent before replies and standings, and short messages to the same
+# place are packed into one line.
 LINE_RATE = 0.4
 
 DEFAULT_NICK = 'triviabot'
@@ -46,3 +118,14 @@ SERVER = 'irc.freenode.net'
 # to your IRC network, you may have to disable SSL or change the server port
 SERVER_PORT = 6667
 USE_SSL = "YES"
+
+# Run several bot processes, each with its own channels or server, for when
+# one process can't keep up. Each entry overrides settings above for one
+# worker; running trivia.py then starts a supervisor that runs the workers
+# and restarts any that crash. Workers share scores through SQLite, so
+# SCORE_BACKEND must be 'sqlite'. A score change reaches the other workers'
+# ?score and ?standings within SCORE_COMMIT_INTERVAL seconds.
+SHARDS = []
+# SHARDS = [{'GAME_CHANNELS': ['#trivia1', '#trivia2']},
+#           {'GAME_CHANNELS': ['#trivia3']},
+#           {'SERVER': 'irc.quakenet.org', 'GAME_CHANNELS': ['#trivia']}]
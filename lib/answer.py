@@ -1,80 +1,219 @@
+import re
+import string
 from random import randrange
 
-class Answer:
+ARTICLES = ('a', 'an', 'the')
+NUMBERS = {'zero': '0', 'one': '1', 'two': '2', 'three': '3', 'four': '4',
+           'five': '5', 'six': '6', 'seven': '7', 'eight': '8', 'nine': '9',
+           'ten': '10', 'eleven': '11', 'twelve': '12'}
+PUNCTUATION = string.maketrans(string.punctuation,
+                               ' ' * len(string.punctuation))
+# A trailing note like "(male)" or "(1979)" that players can leave off.
+PARENTHETICAL = re.compile(r'\s*\([^)]*\)?\s*$')
+MASK = ord('*')
+# Guesses this much longer than the answer are just chat.
+MAX_EXTRA_LENGTH = 16
+# One-word answers shorter than this have to be exact.
+MIN_TYPO_WORD_LENGTH = 8
+
+
+def _words(text):
+    words = text.lower().translate(PUNCTUATION).split()
+    if len(words) > 1 and words[0] in ARTICLES:
+        words = words[1:]
+    return [NUMBERS.get(word, word) for word in words]
+
+
+def normalize(text):
+    '''
+    Reduces an answer or a guess to the form they are compared in: lower
+    case, without punctuation, spaces or a leading article, and with
+    small numbers written as digits.
+    '''
+    return ''.join(_words(text))
+
+
+def typo_limit(length):
+    '''
+    Returns how many typos to forgive in an answer of a given normalized
+    length. Short answers have to be exact.
+    '''
+    if length < 5:
+        return 0
+    elif length < 10:
+        return 1
+    return 2
+
+
+def answer_typo_limit(words):
+    '''
+    Returns how many typos to forgive in a guess at an answer, given the
+    answer's normalized words. Numbers have to be exact, since a digit
+    off is a different number, and so do short one-word answers, where a
+    letter off is often a different word: Iceland and Ireland.
+    '''
+    key = ''.join(words)
+    if len(words) < 2 and len(key) < MIN_TYPO_WORD_LENGTH:
+        return 0
+    if any(character.isdigit() for character in key):
+        return 0
+    return typo_limit(len(key))
+
+
+def within_distance(first, second, limit):
+    '''
+    Returns True if the edit distance between two strings is at most
+    limit. Gives up as soon as every path is over the limit.
+    '''
+    if abs(len(first) - len(second)) > limit:
+        return False
+    previous = range(len(second) + 1)
+    for i, first_character in enumerate(first, start=1):
+        current = [i]
+        for j, second_character in enumerate(second, start=1):
+            current.append(min(previous[j] + 1,
+                               current[j - 1] + 1,
+                               previous[j - 1] +
+                               (first_character != second_character)))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+class Answer(object):
     '''
     This class implements storage for an answer you want to conceal
     and give clues 1 letter at a time.
+
+    The mask is a bytearray, and the positions still hidden are kept in
+    a list, so revealing a letter is a random pick and a swap-pop.
     '''
 
+    __slots__ = ('_answer', '_mask', '_hidden', '_unmasked', '_accepted',
+                 '_typos', '_min_length', '_max_length')
+
     def __init__(self, answer='None'):
-        self._answer = answer
-	# TODO: This is a really inefficient way to go about doing this,
-	# but I can't think of a good way to do this right now.
-        self._masked_answer = str()
-	self._unmasked = 0
-
-        for character in self._answer:
-            if character.isalnum():
-                self._masked_answer += '*'
-            else:
-                self._masked_answer += character
+        self.set_answer(answer)
+
+    def set_answer(self, new_answer):
+        '''
+        Sets a new answer string for the next question to use.
+        '''
+        self._answer = new_answer
+        self._mask = bytearray(new_answer)
+        self._hidden = [index for index, character in enumerate(new_answer)
+                        if character.isalnum()]
+        for index in self._hidden:
+            self._mask[index] = MASK
+        self._unmasked = 0
+
+        # Every form of the answer a guess is accepted in, and how many
+        # typos each forgives.
+        forms = [new_answer]
+        without_note = PARENTHETICAL.sub('', new_answer)
+        if without_note:
+            forms.append(without_note)
+        limits = {}
+        for form in forms:
+            words = _words(form)
+            if words:
+                limits[''.join(words)] = answer_typo_limit(words)
+        self._accepted = set(limits)
+        self._typos = [(accepted, limit)
+                       for accepted, limit in limits.items() if limit]
+        # Normalizing never makes a line longer, so a line shorter than
+        # the shortest accepted form, less typos, can't match.
+        self._min_length = min([len(accepted) - limit
+                                for accepted, limit in limits.items()] or [1])
+        self._max_length = len(new_answer) + MAX_EXTRA_LENGTH
 
     def give_clue(self):
-	'''
-	Returns the masked string after revealing a letter and saving the mask.
-
-	If an answer has only 1-2 characters in it, no clues are given.
-
-	If an answer has 3-4, 1 clue is given.
-
-	If an answer has 5-6, 2 clues are given.
-	'''
-	# If all letters are unmasked, just return it.
-        if self._answer == self._masked_answer:
-            return self._masked_answer
-	elif len(self) < 3:
-	    return self._masked_answer
-	elif len(self) < 5 and self._unmasked == 1:
-	    return self._masked_answer
-	elif len(self) < 7 and self._unmasked == 2:
-	    return self._masked_answer
-
-	# Choose the next letter to unmask.
-	# Start with something to get us into the while loop.
-        letter = ' '
-
-	# If it's a symbol, choose a different letter.
-        while not letter.isalnum():
-	    # We need an index.
-            index = randrange(0, len(self))
-	    # Get the letter at that index from the answer.
-            letter = self._answer[index]
-	    # If the character was already unmasked, or is a symbol.
-            if self._masked_answer[index] == letter:
-                letter = ' '
-
-	# Strings are immutable, so need to split and replace.
-	self._masked_answer = self._masked_answer[:index] + letter + self._masked_answer[index + 1:]
-	self._unmasked += 1
-
-        return self._masked_answer
+        '''
+        Returns the masked string after revealing a letter and saving the mask.
+
+        If an answer has only 1-2 characters in it, no clues are given.
+
+        If an answer has 3-4, 1 clue is given.
+
+        If an answer has 5-6, 2 clues are given.
+        '''
+        # If all letters are unmasked, just return it.
+        if not self._hidden:
+            return self.current_clue()
+        elif len(self) < 3:
+            return self.current_clue()
+        elif len(self) < 5 and self._unmasked == 1:
+            return self.current_clue()
+        elif len(self) < 7 and self._unmasked == 2:
+            return self.current_clue()
+
+        # Pick a hidden position, swap it to the end and pop it.
+        hidden = self._hidden
+        pick = randrange(len(hidden))
+        hidden[pick], hidden[-1] = hidden[-1], hidden[pick]
+        index = hidden.pop()
+        self._mask[index] = self._answer[index]
+        self._unmasked += 1
+
+        return self.current_clue()
+
+    def could_match(self, length):
+        '''
+        Cheap check, on the raw length of a line, for whether it could
+        be a guess at all.
+        '''
+        return self._min_length <= length <= self._max_length
+
+    def matches(self, guess):
+        '''
+        Returns True if a guess is one of the accepted forms of the
+        answer, give or take a typo or two on longer answers without
+        numbers.
+        '''
+        if not self._accepted:
+            # The answer is all punctuation, so it has to be exact.
+            return guess.strip() == self._answer
+        key = normalize(guess)
+        if key in self._accepted:
+            return True
+        for accepted, limit in self._typos:
+            if within_distance(key, accepted, limit):
+                return True
+        return False
+
+    def checkpoint(self):
+        '''
+        Returns the answer and how much of it has been revealed, for
+        restore().
+        '''
+        return {'answer': self._answer,
+                'mask': str(self._mask),
+                'unmasked': self._unmasked,
+                }
+
+    def restore(self, state):
+        '''
+        Sets the answer and its clue back to a checkpoint().
+        '''
+        self.set_answer(state['answer'])
+        self._mask = bytearray(state['mask'])
+        # Revealed letters are never '*', so whatever is still masked is
+        # still hidden.
+        self._hidden = [index for index in self._hidden
+                        if self._mask[index] == MASK]
+        self._unmasked = state['unmasked']
 
     def current_clue(self):
-        return self._masked_answer
-
-    def set_answer(self, new_answer):
-	'''
-	Sets a new answer string for the next question to use.
-	'''
-        self.__init__(answer=new_answer)
+        return str(self._mask)
 
     def _reveal(self):
-	'''
-	Returns the unmasked answer string.
-	'''
+        '''
+        Returns the unmasked answer string.
+        '''
         return self._answer
 
     def __len__(self):
-	return len(self._answer)
+        return len(self._answer)
 
     answer = property(_reveal)
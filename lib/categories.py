@@ -0,0 +1,248 @@
+import json
+import os
+import re
+import tempfile
+from array import array
+from bisect import bisect_right
+from random import random, randrange
+
+from lib.sampler import MAX_PASSES
+
+# The category index is cached next to the question index or corpus it
+# was built from, under the same name with this added.
+CATEGORIES_SUFFIX = '.categories'
+CATEGORIES_VERSION = 2
+# Prefixes shared by fewer questions than this are mostly the start of
+# the question itself, as in "To refuse to approve: ...", so they aren't
+# indexed as categories.
+MIN_CATEGORY_SIZE = 5
+
+# A short prefix ending in ': ', as in "007: what year was..." or
+# "Entertainment: Pulp Fiction: ...". Only the first one counts.
+PREFIX = re.compile(r'\s*([^:?`]{1,30}):\s')
+# A prefix naming the category outright, as in "Category: Sports : ...",
+# is filed under the name it gives.
+WRAPPED = re.compile(r'\s*category\s*:\s*([^:?`]{1,30}):\s', re.IGNORECASE)
+WORD = re.compile(r'[a-z0-9]+')
+
+
+def category_name(text):
+    '''
+    Returns a category name as it is indexed: lower case words joined by
+    hyphens, so "TV / Movies" and "TV/Movies" are both tv-movies.
+    '''
+    return '-'.join(WORD.findall(text.lower()))
+
+
+def category_of(question):
+    '''
+    Returns the category a question is filed under, or None if it has no
+    category prefix.
+    '''
+    match = WRAPPED.match(question) or PREFIX.match(question)
+    if match is None:
+        return None
+    return category_name(match.group(1)) or None
+
+
+class CategoryIndex(object):
+    '''
+    This class maps each category to the ids of its questions.
+
+    The ids of every category are kept back to back, sorted, in one
+    array of 4-byte integers, with starts[n] the position of the nth
+    category's first id, so a category is a slice and picking a random
+    question from it is one index.
+    '''
+
+    def __init__(self, names, starts, ids):
+        self._names = names
+        self._numbers = dict((name, number)
+                             for number, name in enumerate(names))
+        self._starts = starts
+        self._ids = ids
+
+    @classmethod
+    def build(cls, questions, minimum=MIN_CATEGORY_SIZE):
+        '''
+        Reads every question from a question source (anything with len()
+        and get(question_id)) and returns its categories of at least
+        minimum questions. Questions that can't be read are left out.
+        '''
+        grouped = {}
+        for question_id in xrange(len(questions)):
+            question = questions.get(question_id)
+            if question is None:
+                # Its file was edited; the next reload files it.
+                continue
+            name = category_of(question[0])
+            if name is not None:
+                grouped.setdefault(name, array('I')).append(question_id)
+        names = sorted(name for name in grouped
+                       if len(grouped[name]) >= minimum)
+        starts = array('I')
+        ids = array('I')
+        for name in names:
+            starts.append(len(ids))
+            ids.extend(grouped[name])
+        starts.append(len(ids))
+        return cls(names, starts, ids)
+
+    @classmethod
+    def load(cls, path, stamp, minimum=MIN_CATEGORY_SIZE):
+        '''
+        Returns the cached categories, or None if there is no cache or it
+        was built from questions with a different stamp or for another
+        minimum size.
+        '''
+        try:
+            with open(path, 'rb') as handle:
+                header = json.loads(handle.readline())
+                if (header['version'] != CATEGORIES_VERSION or
+                        header['itemsize'] != array('I').itemsize or
+                        header['minimum'] != minimum or
+                        header['stamp'] != json.loads(json.dumps(stamp))):
+                    return None
+                starts = array('I')
+                starts.fromfile(handle, len(header['names']) + 1)
+                ids = array('I')
+                ids.fromfile(handle, header['count'])
+        except (IOError, OSError, ValueError, KeyError, EOFError):
+            return None
+        names = [name.encode('utf-8') for name in header['names']]
+        return cls(names, starts, ids)
+
+    def save(self, path, stamp, minimum=MIN_CATEGORY_SIZE):
+        '''
+        Writes the categories to a file, replaced atomically through a
+        temporary file of this process's own. stamp identifies the
+        questions they were built from, and minimum the smallest category
+        size they were built for.
+        '''
+        header = {'version': CATEGORIES_VERSION,
+                  'itemsize': self._ids.itemsize,
+                  'minimum': minimum,
+                  'stamp': stamp,
+                  'names': self._names,
+                  'count': len(self._ids),
+                  }
+        try:
+            fd, temp_path = tempfile.mkstemp(
+                prefix=os.path.basename(path) + '.', suffix='.tmp',
+                dir=os.path.dirname(path) or '.')
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(json.dumps(header) + '\n')
+                self._starts.tofile(handle)
+                self._ids.tofile(handle)
+            os.rename(temp_path, path)
+        except (IOError, OSError) as e:
+            print("Couldn't save question categories: {}".format(e))
+
+    @classmethod
+    def open(cls, questions, minimum=MIN_CATEGORY_SIZE):
+        '''
+        Returns the categories of a question source, from its cache if
+        that is still valid, otherwise built and cached.
+        '''
+        path = questions.path + CATEGORIES_SUFFIX
+        index = cls.load(path, questions.stamp, minimum)
+        if index is None:
+            print("Building question categories.")
+            index = cls.build(questions, minimum)
+            index.save(path, questions.stamp, minimum)
+        print("{} questions in {} categories.".format(len(index._ids),
+                                                      len(index)))
+        return index
+
+    def size(self, name):
+        number = self._numbers[name]
+        return self._starts[number + 1] - self._starts[number]
+
+    def ids(self, name):
+        '''
+        Returns the sorted ids of a category's questions.
+        '''
+        number = self._numbers[name]
+        return self._ids[self._starts[number]:self._starts[number + 1]]
+
+    def largest(self, count):
+        '''
+        Returns (name, size) for the count categories with the most
+        questions, largest first.
+        '''
+        sizes = [(self.size(name), name) for name in self._names]
+        sizes.sort(key=lambda pair: (-pair[0], pair[1]))
+        return [(name, size) for size, name in sizes[:count]]
+
+    def sampler(self, weights):
+        '''
+        Returns a CategorySampler for {category: weight}. Raises KeyError
+        for a category that doesn't exist, and ValueError for a weight
+        that is NaN, infinite or negative, or if no question has a
+        weight above 0.
+        '''
+        return CategorySampler(self, weights)
+
+    def __contains__(self, name):
+        return name in self._numbers
+
+    def __len__(self):
+        return len(self._names)
+
+
+class CategorySampler(object):
+    '''
+    This class draws random question ids from a few categories.
+
+    A question's chance is proportional to its category's weight, so
+    with equal weights every question in the categories is equally
+    likely, and a weight of 2 makes a category's questions come up twice
+    as often. Drawing is a bisect over the chosen categories and one
+    index into the id array.
+    '''
+
+    def __init__(self, index, weights):
+        self.weights = dict(weights)
+        self._ids = index._ids
+        self._starts = []
+        self._sizes = []
+        self._cumulative = []
+        total = 0.0
+        for name, weight in sorted(self.weights.items()):
+            number = index._numbers[name]
+            size = index._starts[number + 1] - index._starts[number]
+            # The cumulative weights are bisected, so they must be finite
+            # and never decrease.
+            if not 0 <= weight < float('inf'):
+                raise ValueError("Bad weight for {}: {}".format(name, weight))
+            if not size or weight == 0:
+                continue
+            total += size * weight
+            self._starts.append(index._starts[number])
+            self._sizes.append(size)
+            self._cumulative.append(total)
+        if not total:
+            raise ValueError("No questions in {}".format(
+                ", ".join(sorted(self.weights))))
+        self._total = total
+
+    def draw(self, weight=None):
+        '''
+        Returns a random question id from the categories. weight works as
+        for Deck.draw().
+        '''
+        question_id = self._pick()
+        if weight is not None:
+            for i in range(MAX_PASSES):
+                if random() < weight(question_id):
+                    break
+                question_id = self._pick()
+        return question_id
+
+    def _pick(self):
+        slot = bisect_right(self._cumulative, random() * self._total)
+        slot = min(slot, len(self._sizes) - 1)
+        return self._ids[self._starts[slot] + randrange(self._sizes[slot])]
+
+    def __len__(self):
+        return sum(self._sizes)
@@ -0,0 +1,59 @@
+import json
+import os
+import time
+
+CHECKPOINT_VERSION = 1
+# A checkpoint older than this wasn't left by a restart, but by a bot that
+# stopped some time ago, and isn't resumed.
+MAX_AGE = 600
+
+
+def _bytes(value):
+    '''
+    json hands back unicode; the game keeps byte strings. Strings are
+    written as latin-1, so every byte comes back as it was.
+    '''
+    if isinstance(value, unicode):
+        return value.encode('latin-1')
+    if isinstance(value, list):
+        return [_bytes(item) for item in value]
+    if isinstance(value, dict):
+        return dict((_bytes(key), _bytes(item))
+                    for key, item in value.items())
+    return value
+
+
+def save(path, state):
+    '''
+    Writes a checkpoint of the live game state, a dict of things json can
+    hold, replacing any older checkpoint atomically. Returns False if it
+    couldn't be written.
+    '''
+    state = dict(state, version=CHECKPOINT_VERSION, saved_at=time.time())
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as handle:
+            json.dump(state, handle, encoding='latin-1')
+        os.rename(temp_path, path)
+    except (IOError, OSError, ValueError) as e:
+        print("Couldn't save checkpoint: {}".format(e))
+        return False
+    return True
+
+
+def load(path, max_age=MAX_AGE):
+    '''
+    Returns the state saved in a checkpoint and removes the file, so a
+    checkpoint is resumed from at most once. Returns None if there is no
+    checkpoint, or it is too old or from another version.
+    '''
+    try:
+        with open(path, 'rb') as handle:
+            state = _bytes(json.load(handle))
+        os.remove(path)
+    except (IOError, OSError, ValueError):
+        return None
+    if (state.get('version') != CHECKPOINT_VERSION or
+            time.time() - state.get('saved_at', 0) > max_age):
+        return None
+    return state
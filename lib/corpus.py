@@ -0,0 +1,134 @@
+import mmap
+import os
+import struct
+
+# A compiled corpus is laid out as:
+#
+#   header   magic, version, question count
+#   table    (question start, answer start) for each question, plus a
+#            final entry marking the end of the blob
+#   blob     question and answer strings, back to back
+#
+# All offsets are relative to the start of the blob, and all integers
+# are little-endian.
+MAGIC = 'TQC\x00'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+ENTRY = struct.Struct('<II')
+# Two consecutive entries hold everything needed to slice one question.
+LOOKUP = struct.Struct('<III')
+
+
+class CorpusError(Exception):
+    pass
+
+
+def compile_corpus(questions, path):
+    '''
+    Packs every question from a question source (anything with len() and
+    get(question_id), like QuestionIndex) into a compiled corpus file.
+    The file is replaced atomically.
+    '''
+    count = len(questions)
+    entries = []
+    blob = []
+    position = 0
+    for question_id in range(count):
+        pair = questions.get(question_id)
+        if pair is None:
+            raise CorpusError("Question {} could not be read; its file has "
+                              "changed.".format(question_id))
+        question, answer = pair
+        entries.append(ENTRY.pack(position, position + len(question)))
+        blob.append(question)
+        blob.append(answer)
+        position += len(question) + len(answer)
+    entries.append(ENTRY.pack(position, position))
+
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as handle:
+        handle.write(HEADER.pack(MAGIC, VERSION, count))
+        handle.write(''.join(entries))
+        handle.write(''.join(blob))
+    os.rename(temp_path, path)
+    return count
+
+
+class Corpus(object):
+    '''
+    This class reads questions from a compiled corpus file.
+
+    The file is memory-mapped and nothing is parsed up front: looking up
+    a question is one unpack from the offsets table and two slices of the
+    map, so startup and lookup cost don't grow with the corpus.
+    '''
+
+    def __init__(self, path):
+        self._path = path
+        self._stamp = self._stat()
+        with open(path, 'rb') as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, count = HEADER.unpack_from(self._map, 0)
+        except struct.error:
+            magic, version, count = None, None, 0
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise CorpusError("{} is not a compiled question corpus."
+                              .format(path))
+        self._count = count
+        self._table = HEADER.size
+        self._blob = HEADER.size + (count + 1) * ENTRY.size
+
+    def get(self, question_id):
+        '''
+        Returns the (question, answer) pair for a question id.
+        '''
+        if not 0 <= question_id < self._count:
+            raise IndexError(question_id)
+        question_start, answer_start, answer_end = LOOKUP.unpack_from(
+            self._map, self._table + question_id * ENTRY.size)
+        blob = self._blob
+        return (self._map[blob + question_start:blob + answer_start],
+                self._map[blob + answer_start:blob + answer_end])
+
+    # A compiled corpus is replaced whole rather than edited in place, so
+    # a question read from it never goes stale.
+    stale = False
+
+    def _get_path(self):
+        return self._path
+
+    path = property(_get_path)
+
+    def _get_stamp(self):
+        return list(self._stamp)
+
+    stamp = property(_get_stamp)
+
+    def _stat(self):
+        stat = os.stat(self._path)
+        return stat.st_size, stat.st_mtime, stat.st_ino
+
+    def changed(self):
+        '''
+        Returns True if the corpus file has been recompiled since it was
+        opened.
+        '''
+        try:
+            return self._stat() != self._stamp
+        except OSError:
+            return False
+
+    def refresh(self):
+        '''
+        Returns the corpus file opened afresh. This one is left open, so
+        it can keep serving questions meanwhile.
+        '''
+        return Corpus(self._path)
+
+    def close(self):
+        self._map.close()
+
+    def __len__(self):
+        return self._count
@@ -0,0 +1,31 @@
+import string
+
+# Every byte that isn't printable, for str.translate to delete in one
+# pass.
+NON_PRINTABLE = ''.join(character for character in map(chr, range(256))
+                        if character not in string.printable)
+
+
+def sanitize(msg):
+    '''
+    Returns the message with non-printable characters removed.
+    '''
+    return msg.translate(None, NON_PRINTABLE)
+
+
+def parse_command(msg, nickname):
+    '''
+    Returns (command, args) if the message is addressed to the bot,
+    either as "?command args" or "nickname command args". Returns None
+    for anything else, which is chat or a guess.
+    '''
+    if msg.startswith('?'):
+        tokens = msg.replace('?', '').split()
+    elif msg.lstrip().startswith(nickname):
+        # Drop the nickname, with whatever punctuation followed it.
+        tokens = msg.split()[1:]
+    else:
+        return None
+    if not tokens:
+        return None
+    return tokens[0], tokens[1:]
@@ -0,0 +1,88 @@
+import time
+
+# How often (in seconds) users whose buckets have refilled are forgotten.
+SWEEP_INTERVAL = 60
+
+
+class FloodControl(object):
+    '''
+    This class decides which lines from each user the bot acts on, with
+    a token bucket per user for each kind of line.
+
+    limits maps each kind to (rate, burst): a user may send burst lines
+    of that kind at once, then rate lines a second. Kinds without a limit
+    are always allowed.
+
+    Each bucket is a three item list of tokens, when it was last used and
+    how many lines it has shed. A user whose bucket has refilled is no
+    different from one never seen, so such buckets are dropped now and
+    then, and only users who spoke in the last few seconds take memory.
+    '''
+
+    def __init__(self, limits, clock=time.time):
+        self._clock = clock
+        self._limits = {}
+        for kind, limit in limits.items():
+            if limit is not None:
+                rate, burst = limit
+                self._limits[kind] = (float(rate), float(burst), {})
+        self._next_sweep = clock() + SWEEP_INTERVAL
+        self.shed = dict((kind, 0) for kind in self._limits)
+
+    def allow(self, user, kind):
+        '''
+        Returns True if a line of a kind from user should be handled,
+        taking a token for it, or False if it should be dropped.
+        '''
+        limit = self._limits.get(kind)
+        if limit is None:
+            return True
+        rate, burst, buckets = limit
+        now = self._clock()
+        bucket = buckets.get(user)
+        if bucket is None:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            buckets[user] = [burst - 1, now, 0]
+            return True
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return True
+        bucket[0] = tokens
+        bucket[2] += 1
+        self.shed[kind] += 1
+        return False
+
+    def _sweep(self, now):
+        '''
+        Forgets every bucket that has refilled.
+        '''
+        self._next_sweep = now + SWEEP_INTERVAL
+        for rate, burst, buckets in self._limits.values():
+            for user, bucket in buckets.items():
+                if bucket[0] + (now - bucket[1]) * rate >= burst:
+                    del buckets[user]
+
+    def users(self):
+        '''
+        Returns how many users have a bucket.
+        '''
+        users = set()
+        for rate, burst, buckets in self._limits.values():
+            users.update(buckets)
+        return len(users)
+
+    def worst(self, count):
+        '''
+        Returns (user, lines shed) for the count users still tracked who
+        have had the most lines shed, most first.
+        '''
+        shed = {}
+        for rate, burst, buckets in self._limits.values():
+            for user, bucket in buckets.items():
+                if bucket[2]:
+                    shed[user] = shed.get(user, 0) + bucket[2]
+        worst = sorted(shed.items(), key=lambda pair: (-pair[1], pair[0]))
+        return worst[:count]
@@ -0,0 +1,229 @@
+from random import random
+
+MAX_LEVELS = 32
+
+
+class _Node(object):
+    __slots__ = ('value', 'next', 'width')
+
+    def __init__(self, value, levels):
+        self.value = value
+        self.next = [None] * levels
+        # width[level] is how many positions next[level] is ahead.
+        self.width = [1] * levels
+
+
+class IndexableSkiplist(object):
+    '''
+    A sorted collection that can also be indexed by position.
+
+    Each link remembers how many positions it skips, so insert, remove,
+    finding the value at a position and finding the position of a value
+    are all O(log n).
+    '''
+
+    def __init__(self, sorted_values=()):
+        self._size = 0
+        self._head = _Node(None, MAX_LEVELS)
+        self._build(sorted_values)
+
+    def _build(self, sorted_values):
+        '''
+        Links up already sorted values in O(n), which is much quicker than
+        inserting them one at a time.
+        '''
+        last = [self._head] * MAX_LEVELS
+        last_position = [0] * MAX_LEVELS
+        position = 0
+        for position, value in enumerate(sorted_values, start=1):
+            node = _Node(value, self._random_levels())
+            for level in range(len(node.next)):
+                last[level].next[level] = node
+                last[level].width[level] = position - last_position[level]
+                last[level] = node
+                last_position[level] = position
+        for level in range(MAX_LEVELS):
+            last[level].width[level] = position + 1 - last_position[level]
+        self._size = position
+
+    def _random_levels(self):
+        levels = 1
+        while levels < MAX_LEVELS and random() < 0.5:
+            levels += 1
+        return levels
+
+    def insert(self, value):
+        chain = [None] * MAX_LEVELS
+        steps_at_level = [0] * MAX_LEVELS
+        node = self._head
+        for level in reversed(range(MAX_LEVELS)):
+            while (node.next[level] is not None and
+                   node.next[level].value <= value):
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        levels = self._random_levels()
+        new_node = _Node(value, levels)
+        steps = 0
+        for level in range(levels):
+            previous = chain[level]
+            new_node.next[level] = previous.next[level]
+            previous.next[level] = new_node
+            new_node.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, MAX_LEVELS):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, value):
+        chain = [None] * MAX_LEVELS
+        node = self._head
+        for level in reversed(range(MAX_LEVELS)):
+            while (node.next[level] is not None and
+                   node.next[level].value < value):
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.value != value:
+            raise KeyError(value)
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def _node_at(self, index):
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        node = self._head
+        # The head sits at position 0, so the item at index i is at
+        # position i + 1.
+        remaining = index + 1
+        for level in reversed(range(MAX_LEVELS)):
+            while (node.next[level] is not None and
+                   node.width[level] <= remaining):
+                remaining -= node.width[level]
+                node = node.next[level]
+        return node
+
+    def index(self, value):
+        '''
+        Returns the position of a value.
+        '''
+        node = self._head
+        position = 0
+        for level in reversed(range(MAX_LEVELS)):
+            while (node.next[level] is not None and
+                   node.next[level].value < value):
+                position += node.width[level]
+                node = node.next[level]
+        if node.next[0] is None or node.next[0].value != value:
+            raise ValueError(value)
+        return position
+
+    def slice(self, start, stop):
+        '''
+        Returns the values from position start up to stop, in order.
+        '''
+        start = max(start, 0)
+        stop = min(stop, self._size)
+        if start >= stop:
+            return []
+        node = self._node_at(start)
+        values = []
+        for i in range(stop - start):
+            values.append(node.value)
+            node = node.next[0]
+        return values
+
+    def __getitem__(self, index):
+        return self._node_at(index).value
+
+    def __len__(self):
+        return self._size
+
+
+class Leaderboard(object):
+    '''
+    This class maps players to scores and keeps them ranked as scores
+    change, so the top of the standings, a player's rank and the players
+    around them can be found in O(log n) without sorting.
+
+    Players are ranked by score, then by name, both descending.
+    '''
+
+    def __init__(self, scores=()):
+        self._scores = dict(scores)
+        # Holds (score, name), lowest first. Rank 1 is the last entry.
+        self._ranking = IndexableSkiplist(
+            sorted((score, name) for name, score in self._scores.items()))
+
+    def __setitem__(self, name, score):
+        old_score = self._scores.get(name)
+        if old_score is not None:
+            self._ranking.remove((old_score, name))
+        self._scores[name] = score
+        self._ranking.insert((score, name))
+
+    def __delitem__(self, name):
+        self._ranking.remove((self._scores.pop(name), name))
+
+    def get(self, name, default=None):
+        return self._scores.get(name, default)
+
+    def items(self):
+        return self._scores.items()
+
+    def rank(self, name):
+        '''
+        Returns a player's (rank, score), or None if they haven't scored.
+        '''
+        score = self._scores.get(name)
+        if score is None:
+            return None
+        return len(self._ranking) - self._ranking.index((score, name)), score
+
+    def _ranks(self, first, last):
+        '''
+        Returns (rank, name, score) for ranks first to last inclusive.
+        '''
+        size = len(self._ranking)
+        entries = self._ranking.slice(size - last, size - first + 1)
+        ranked = []
+        rank = min(last, size)
+        for score, name in entries:
+            ranked.append((rank, name, score))
+            rank -= 1
+        ranked.reverse()
+        return ranked
+
+    def top(self, count=None):
+        '''
+        Returns the (player, score) pairs of the top count players, or of
+        every player if count is None, best first.
+        '''
+        if count is None:
+            count = len(self._ranking)
+        return [(name, score) for rank, name, score in self._ranks(1, count)]
+
+    def around(self, name, distance=2):
+        '''
+        Returns (rank, player, score) for a player and up to distance
+        players either side of them, best first.
+        '''
+        standing = self.rank(name)
+        if standing is None:
+            return []
+        rank = standing[0]
+        return self._ranks(max(rank - distance, 1), rank + distance)
+
+    def __contains__(self, name):
+        return name in self._scores
+
+    def __len__(self):
+        return len(self._scores)
@@ -0,0 +1,206 @@
+import os
+from bisect import bisect_left
+
+# Histogram bucket upper bounds, in seconds.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = 'triviabot_'
+
+
+class Counter(object):
+    '''
+    A number that only goes up.
+    '''
+
+    __slots__ = ('name', 'help', 'value')
+    kind = 'counter'
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge(object):
+    '''
+    A number that goes up and down. If read is given, it is called for
+    the value whenever the gauge is read, so nothing is recorded in the
+    hot path at all.
+    '''
+
+    __slots__ = ('name', 'help', 'value', '_read')
+    kind = 'gauge'
+
+    def __init__(self, name, help, read=None):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._read = read
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        if self._read is not None:
+            return self._read()
+        return self.value
+
+
+class Histogram(object):
+    '''
+    Counts observations in fixed buckets. Observing is one bisect and a
+    few additions.
+    '''
+
+    __slots__ = ('name', 'help', 'buckets', 'counts', 'count', 'sum', 'max')
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # The last count is for observations above every bucket.
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, fraction):
+        '''
+        Returns the upper bound of the bucket holding the given quantile,
+        or the largest observation if it is above every bucket.
+        '''
+        if not self.count:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= wanted:
+                return bound
+        return self.max
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+
+class Registry(object):
+    '''
+    This class holds the bot's metrics, by name. Asking for a metric that
+    already exists returns it, so anything can look up what it records
+    to.
+    '''
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _get(self, cls, name, *args):
+        try:
+            return self._metrics[name]
+        except KeyError:
+            metric = self._metrics[name] = cls(name, *args)
+            return metric
+
+    def counter(self, name, help=''):
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help='', read=None):
+        return self._get(Gauge, name, help, read)
+
+    def histogram(self, name, help='', buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help, buckets)
+
+    def __iter__(self):
+        return iter(sorted(self._metrics.values(), key=lambda m: m.name))
+
+    def summary(self):
+        '''
+        Returns a few short lines describing every metric, for ?stats.
+        '''
+        counters = []
+        gauges = []
+        lines = []
+        for metric in self:
+            if metric.kind == 'counter':
+                counters.append('{} {}'.format(metric.name, metric.value))
+            elif metric.kind == 'gauge':
+                gauges.append('{} {}'.format(metric.name, metric.get()))
+            else:
+                lines.append('{}: {} seen, mean {:.2f}ms, p99 under '
+                             '{:.2f}ms, max {:.2f}ms'.format(
+                                 metric.name, metric.count,
+                                 metric.mean() * 1000,
+                                 metric.quantile(0.99) * 1000,
+                                 metric.max * 1000))
+        return [', '.join(counters), ', '.join(gauges)] + lines
+
+    def prometheus(self):
+        '''
+        Returns every metric in the Prometheus text exposition format.
+        '''
+        lines = []
+        for metric in self:
+            name = PREFIX + metric.name
+            if metric.kind == 'counter':
+                name += '_total'
+            lines.append('# HELP {} {}'.format(name, metric.help))
+            lines.append('# TYPE {} {}'.format(name, metric.kind))
+            if metric.kind == 'counter':
+                lines.append('{} {}'.format(name, metric.value))
+            elif metric.kind == 'gauge':
+                lines.append('{} {}'.format(name, metric.get()))
+            else:
+                cumulative = 0
+                for bound, count in zip(metric.buckets, metric.counts):
+                    cumulative += count
+                    lines.append('{}_bucket{{le="{}"}} {}'.format(
+                        name, bound, cumulative))
+                lines.append('{}_bucket{{le="+Inf"}} {}'.format(
+                    name, metric.count))
+                lines.append('{}_sum {}'.format(name, metric.sum))
+                lines.append('{}_count {}'.format(name, metric.count))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        '''
+        Writes the Prometheus text to a file, replacing it atomically so a
+        scraper never reads half of it.
+        '''
+        temp_path = path + '.tmp'
+        try:
+            with open(temp_path, 'w') as handle:
+                handle.write(self.prometheus())
+            os.rename(temp_path, path)
+        except (IOError, OSError) as e:
+            print("Couldn't write metrics: {}".format(e))
+
+
+def serve(registry, port):
+    '''
+    Serves the registry as Prometheus text on localhost. twisted.web is
+    only imported if this is used.
+    '''
+    from twisted.internet import reactor
+    from twisted.web.resource import Resource
+    from twisted.web.server import Site
+
+    class MetricsResource(Resource):
+        isLeaf = True
+
+        def render_GET(self, request):
+            request.setHeader('Content-Type', 'text/plain; version=0.0.4')
+            return registry.prometheus()
+
+    return reactor.listenTCP(port, Site(MetricsResource()),
+                             interface='127.0.0.1')
+
@@ -0,0 +1,210 @@
+import re
+import zlib
+from array import array
+from itertools import izip
+
+from lib.answer import PUNCTUATION, normalize, typo_limit, within_distance
+
+# A leading category like "007:" or "80s TV:" that merged corpora add to
+# the same question in different ways.
+CATEGORY = re.compile(r'^(?:[^:?]{1,30}:)+\s*')
+NUMBER = re.compile(r'\d+')
+SHINGLE_SIZE = 4
+# Signature length. Signatures are split into BANDS bands; two questions
+# become candidates if any band matches exactly.
+BINS = 32
+BANDS = 8
+# Candidates are checked against at most this many earlier questions per
+# band, so a crowded bucket can't make the search quadratic.
+BUCKET_CHECKS = 8
+EMPTY = 0xffffffff
+
+
+def normalize_question(text):
+    '''
+    Reduces a question to the text that is compared: no category prefix,
+    lower case, no punctuation and single spaces.
+    '''
+    text = CATEGORY.sub('', text, count=1)
+    return ' '.join(text.lower().translate(PUNCTUATION).split())
+
+
+def signature(text, bins=BINS):
+    '''
+    Returns the MinHash signature of a question's character shingles, as
+    an array of bins unsigned ints.
+
+    This is one-permutation hashing: each shingle is hashed once, the
+    hash picks a bin, and each bin keeps its smallest value. Empty bins
+    borrow from the next bin that isn't, so short questions still get a
+    full signature.
+    '''
+    minimums = [EMPTY] * bins
+    text = normalize_question(text)
+    for start in range(max(1, len(text) - SHINGLE_SIZE + 1)):
+        value = zlib.crc32(text[start:start + SHINGLE_SIZE]) & 0xffffffff
+        position = value % bins
+        value //= bins
+        if value < minimums[position]:
+            minimums[position] = value
+    if EMPTY in minimums:
+        # Walk backwards twice round, so every empty bin has seen the
+        # next filled one, wrapping at the end.
+        donor = None
+        filled = list(minimums)
+        for i in reversed(range(2 * bins)):
+            position = i % bins
+            if filled[position] != EMPTY:
+                donor = position
+            elif i < bins and donor is not None:
+                # Offset borrowed values by distance, so two signatures
+                # only agree on a borrowed bin if they'd agree anyway.
+                minimums[position] = (filled[donor] +
+                                      (donor - position) % bins *
+                                      0x9e3779b1) & 0xffffffff
+    return array('I', minimums)
+
+
+def similarity(first, second):
+    '''
+    Estimates the Jaccard similarity of two questions from their
+    signatures.
+    '''
+    return (sum(1 for a, b in izip(first, second) if a == b) /
+            float(len(first)))
+
+
+def numbers(text):
+    '''
+    Returns the numbers in a normalized question. Template questions
+    ("born on 01 June", "born on 02 June") differ only in these, so
+    questions with different numbers are never duplicates.
+    '''
+    return ' '.join(NUMBER.findall(text))
+
+
+def same_answer(first, second):
+    '''
+    Returns True if two normalized answers are the same, allowing for
+    the typos a guess would be forgiven.
+    '''
+    if first == second:
+        return True
+    return within_distance(first, second,
+                           typo_limit(min(len(first), len(second))))
+
+
+class UnionFind(object):
+    '''
+    Disjoint sets over the integers 0 to n - 1.
+    '''
+
+    def __init__(self):
+        self._parents = array('L')
+
+    def add(self):
+        self._parents.append(len(self._parents))
+        return len(self._parents) - 1
+
+    def find(self, item):
+        parents = self._parents
+        root = item
+        while parents[root] != root:
+            root = parents[root]
+        while parents[item] != root:
+            parents[item], item = root, parents[item]
+        return root
+
+    def union(self, first, second):
+        '''
+        Joins two sets, keeping the lower root so the earliest item
+        stays the representative. Returns False if they were already
+        joined.
+        '''
+        first = self.find(first)
+        second = self.find(second)
+        if first == second:
+            return False
+        if second < first:
+            first, second = second, first
+        self._parents[second] = first
+        return True
+
+
+class NearDuplicateIndex(object):
+    '''
+    This class groups questions that are near-duplicates: their question
+    text is at least threshold similar, they mention the same numbers and
+    their answers match as a guess would.
+
+    Questions are bucketed by signature band (locality-sensitive
+    hashing), so each new question is only compared with the few
+    earlier ones sharing a bucket, not with every question. A question
+    joins a group only if it is close to the group's first question, so
+    groups can't drift through a chain of small differences.
+    '''
+
+    def __init__(self, threshold=0.85, bins=BINS, bands=BANDS):
+        if bins % bands:
+            raise ValueError("bins must be a multiple of bands")
+        self.threshold = threshold
+        self._bins = bins
+        self._bands = bands
+        self._rows = bins // bands
+        self._signatures = array('I')
+        self._answers = []
+        self._numbers = []
+        self._buckets = {}
+        self._sets = UnionFind()
+
+    def add(self, question, answer, sig=None):
+        '''
+        Adds a question and its answer, and returns its number. The
+        signature can be passed in if it was worked out elsewhere.
+        '''
+        if sig is None:
+            sig = signature(question)
+        number = self._sets.add()
+        answer = normalize(answer)
+        found = numbers(normalize_question(question))
+        self._signatures.extend(sig)
+        self._answers.append(answer)
+        self._numbers.append(found)
+        rows = self._rows
+        for band in range(self._bands):
+            key = (hash(tuple(sig[band * rows:(band + 1) * rows])), band)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._buckets[key] = number
+                continue
+            if not isinstance(bucket, list):
+                bucket = self._buckets[key] = [bucket]
+            if self._sets.find(number) == number:
+                for other in bucket[-BUCKET_CHECKS:]:
+                    root = self._sets.find(other)
+                    if (self._numbers[root] == found and
+                            similarity(sig, self._signature(root)) >=
+                            self.threshold and
+                            same_answer(answer, self._answers[root])):
+                        self._sets.union(number, root)
+                        break
+            bucket.append(number)
+        return number
+
+    def _signature(self, number):
+        return self._signatures[number * self._bins:
+                                (number + 1) * self._bins]
+
+    def clusters(self):
+        '''
+        Returns every group of two or more near-duplicates, as lists of
+        question numbers in the order they were added. The first of each
+        is the one to keep.
+        '''
+        groups = {}
+        for number in range(len(self._answers)):
+            groups.setdefault(self._sets.find(number), []).append(number)
+        return sorted(group for group in groups.values() if len(group) > 1)
+
+    def __len__(self):
+        return len(self._answers)
@@ -0,0 +1,226 @@
+import time
+from collections import deque
+
+# Message priorities, most urgent first.
+GAME = 0
+REPLY = 1
+BULK = 2
+PRIORITIES = (GAME, REPLY, BULK)
+
+# IRC lines are at most 512 bytes, including the command and the trailing
+# CRLF. Servers prepend our nick!user@host when relaying a line, so room
+# is left for that too.
+MAX_LINE = 512
+PREFIX_ALLOWANCE = 100
+SEPARATOR = ' | '
+# CTCP queries, such as an ACTION, start with this and must be a line of
+# their own.
+CTCP_DELIMITER = '\x01'
+
+
+def payload_limit(dest):
+    '''
+    Returns how many bytes of text fit in one PRIVMSG to dest.
+    '''
+    return (MAX_LINE - PREFIX_ALLOWANCE -
+            len('PRIVMSG {} :\r\n'.format(dest)))
+
+
+class _Message(object):
+    __slots__ = ('dest', 'text', 'key', 'queued', 'tracked', 'dropped')
+
+    def __init__(self, dest, text, key, queued, tracked):
+        self.dest = dest
+        self.text = text
+        self.key = key
+        self.queued = queued
+        self.tracked = tracked
+        self.dropped = False
+
+
+class OutputScheduler(object):
+    '''
+    This class sits between the game and the IRC connection and decides
+    what to send next, one line every line_rate seconds.
+
+    Messages wait in one queue per priority, so game lines never wait
+    behind standings or help replies. Consecutive messages to the same
+    destination are packed into one line, up to the IRC line limit.
+    Messages can carry a key; queueing a message with a key drops any
+    older unsent messages with the same key and destination, so stale
+    clues are never sent. CTCP messages are never packed.
+
+    send(dest, text) writes a line, and call_later(delay, f) schedules f,
+    like reactor.callLater. If given, observe(seconds) is called with how
+    long each line's first message waited.
+    '''
+
+    def __init__(self, send, call_later, line_rate, clock=time.time,
+                 observe=None):
+        self._send = send
+        self._call_later = call_later
+        self._line_rate = line_rate
+        self._clock = clock
+        self._observe = observe
+        self._queues = [deque() for priority in PRIORITIES]
+        self._keyed = {}
+        self._pending = None
+        self._last_sent = None
+        # Dropped messages stay queued until they reach the front.
+        self._dropped_queued = 0
+        self.lines_sent = 0
+        self.messages_sent = 0
+        self.messages_dropped = 0
+        self.tracked_count = 0
+        self.tracked_last = 0.0
+        self.tracked_max = 0.0
+        self._tracked_total = 0.0
+
+    def enqueue(self, dest, text, priority=REPLY, key=None, tracked=False):
+        '''
+        Queues a message. If tracked is set, the time it spends queued is
+        recorded, to measure how quickly questions reach the channel.
+        '''
+        if key is not None:
+            self.drop(dest, key)
+        message = _Message(dest, text, key, self._clock(), tracked)
+        self._queues[priority].append(message)
+        if key is not None:
+            self._keyed.setdefault((dest, key), []).append(message)
+        self._schedule()
+
+    def enqueue_all(self, dest, texts, priority=REPLY, key=None):
+        '''
+        Queues several messages as one reply: queueing another reply with
+        the same key and destination drops all of them, if unsent.
+        '''
+        if key is not None:
+            self.drop(dest, key)
+        queue = self._queues[priority]
+        now = self._clock()
+        for text in texts:
+            message = _Message(dest, text, key, now, False)
+            queue.append(message)
+            if key is not None:
+                self._keyed.setdefault((dest, key), []).append(message)
+        self._schedule()
+
+    def pending(self, dest, key):
+        '''
+        Returns True if a message with a key is waiting to go to dest.
+        '''
+        return (dest, key) in self._keyed
+
+    def drop(self, dest, key):
+        '''
+        Drops every unsent message with a key, for a destination.
+        '''
+        for message in self._keyed.pop((dest, key), ()):
+            if not message.dropped:
+                message.dropped = True
+                self.messages_dropped += 1
+                self._dropped_queued += 1
+
+    def _schedule(self):
+        if self._pending is not None:
+            return
+        if self._last_sent is None:
+            delay = 0
+        else:
+            delay = max(0, self._last_sent + self._line_rate - self._clock())
+        self._pending = self._call_later(delay, self._send_next)
+
+    def _next_message(self, queue):
+        while queue:
+            message = queue.popleft()
+            if not message.dropped:
+                return message
+            self._dropped_queued -= 1
+        return None
+
+    def _unkey(self, message):
+        if message.key is None:
+            return
+        keyed = self._keyed.get((message.dest, message.key))
+        if keyed is not None:
+            keyed.remove(message)
+            if not keyed:
+                del self._keyed[(message.dest, message.key)]
+
+    def _send_next(self):
+        self._pending = None
+        for queue in self._queues:
+            first = self._next_message(queue)
+            if first is not None:
+                break
+        else:
+            return
+
+        # Pack in the messages queued behind it for the same destination.
+        messages = [first]
+        limit = payload_limit(first.dest)
+        length = len(first.text)
+        while queue and not first.text.startswith(CTCP_DELIMITER):
+            following = queue[0]
+            if following.dropped:
+                queue.popleft()
+                self._dropped_queued -= 1
+                continue
+            if (following.dest != first.dest or
+                    following.text.startswith(CTCP_DELIMITER) or
+                    length + len(SEPARATOR) + len(following.text) > limit):
+                break
+            queue.popleft()
+            messages.append(following)
+            length += len(SEPARATOR) + len(following.text)
+
+        now = self._clock()
+        for message in messages:
+            self._unkey(message)
+            if message.tracked:
+                delay = now - message.queued
+                self.tracked_count += 1
+                self.tracked_last = delay
+                self.tracked_max = max(self.tracked_max, delay)
+                self._tracked_total += delay
+        self._send(first.dest, SEPARATOR.join(message.text
+                                              for message in messages))
+        self._last_sent = now
+        if self._observe is not None:
+            self._observe(now - first.queued)
+        self.lines_sent += 1
+        self.messages_sent += len(messages)
+        if any(self._queues):
+            self._schedule()
+
+    def stop(self):
+        '''
+        Cancels the next send. Queued messages are kept.
+        '''
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+
+    def depth(self):
+        '''
+        Returns how many messages are waiting to be sent.
+        '''
+        return (sum(len(queue) for queue in self._queues) -
+                self._dropped_queued)
+
+    def stats(self):
+        '''
+        Returns a dict of numbers for monitoring the output queue.
+        '''
+        if self.tracked_count:
+            tracked_mean = self._tracked_total / self.tracked_count
+        else:
+            tracked_mean = 0.0
+        return {'depth': self.depth(),
+                'lines_sent': self.lines_sent,
+                'messages_sent': self.messages_sent,
+                'messages_dropped': self.messages_dropped,
+                'question_delay_last': self.tracked_last,
+                'question_delay_mean': tracked_mean,
+                'question_delay_max': self.tracked_max,
+                }
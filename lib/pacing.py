@@ -0,0 +1,50 @@
+class Pacer(object):
+    '''
+    This class decides how long to wait before each clue.
+
+    intervals gives the configured wait after the question and after each
+    clue. With adaptive pacing, a channel that usually answers quickly
+    gets shorter waits: never longer than configured, and never shorter
+    than minimum. How quickly a channel answers is tracked as a moving
+    average of solve times, where an unsolved question counts as the
+    whole time it was up.
+    '''
+
+    # Wait this many times the usual solve time before the next clue.
+    FACTOR = 1.5
+    # How much each new solve time moves the average.
+    WEIGHT = 0.2
+
+    def __init__(self, intervals, minimum, adaptive=True):
+        self._intervals = list(intervals)
+        self._minimum = minimum
+        self._adaptive = adaptive
+        self.typical = None
+
+    def _record(self, seconds):
+        if self.typical is None:
+            self.typical = float(seconds)
+        else:
+            self.typical += self.WEIGHT * (seconds - self.typical)
+
+    def solved(self, seconds):
+        '''
+        Records that a question was answered, seconds after it was asked.
+        '''
+        self._record(seconds)
+
+    def unsolved(self, seconds):
+        '''
+        Records that a question went unanswered for seconds.
+        '''
+        self._record(seconds)
+
+    def delay(self, clue_number):
+        '''
+        Returns how long to wait after giving clue_number clues (0 being
+        just the question) before the next step.
+        '''
+        interval = self._intervals[min(clue_number, len(self._intervals) - 1)]
+        if not self._adaptive or self.typical is None:
+            return interval
+        return min(interval, max(self._minimum, self.typical * self.FACTOR))
@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import deque
+
+from twisted.internet.threads import deferToThread
+
+
+class QuestionPrefetcher(object):
+    '''
+    This class keeps a small buffer of questions ready to ask, so the
+    reactor never waits on disk when moving to the next question.
+
+    fetch is called in a worker thread and returns a
+    (question_id, question, answer) tuple. Calls to fetch are serialized,
+    so it doesn't need to be thread safe itself.
+
+    Each reset() starts a new generation; questions fetched for an
+    earlier generation are thrown away when they arrive.
+
+    If given, observe(seconds) is called with how long each fetch took,
+    always on the reactor thread, so it needn't be thread safe.
+    '''
+
+    def __init__(self, fetch, depth=3, observe=None):
+        self._fetch = fetch
+        self._depth = depth
+        self._observe = observe
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._refilling = False
+        self.generation = 0
+        self.misses = 0
+        self.refills = 0
+        self.last_refill_latency = 0.0
+        self._total_refill_latency = 0.0
+
+    def _fetch_one(self):
+        '''
+        Returns a question and how long fetching it took.
+        '''
+        with self._lock:
+            start = time.time()
+            question = self._fetch()
+            return question, time.time() - start
+
+    def _fetch_many(self, count, generation):
+        '''
+        Runs in a worker thread. Returns the fetched questions, how long
+        each took, how long fetching them all took and the generation
+        they were fetched for.
+        '''
+        start = time.time()
+        fetched = [self._fetch_one() for i in range(count)]
+        questions = [question for question, seconds in fetched]
+        seconds = [seconds for question, seconds in fetched]
+        return questions, seconds, time.time() - start, generation
+
+    def fill(self):
+        '''
+        Starts topping up the buffer in the background, unless it is full
+        or a refill is already running.
+        '''
+        wanted = self._depth - len(self._buffer)
+        if self._refilling or wanted <= 0:
+            return
+        self._refilling = True
+        d = deferToThread(self._fetch_many, wanted, self.generation)
+        d.addCallbacks(self._filled, self._failed)
+
+    def _filled(self, result):
+        questions, seconds, latency, generation = result
+        self._refilling = False
+        if self._observe is not None:
+            for fetch_seconds in seconds:
+                self._observe(fetch_seconds)
+        if generation != self.generation:
+            # Fetched from questions that have since been replaced.
+            self.fill()
+            return
+        self._buffer.extend(questions)
+        self.refills += 1
+        self.last_refill_latency = latency
+        self._total_refill_latency += latency
+
+    def _failed(self, failure):
+        self._refilling = False
+        print("Question prefetch failed: {}".format(failure.getErrorMessage()))
+
+    def get(self):
+        '''
+        Returns the next (question_id, question, answer) tuple. Only reads
+        from disk on the calling thread if the buffer has run dry.
+        '''
+        try:
+            question = self._buffer.popleft()
+        except IndexError:
+            self.misses += 1
+            question, seconds = self._fetch_one()
+            if self._observe is not None:
+                self._observe(seconds)
+        self.fill()
+        return question
+
+    def buffered(self):
+        '''
+        Returns the questions waiting in the buffer. They have already
+        been drawn, so a restart saves them to be asked afterwards.
+        '''
+        return list(self._buffer)
+
+    def restore(self, questions):
+        '''
+        Puts questions saved by buffered() back at the front of the
+        buffer.
+        '''
+        self._buffer.extendleft(reversed(questions))
+
+    def clear(self):
+        '''
+        Drops every buffered question.
+        '''
+        self._buffer.clear()
+
+    def reset(self, swap):
+        '''
+        Calls swap() while no fetch is running, so whatever fetch reads
+        from can be replaced, then drops the buffered questions and any
+        refill in progress and starts refilling.
+        '''
+        with self._lock:
+            swap()
+            self.generation += 1
+            self._buffer.clear()
+        self.fill()
+
+    def stats(self):
+        '''
+        Returns a dict of numbers for monitoring the prefetcher.
+        '''
+        if self.refills:
+            mean_latency = self._total_refill_latency / self.refills
+        else:
+            mean_latency = 0.0
+        return {'depth': len(self._buffer),
+                'target_depth': self._depth,
+                'refills': self.refills,
+                'misses': self.misses,
+                'last_refill_latency': self.last_refill_latency,
+                'mean_refill_latency': mean_latency,
+                }
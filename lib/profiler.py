@@ -0,0 +1,66 @@
+import cProfile
+import os
+import pstats
+import time
+
+# Functions listed in the summary sent back to the admin.
+TOP_FUNCTIONS = 8
+
+
+def top_functions(stats, count=TOP_FUNCTIONS):
+    '''
+    Returns a line for each of the functions that took the most time in
+    themselves, most first.
+    '''
+    stats.sort_stats('tottime')
+    lines = []
+    for function in stats.fcn_list[:count]:
+        calls, total_calls, own_time, cumulative, callers = \
+            stats.stats[function]
+        filename, line, name = function
+        if filename != '~':
+            # Built-in functions have no file.
+            name = '{} ({}:{})'.format(name, os.path.basename(filename), line)
+        lines.append('{:.1f}ms in {}, {} calls, {:.1f}ms cumulative'.format(
+            own_time * 1000, name, total_calls, cumulative * 1000))
+    return lines
+
+
+class Profiler(object):
+    '''
+    This class runs cProfile on the thread that starts it, until it is
+    stopped, and saves the result as a pstats file.
+
+    Nothing is hooked in while it isn't running, so it costs nothing
+    then.
+    '''
+
+    def __init__(self, directory):
+        self._directory = directory
+        self._profile = None
+        self._started = None
+
+    def _get_running(self):
+        return self._profile is not None
+
+    running = property(_get_running)
+
+    def start(self):
+        self._profile = cProfile.Profile()
+        self._started = time.time()
+        self._profile.enable()
+
+    def stop(self):
+        '''
+        Stops profiling and writes the profile to the directory. Returns
+        the file's path, how long profiling ran for, and a summary of the
+        top functions.
+        '''
+        profile = self._profile
+        profile.disable()
+        self._profile = None
+        elapsed = time.time() - self._started
+        path = os.path.join(self._directory, 'profile-{}.pstats'.format(
+            time.strftime('%Y%m%d-%H%M%S')))
+        profile.dump_stats(path)
+        return path, elapsed, top_functions(pstats.Stats(profile))
@@ -0,0 +1,335 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from array import array
+from bisect import bisect_right
+
+# The index is cached in the questions directory, next to the files it
+# describes. Dotfiles are never treated as question files.
+INDEX_NAME = '.index'
+INDEX_VERSION = 3
+
+# What classify() finds wrong with a line, if anything.
+VALID = 'valid'
+BROKEN = 'broken'
+EMPTY_ANSWER = 'empty_answer'
+MULTIPLE_BACKTICKS = 'multiple_backticks'
+NON_PRINTABLE = 'non_printable'
+CLASSES = (VALID, BROKEN, EMPTY_ANSWER, MULTIPLE_BACKTICKS, NON_PRINTABLE)
+
+# Control characters, for str.translate to find. Bytes above 127 are left
+# alone: a few questions are UTF-8.
+CONTROL_CHARACTERS = ''.join(chr(i) for i in range(32) if chr(i) != '\t')
+CONTROL_CHARACTERS += chr(127)
+
+
+def classify(line):
+    '''
+    Returns which of CLASSES a line, without its line ending, falls in.
+    Only VALID lines can be asked as a <question>`<answer> pair.
+    '''
+    if len(line.translate(None, CONTROL_CHARACTERS)) != len(line):
+        return NON_PRINTABLE
+    backticks = line.count('`')
+    if backticks == 0:
+        return BROKEN
+    if backticks > 1:
+        return MULTIPLE_BACKTICKS
+    question, answer = line.split('`')
+    if not question.strip():
+        return BROKEN
+    if not answer.strip():
+        return EMPTY_ANSWER
+    return VALID
+
+
+def is_valid_line(line):
+    '''
+    Returns True if a line can be asked as a <question>`<answer> pair.
+    '''
+    return classify(line) == VALID
+
+
+def normalize_line(line):
+    '''
+    Returns a valid line with the whitespace around and within the
+    question and answer collapsed to single spaces.
+    '''
+    question, answer = line.split('`')
+    return '{}`{}'.format(' '.join(question.split()), ' '.join(answer.split()))
+
+
+def scan_file(path):
+    '''
+    Returns an array of the byte offsets of every valid line in a file,
+    and how many lines were left out.
+    '''
+    offsets = array('L')
+    skipped = 0
+    position = 0
+    with open(path, 'rb') as handle:
+        for line in handle:
+            if is_valid_line(line.rstrip('\r\n')):
+                offsets.append(position)
+            else:
+                skipped += 1
+            position += len(line)
+    return offsets, skipped
+
+
+def stamp_digest(stamp):
+    '''
+    Returns a 16 byte digest of a question source's stamp, for files that
+    are only good for the questions they were made from.
+    '''
+    return hashlib.md5(json.dumps(stamp)).digest()
+
+
+def list_question_files(directory):
+    '''
+    Returns (name, size, mtime) for each question file, sorted by name.
+    '''
+    files = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith('.'):
+            continue
+        full_path = os.path.join(directory, name)
+        if not os.path.isfile(full_path):
+            continue
+        stat = os.stat(full_path)
+        files.append([name, stat.st_size, int(stat.st_mtime)])
+    return files
+
+
+class QuestionIndex(object):
+    '''
+    This class holds the byte offset of every valid line in the
+    questions directory, so a question can be read with a single seek
+    and readline instead of reading and splitting a whole file each
+    time.
+
+    Questions are numbered from 0 to len(index) - 1, in file name order.
+    skipped holds how many lines of each file were left out as broken.
+
+    The files can be edited while the index is in use. stale is set once
+    a read finds a file that no longer matches the index, and the index
+    should then be refreshed; refreshing rescans every file found stale.
+    '''
+
+    def __init__(self, directory, files, starts, offsets, skipped):
+        self._directory = directory
+        self._files = files
+        self._starts = starts
+        self._offsets = offsets
+        self._skipped = skipped
+        self._handles = {}
+        # Reads come from several prefetch threads at once.
+        self._lock = threading.Lock()
+        # The names of files that reads found didn't match the index.
+        self._stale = set()
+
+    @classmethod
+    def build(cls, directory, previous=None):
+        '''
+        Scans the question files and returns a new index. Files that
+        haven't changed since a previous index was built are not scanned
+        again.
+        '''
+        files = list_question_files(directory)
+        reusable = {}
+        if previous is not None:
+            for number, entry in enumerate(previous._files):
+                if entry[0] not in previous._stale:
+                    reusable[tuple(entry)] = number
+        starts = array('L')
+        offsets = array('L')
+        skipped = array('L')
+        scanned = 0
+        for name, size, mtime in files:
+            starts.append(len(offsets))
+            number = reusable.get((name, size, mtime))
+            if number is not None:
+                offsets.extend(previous._file_offsets(number))
+                skipped.append(previous._skipped[number])
+                continue
+            file_offsets, file_skipped = scan_file(os.path.join(directory,
+                                                                name))
+            offsets.extend(file_offsets)
+            skipped.append(file_skipped)
+            scanned += 1
+        if previous is not None:
+            print("Rescanned {} of {} question files.".format(scanned,
+                                                              len(files)))
+        return cls(directory, files, starts, offsets, skipped)
+
+    def _file_offsets(self, file_number):
+        start = self._starts[file_number]
+        if file_number + 1 < len(self._starts):
+            return self._offsets[start:self._starts[file_number + 1]]
+        return self._offsets[start:]
+
+    def changed(self):
+        '''
+        Returns True if the question files no longer match the index.
+        '''
+        return (self.stale or
+                list_question_files(self._directory) != self._files)
+
+    def refresh(self):
+        '''
+        Returns an up to date index for the same directory, rescanning
+        only the files that changed, and caches it. This index is left
+        as it was, so it can keep serving questions from the files that
+        haven't changed meanwhile.
+        '''
+        index = self.build(self._directory, self)
+        index.save()
+        return index
+
+    def _get_stale(self):
+        return bool(self._stale)
+
+    stale = property(_get_stale)
+
+    def _get_skipped(self):
+        return sum(self._skipped)
+
+    skipped = property(_get_skipped)
+
+    def _get_path(self):
+        return os.path.join(self._directory, INDEX_NAME)
+
+    path = property(_get_path)
+
+    def _get_stamp(self):
+        # The name, size and modification time of every question file.
+        return self._files
+
+    stamp = property(_get_stamp)
+
+    @classmethod
+    def load(cls, directory, stale=False):
+        '''
+        Returns the cached index for a directory, or None if there is no
+        cache or it no longer matches the question files. With stale, an
+        index that no longer matches is returned anyway, to be refreshed.
+        '''
+        try:
+            with open(os.path.join(directory, INDEX_NAME), 'rb') as handle:
+                header = json.loads(handle.readline())
+                if (header['version'] != INDEX_VERSION or
+                        header['itemsize'] != array('L').itemsize):
+                    return None
+                if (not stale and
+                        header['files'] != list_question_files(directory)):
+                    return None
+                starts = array('L')
+                starts.fromfile(handle, len(header['files']))
+                offsets = array('L')
+                offsets.fromfile(handle, header['count'])
+                skipped = array('L')
+                skipped.fromfile(handle, len(header['files']))
+        except (IOError, OSError, ValueError, KeyError, EOFError):
+            return None
+        return cls(directory, header['files'], starts, offsets, skipped)
+
+    @classmethod
+    def open(cls, directory):
+        '''
+        Returns the cached index if it is still valid, otherwise builds a
+        new one and caches it. Files that haven't changed since the cache
+        was written are not scanned again.
+        '''
+        index = cls.load(directory, stale=True)
+        if index is None:
+            print("Building question index.")
+            index = cls.build(directory)
+            index.save()
+        elif index.changed():
+            index = index.refresh()
+        print("{} questions indexed.".format(len(index)))
+        return index
+
+    def save(self):
+        '''
+        Writes the index next to the question files. The file is replaced
+        atomically so a crash never leaves a half-written index behind,
+        and each process writes its own temporary file, so shards that
+        rebuild the same index don't race on one.
+        '''
+        header = {'version': INDEX_VERSION,
+                  'itemsize': self._offsets.itemsize,
+                  'files': self._files,
+                  'count': len(self._offsets),
+                  }
+        index_path = self.path
+        try:
+            # A dotfile, so it is never taken for a question file.
+            fd, temp_path = tempfile.mkstemp(prefix=INDEX_NAME + '.',
+                                             suffix='.tmp',
+                                             dir=self._directory)
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(json.dumps(header) + '\n')
+                self._starts.tofile(handle)
+                self._offsets.tofile(handle)
+                self._skipped.tofile(handle)
+            os.rename(temp_path, index_path)
+        except (IOError, OSError) as e:
+            print("Couldn't save question index: {}".format(e))
+
+    def _handle(self, file_number):
+        '''
+        Returns an open question file, opening it on first use. Called
+        with the lock held.
+        '''
+        try:
+            return self._handles[file_number]
+        except KeyError:
+            name = self._files[file_number][0]
+            handle = open(os.path.join(self._directory, name), 'rb')
+            self._handles[file_number] = handle
+            return handle
+
+    def get_line(self, question_id):
+        '''
+        Returns the raw line for a question id, or None if its file has
+        changed since the index was built.
+        '''
+        file_number = bisect_right(self._starts, question_id) - 1
+        name, size, mtime = self._files[file_number]
+        try:
+            stat = os.stat(os.path.join(self._directory, name))
+            if stat.st_size != size or int(stat.st_mtime) != mtime:
+                return None
+            with self._lock:
+                handle = self._handle(file_number)
+                handle.seek(self._offsets[question_id])
+                line = handle.readline()
+        except (IOError, OSError):
+            return None
+        return line.rstrip('\r\n')
+
+    def get(self, question_id):
+        '''
+        Returns the (question, answer) pair for a question id, or None if
+        the line there is no longer a valid question, in which case the
+        index is marked stale.
+        '''
+        line = self.get_line(question_id)
+        if line is None or not is_valid_line(line):
+            file_number = bisect_right(self._starts, question_id) - 1
+            self._stale.add(self._files[file_number][0])
+            return None
+        question, answer = line.split('`')
+        return question, answer.strip()
+
+    def close(self):
+        with self._lock:
+            for handle in self._handles.values():
+                handle.close()
+            self._handles = {}
+
+    def __len__(self):
+        return len(self._offsets)
@@ -0,0 +1,133 @@
+import os
+import struct
+import tempfile
+from array import array
+from random import random, shuffle
+
+from lib.questions import stamp_digest
+
+# Deck files start with the deck size, the cursor and the digest of the
+# questions' stamp, followed by the shuffled question ids as unsigned
+# 32-bit integers.
+HEADER = struct.Struct('<II16s')
+CURSOR = struct.Struct('<I')
+CURSOR_OFFSET = 4
+# Questions passed over in a row, at most, when drawing with weights.
+MAX_PASSES = 3
+
+
+class Deck(object):
+    '''
+    This class implements a shuffled deck of question ids.
+
+    Every id appears exactly once, so no question is repeated until the
+    whole deck has been asked, and every question is equally likely to
+    come up. The deck is an array of 4-byte ids, and drawing just moves a
+    cursor along it.
+
+    The deck and its cursor live in a file, so a restart carries on with
+    the same deck instead of shuffling a new one. stamp is the stamp of
+    the questions dealt; if they change, even without changing in
+    number, the ids no longer name the same questions and a new deck is
+    dealt.
+    '''
+
+    def __init__(self, path, size, stamp=None):
+        self._path = path
+        self._size = size
+        self._stamp = stamp_digest(stamp)
+        self._order = array('I')
+        self._cursor = 0
+        self._handle = None
+        if not self._load():
+            self._shuffle()
+
+    def _load(self):
+        '''
+        Loads a saved deck. Returns False if there isn't one, or it was
+        dealt for other questions.
+        '''
+        try:
+            with open(self._path, 'rb') as handle:
+                size, cursor, stamp = HEADER.unpack(handle.read(HEADER.size))
+                if (size != self._size or stamp != self._stamp or
+                        self._order.itemsize != 4):
+                    return False
+                self._order.fromfile(handle, size)
+        except (IOError, OSError, EOFError, struct.error):
+            self._order = array('I')
+            return False
+        self._cursor = cursor
+        self._handle = open(self._path, 'r+b')
+        return True
+
+    def _shuffle(self):
+        '''
+        Deals a freshly shuffled deck and saves it.
+        '''
+        self._order = array('I', range(self._size))
+        shuffle(self._order)
+        self._cursor = 0
+        self._save()
+
+    def _save(self):
+        '''
+        Writes the whole deck, replacing the old file atomically. A deck
+        for reloaded questions is dealt while the old one is still in
+        use, so each write has a temporary file of its own.
+        '''
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        directory, name = os.path.split(self._path)
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix=name + '.',
+                                             suffix='.tmp',
+                                             dir=directory or '.')
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(HEADER.pack(self._size, self._cursor,
+                                         self._stamp))
+                self._order.tofile(handle)
+            os.rename(temp_path, self._path)
+            self._handle = open(self._path, 'r+b')
+        except (IOError, OSError) as e:
+            print("Couldn't save question deck: {}".format(e))
+
+    def draw(self, weight=None):
+        '''
+        Returns the next question id, reshuffling when the deck runs out.
+
+        weight, if given, returns the chance from 0 to 1 of asking a
+        question id; questions that lose out are passed over until the
+        next deal, up to MAX_PASSES in a row.
+        '''
+        question_id = self._next()
+        if weight is not None:
+            for i in range(MAX_PASSES):
+                if random() < weight(question_id):
+                    break
+                question_id = self._next()
+        return question_id
+
+    def _next(self):
+        if self._cursor >= self._size:
+            self._shuffle()
+        question_id = self._order[self._cursor]
+        self._cursor += 1
+        if self._handle is not None:
+            # Only the cursor changes, so only the cursor is rewritten.
+            self._handle.seek(CURSOR_OFFSET)
+            self._handle.write(CURSOR.pack(self._cursor))
+            self._handle.flush()
+        return question_id
+
+    def remaining(self):
+        return self._size - self._cursor
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,174 @@
+import os
+import sqlite3
+
+from lib.scores import ScoreJournal, SNAPSHOT_NAME
+
+BUSY_TIMEOUT = 10
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scores (
+    name TEXT PRIMARY KEY,
+    score INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_by_rank ON scores (score DESC, name DESC);
+'''
+
+# Statements are kept as constants so sqlite3's statement cache prepares
+# each of them only once per connection.
+SELECT_SCORE = 'SELECT score FROM scores WHERE name = ?'
+INSERT_PLAYER = 'INSERT OR IGNORE INTO scores (name, score) VALUES (?, 0)'
+ADD_POINTS = 'UPDATE scores SET score = score + ? WHERE name = ?'
+SET_SCORE = 'INSERT OR REPLACE INTO scores (name, score) VALUES (?, ?)'
+# Players are ranked by score, then by name, both descending.
+SELECT_RANKS = ('SELECT name, score FROM scores '
+                'ORDER BY score DESC, name DESC LIMIT ? OFFSET ?')
+COUNT_AHEAD = ('SELECT COUNT(*) FROM scores '
+               'WHERE score > ? OR (score = ? AND name > ?)')
+COUNT_PLAYERS = 'SELECT COUNT(*) FROM scores'
+
+
+class SqliteScores(object):
+    '''
+    This class keeps player scores in a local SQLite database, with the
+    same interface as ScoreJournal.
+
+    Nothing is loaded into memory up front: scores, ranks and the top of
+    the standings are answered by indexed queries. Changes are buffered
+    and written together in one transaction by flush().
+
+    The database runs in WAL mode, so several bot processes can share it:
+    each sees the others' changes once they are flushed.
+    '''
+
+    def __init__(self, path):
+        self._path = path
+        self._db = None
+        # name -> [score to set first, or None; points to add]
+        self._pending = {}
+
+    def load(self):
+        '''
+        Opens the database, creating it if needed. A new database is
+        filled from the JSON scores in the same directory, if any.
+        '''
+        # Other bot processes may be writing too; wait for their
+        # transactions rather than failing.
+        self._db = sqlite3.connect(self._path, timeout=BUSY_TIMEOUT)
+        self._db.text_factory = str
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        if len(self) == 0:
+            self._import_journal()
+        print("Scores loaded: {} players in {}.".format(len(self),
+                                                        self._path))
+
+    def _import_journal(self):
+        directory = os.path.dirname(self._path)
+        if not os.path.exists(os.path.join(directory, SNAPSHOT_NAME)):
+            return
+        journal = ScoreJournal(directory)
+        journal.load()
+        with self._db:
+            self._db.executemany(SET_SCORE, journal.items())
+        journal.close()
+
+    def _stored_score(self, user):
+        row = self._db.execute(SELECT_SCORE, (user,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def get(self, user):
+        '''
+        Returns a player's score, or None if they haven't scored.
+        '''
+        pending = self._pending.get(user)
+        if pending is not None and pending[0] is not None:
+            return pending[0] + pending[1]
+        score = self._stored_score(user)
+        if pending is None:
+            return score
+        return (score or 0) + pending[1]
+
+    def add(self, user, points):
+        '''
+        Adds points to a player's score and returns the new score.
+        '''
+        self._pending.setdefault(user, [None, 0])[1] += points
+        return self.get(user)
+
+    def set(self, user, score):
+        self._pending[user] = [score, 0]
+
+    def flush(self):
+        '''
+        Writes every buffered change in a single transaction.
+        '''
+        if not self._pending or self._db is None:
+            return
+        sets = []
+        adds = []
+        for user, (score, points) in self._pending.items():
+            if score is not None:
+                sets.append((user, score + points))
+            else:
+                adds.append((points, user))
+        with self._db:
+            self._db.executemany(SET_SCORE, sets)
+            self._db.executemany(INSERT_PLAYER,
+                                 [(user,) for points, user in adds])
+            self._db.executemany(ADD_POINTS, adds)
+        self._pending = {}
+
+    def top(self, count=None):
+        '''
+        Returns the (player, score) pairs of the top count players, or of
+        every player if count is None, best first.
+        '''
+        self.flush()
+        if count is None:
+            count = -1
+        return self._db.execute(SELECT_RANKS, (count, 0)).fetchall()
+
+    def rank(self, user):
+        '''
+        Returns a player's (rank, score), or None if they haven't scored.
+        '''
+        self.flush()
+        score = self._stored_score(user)
+        if score is None:
+            return None
+        ahead = self._db.execute(COUNT_AHEAD, (score, score, user)).fetchone()
+        return ahead[0] + 1, score
+
+    def around(self, user, distance=2):
+        '''
+        Returns (rank, player, score) for a player and the players either
+        side of them.
+        '''
+        standing = self.rank(user)
+        if standing is None:
+            return []
+        first = max(standing[0] - distance, 1)
+        rows = self._db.execute(SELECT_RANKS, (standing[0] + distance -
+                                               first + 1, first - 1))
+        return [(rank, name, score)
+                for rank, (name, score) in enumerate(rows, start=first)]
+
+    def compact(self):
+        '''
+        SQLite keeps its own files tidy, so there is never anything to
+        compact.
+        '''
+        return None
+
+    def close(self):
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+    def __len__(self):
+        self.flush()
+        return self._db.execute(COUNT_PLAYERS).fetchone()[0]
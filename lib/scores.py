@@ -0,0 +1,225 @@
+import json
+import os
+import time
+
+from lib.leaderboard import Leaderboard
+
+SNAPSHOT_NAME = 'scores.json'
+JOURNAL_NAME = 'scores.journal'
+# While a snapshot is being written, the journal it covers is kept under
+# this name until the snapshot has safely replaced the old one.
+COMPACTING_NAME = 'scores.journal.old'
+SNAPSHOT_VERSION = 2
+
+
+def _name(name):
+    '''
+    json hands back unicode; player names are kept as byte strings.
+    '''
+    if not isinstance(name, str):
+        name = name.encode('utf-8')
+    return name
+
+
+class ScoreJournal(object):
+    '''
+    This class keeps player scores in memory, ranked in a Leaderboard,
+    and persists them as a snapshot plus an append-only journal of the
+    changes made since.
+
+    Changes are buffered and written together by flush(), so awarding
+    points costs no I/O. compact() folds the journal into a new snapshot;
+    the slow part of that, write_snapshot(), is safe to run in a thread.
+
+    Every journal record carries a sequence number, and the snapshot
+    stores the last one it includes, so replaying after a crash at any
+    point never counts a record twice.
+    '''
+
+    def __init__(self, directory):
+        self._directory = directory
+        self._scores = Leaderboard()
+        self._pending = []
+        self._sequence = 0
+        self._journal = None
+        self._compacting = False
+
+    def _path(self, name):
+        return os.path.join(self._directory, name)
+
+    def load(self):
+        '''
+        Loads the latest snapshot and replays the journal on top of it.
+        Snapshots from before the journal existed are plain
+        {player: score} dicts and load as they are.
+        '''
+        # Replay into a plain dict, then rank everyone in one go.
+        self._scores = {}
+        sequence = 0
+        try:
+            with open(self._path(SNAPSHOT_NAME), 'r') as savefile:
+                data = json.load(savefile)
+        except (IOError, ValueError):
+            print("Save file doesn't exist.")
+            data = {}
+        if isinstance(data.get('scores'), dict) and 'version' in data:
+            sequence = data.get('sequence', 0)
+            data = data['scores']
+        for name, score in data.items():
+            self._scores[_name(name)] = int(score)
+        self._sequence = sequence
+        replayed = 0
+        for journal_name in (COMPACTING_NAME, JOURNAL_NAME):
+            replayed += self._replay(self._path(journal_name), sequence)
+        self._scores = Leaderboard(self._scores.items())
+        self._journal = open(self._path(JOURNAL_NAME), 'a')
+        print("Scores loaded: {} players, {} journal records replayed."
+              .format(len(self._scores), replayed))
+
+    def _replay(self, path, after):
+        '''
+        Applies the journal records newer than the snapshot. A record torn
+        by a crash is cut off, so new records aren't appended after it.
+        '''
+        replayed = 0
+        committed = 0
+        try:
+            journal = open(path, 'r+')
+        except IOError:
+            return 0
+        with journal:
+            for line in iter(journal.readline, ''):
+                try:
+                    if not line.endswith('\n'):
+                        raise ValueError(line)
+                    record = json.loads(line)
+                except ValueError:
+                    # Nothing after a torn write was committed either.
+                    print("Dropping torn score journal record.")
+                    journal.truncate(committed)
+                    break
+                committed += len(line)
+                self._sequence = max(self._sequence, record['n'])
+                if record['n'] <= after:
+                    continue
+                self._apply(record)
+                replayed += 1
+        return replayed
+
+    def _apply(self, record):
+        name = _name(record['u'])
+        if 's' in record:
+            self._scores[name] = record['s']
+        else:
+            self._scores[name] = self._scores.get(name, 0) + record['p']
+
+    def _record(self, record):
+        self._sequence += 1
+        record['n'] = self._sequence
+        record['t'] = int(time.time())
+        self._pending.append(record)
+
+    def get(self, user):
+        '''
+        Returns a player's score, or None if they haven't scored.
+        '''
+        return self._scores.get(user)
+
+    def add(self, user, points):
+        '''
+        Adds points to a player's score and returns the new score.
+        '''
+        score = self._scores.get(user, 0) + points
+        self._scores[user] = score
+        self._record({'u': user, 'p': points})
+        return score
+
+    def set(self, user, score):
+        self._scores[user] = score
+        self._record({'u': user, 's': score})
+
+    def items(self):
+        return self._scores.items()
+
+    def top(self, count=None):
+        '''
+        Returns the (player, score) pairs of the top count players, or of
+        every player if count is None, best first.
+        '''
+        return self._scores.top(count)
+
+    def rank(self, user):
+        '''
+        Returns a player's (rank, score), or None if they haven't scored.
+        '''
+        return self._scores.rank(user)
+
+    def around(self, user, distance=2):
+        '''
+        Returns (rank, player, score) for a player and the players either
+        side of them.
+        '''
+        return self._scores.around(user, distance)
+
+    def flush(self):
+        '''
+        Writes every buffered change to the journal in one go.
+        '''
+        if not self._pending or self._journal is None:
+            return
+        self._journal.write(''.join(json.dumps(record) + '\n'
+                                    for record in self._pending))
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._pending = []
+
+    def compact(self):
+        '''
+        Starts a compaction: flushes, sets the current journal aside and
+        starts a new one. Returns the arguments for write_snapshot(), or
+        None if there is nothing to compact or a compaction is running.
+        '''
+        if self._compacting or self._journal is None:
+            return None
+        self.flush()
+        if (os.path.getsize(self._path(JOURNAL_NAME)) == 0 and
+                os.path.exists(self._path(SNAPSHOT_NAME))):
+            return None
+        self._compacting = True
+        if not os.path.exists(self._path(COMPACTING_NAME)):
+            self._journal.close()
+            os.rename(self._path(JOURNAL_NAME), self._path(COMPACTING_NAME))
+            self._journal = open(self._path(JOURNAL_NAME), 'a')
+        # Otherwise a previous snapshot failed and its journal is still
+        # needed. Keep appending to the current one; the new snapshot
+        # covers both, and replay skips whatever it already includes.
+        return dict(self._scores.items()), self._sequence
+
+    def write_snapshot(self, scores, sequence):
+        '''
+        Atomically replaces the snapshot, then drops the journal it
+        covers. Doesn't touch any live state, so it can run in a thread.
+        '''
+        snapshot_path = self._path(SNAPSHOT_NAME)
+        temp_path = snapshot_path + '.tmp'
+        try:
+            with open(temp_path, 'w') as savefile:
+                json.dump({'version': SNAPSHOT_VERSION,
+                           'sequence': sequence,
+                           'scores': scores}, savefile)
+                savefile.flush()
+                os.fsync(savefile.fileno())
+            os.rename(temp_path, snapshot_path)
+            if os.path.exists(self._path(COMPACTING_NAME)):
+                os.remove(self._path(COMPACTING_NAME))
+        finally:
+            self._compacting = False
+
+    def close(self):
+        if self._journal is not None:
+            self.flush()
+            self._journal.close()
+            self._journal = None
+
+    def __len__(self):
+        return len(self._scores)
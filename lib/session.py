@@ -0,0 +1,326 @@
+import time
+
+from twisted.internet import reactor
+
+from lib.answer import Answer
+from lib.outqueue import GAME, REPLY, SEPARATOR
+
+# Points for a correct answer, by how many clues have been given.
+POINTS = {0: 5,
+          1: 3,
+          2: 2,
+          3: 1
+          }
+
+# How long to wait before trying again when no question could be fetched.
+RETRY_DELAY = 5
+
+
+class GameSession(object):
+    '''
+    This class holds the game being played in one channel: the current
+    question and answer, clues, skip votes and the timer driving it.
+
+    Each step of the game is scheduled with its own timer when the
+    previous one happens, so a correct answer brings the next question
+    after a short gap instead of waiting for a fixed tick.
+
+    Everything shared between channels - questions, scores and the
+    connection itself - is reached through the bot. reactor and clock can
+    be replaced for testing.
+    '''
+
+    def __init__(self, bot, channel, pacer, gap, reactor=reactor,
+                 clock=time.time):
+        self._bot = bot
+        self.channel = channel
+        self._pacer = pacer
+        self._gap = gap
+        self._reactor = reactor
+        self._clock = clock
+        self._answer = Answer()
+        self._question = ''
+        self._question_id = None
+        self._clue_number = 0
+        self._current_points = POINTS[0]
+        self._votes = 0
+        self._voters = set()
+        self._asked_at = None
+        self._running = False
+        self._timer = None
+        # Where questions come from: the bot's shared buffer, or one of
+        # the channel's own when it plays only some categories.
+        self.prefetcher = bot._prefetcher
+        self.categories = None
+        self._guesses = bot._metrics.counter('guesses')
+        self._correct_answers = bot._metrics.counter('correct_answers')
+        self._skips = bot._metrics.counter('skips')
+
+    def say(self, msg, key=None, tracked=False):
+        '''
+        Write a message to this session's channel.
+        '''
+        self._bot._cmsg(self.channel, msg, GAME, key, tracked)
+
+    def _say_question(self, lines, tracked=False):
+        '''
+        Writes the lines for a question or clue as one keyed message, so
+        they replace an older clue that hasn't been sent yet without
+        replacing each other.
+        '''
+        self.say(SEPARATOR.join(lines), 'question', tracked)
+
+    def _drop_question_lines(self):
+        self._bot._output.drop(self.channel, 'question')
+
+    def _get_running(self):
+        return self._running
+
+    running = property(_get_running)
+
+    def _schedule(self, delay):
+        '''
+        Sets the timer for the next step of the game, replacing any step
+        already scheduled.
+        '''
+        self._cancel()
+        self._timer = self._reactor.callLater(delay, self._play_game)
+
+    def _cancel(self):
+        if self._timer is not None and self._timer.active():
+            self._timer.cancel()
+        self._timer = None
+
+    def _between_questions(self, delay):
+        '''
+        Closes the current question and schedules the next one.
+        '''
+        self._clue_number = 0
+        self._schedule(delay)
+
+    def _play_game(self):
+        '''
+        Implements the main loop of the game.
+        '''
+        self._timer = None
+        if self._clue_number == 0:
+            self._votes = 0
+            self._voters = set()
+            if not self._get_new_question():
+                # The game carries on once questions can be read again.
+                self._schedule(RETRY_DELAY)
+                return
+            self._bot._telemetry.asked(self._question_id)
+            self._current_points = POINTS[self._clue_number]
+            clue = self._answer.current_clue()
+            self._say_question(["Next question:", self._question,
+                                "Clue: {}".format(clue)], tracked=True)
+            self._asked_at = self._clock()
+            self._schedule(self._pacer.delay(self._clue_number))
+            self._clue_number += 1
+        # we must be somewhere in between
+        elif self._clue_number < 4:
+            self._current_points = POINTS[self._clue_number]
+            self._say_question(["Question:", self._question,
+                                "Clue: {}".format(self._answer.give_clue())])
+            self._schedule(self._pacer.delay(self._clue_number))
+            self._clue_number += 1
+        # no one must have gotten it.
+        else:
+            self._drop_question_lines()
+            self.say("No one got it. The answer was: {}"
+                     .format(self._answer.answer))
+            self._pacer.unsolved(self._clock() - self._asked_at)
+            self._between_questions(self._gap)
+
+    def _get_new_question(self):
+        '''
+        Takes the next question from the prefetch buffer and sets it.
+        Returns False if there was none and none could be fetched.
+        '''
+        try:
+            question_id, question, answer = self.prefetcher.get()
+        except Exception as e:
+            print("Couldn't fetch a question for {}: {}"
+                  .format(self.channel, e))
+            return False
+        self._question_id, self._question = question_id, question
+        self._answer.set_answer(answer)
+        return True
+
+    def reloaded(self, questions):
+        '''
+        Called once the questions are reloaded. The question being asked
+        keeps its id only if the id still names it, so what happens to it
+        isn't recorded against another question.
+        '''
+        if self._question_id is None:
+            return
+        if (self._question_id >= len(questions) or
+                questions.get(self._question_id) !=
+                (self._question, self._answer.answer)):
+            self._question_id = None
+
+    def guess(self, user, msg):
+        '''
+        Checks a line of chat against the answer. Anything far longer
+        than the answer is just chat, and between questions there is
+        nothing to guess.
+        '''
+        if not self._clue_number or not self._answer.could_match(len(msg)):
+            return
+        self._guesses.inc()
+        if self._answer.matches(msg):
+            self._winner(user)
+
+    def _winner(self, user):
+        '''
+        Congratulates the winner for guessing correctly and assigns
+        points appropriately, then signals that it was guessed.
+        '''
+        self._drop_question_lines()
+        self._correct_answers.inc()
+        elapsed = self._clock() - self._asked_at
+        self._pacer.solved(elapsed)
+        # _clue_number counts the question itself as the first step.
+        self._bot._telemetry.solved(self._question_id, self._clue_number - 1,
+                                    elapsed)
+        self.say("{} GOT IT!".format(user.upper()))
+        self.say("If there was any doubt, the correct answer was: {}"
+                 .format(self._answer.answer))
+        self._bot._scores.add(user, self._current_points)
+        if self._current_points == 1:
+            self.say("{} point has been added to your score!"
+                     .format(str(self._current_points)))
+        else:
+            self.say("{} points have been added to your score!"
+                     .format(str(self._current_points)))
+        self._between_questions(self._gap)
+
+    def vote(self, user):
+        '''
+        Implements user voting for the next question.
+
+        Need to keep track of who voted, and how many votes. Between
+        questions there is nothing to vote on.
+        '''
+        if not self.running:
+            self.say("We aren't playing right now.")
+            return
+        if not self._clue_number:
+            return
+        if user in self._voters:
+            self.say("You already voted, {}, give someone else a chance to "
+                     "hate this question".format(user))
+            return
+        if self._votes < 2:
+            self._votes += 1
+            self._voters.add(user)
+            self.say("{}, you have voted. {} more votes needed to "
+                     "skip.".format(user, str(3 - self._votes)))
+        else:
+            self._votes = 0
+            self._voters = set()
+            self.skip()
+
+    def skip(self):
+        '''
+        Skips the current question. Between questions, once the last one
+        was answered or given up on, there is nothing to skip.
+        '''
+        if not self.running:
+            self.say("We are not playing right now.")
+            return
+        if not self._clue_number:
+            return
+        self._drop_question_lines()
+        self._skips.inc()
+        self._bot._telemetry.skipped(self._question_id)
+        self.say("Question has been skipped. The answer was: {}"
+                 .format(self._answer.answer))
+        self._between_questions(0)
+
+    def give_clue(self, dest):
+        '''
+        Repeats the question and the current clue.
+        '''
+        if not self.running:
+            self.say("we are not playing right now.")
+            return
+        self._bot._cmsg(dest, SEPARATOR.join(
+            ["Question:", self._question,
+             "Clue: " + self._answer.current_clue()]), REPLY, 'giveclue')
+
+    def start(self):
+        '''
+        Starts the game. Returns False if it was already running.
+        '''
+        if self.running:
+            return False
+        self._running = True
+        self._between_questions(0)
+        return True
+
+    def stop(self):
+        '''
+        Stops the game. Returns False if it wasn't running.
+        '''
+        if not self.running:
+            return False
+        self._running = False
+        self._clue_number = 0
+        self._cancel()
+        return True
+
+    def checkpoint(self):
+        '''
+        Returns the state of the game, for resume() after a restart.
+        '''
+        remaining = None
+        if self._timer is not None and self._timer.active():
+            remaining = max(0, self._timer.getTime() -
+                            self._reactor.seconds())
+        asked_ago = None
+        if self._asked_at is not None:
+            asked_ago = self._clock() - self._asked_at
+        return {'running': self._running,
+                'question_id': self._question_id,
+                'question': self._question,
+                'answer': self._answer.checkpoint(),
+                'clue_number': self._clue_number,
+                'current_points': self._current_points,
+                'votes': self._votes,
+                'voters': sorted(self._voters),
+                'asked_ago': asked_ago,
+                'remaining': remaining,
+                'typical': self._pacer.typical,
+                'categories': self.categories,
+                }
+
+    def resume(self, state):
+        '''
+        Carries on a game from a checkpoint(): the same question, clue
+        and votes, with the next step after the time that was left. The
+        time spent restarting doesn't count. Returns False if the game
+        wasn't running.
+        '''
+        self._pacer.typical = state['typical']
+        if not state['running'] or self.running:
+            return False
+        self._question_id = state['question_id']
+        self._question = state['question']
+        self._answer.restore(state['answer'])
+        self._clue_number = state['clue_number']
+        self._current_points = state['current_points']
+        self._votes = state['votes']
+        self._voters = set(state['voters'])
+        if state['asked_ago'] is not None:
+            self._asked_at = self._clock() - state['asked_ago']
+        self._running = True
+        if self._clue_number:
+            self._say_question(["Question:", self._question,
+                                "Clue: {}".format(
+                                    self._answer.current_clue())],
+                               tracked=True)
+        self._schedule(state['remaining'] or 0)
+        return True
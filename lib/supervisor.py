@@ -0,0 +1,127 @@
+import os
+import sys
+import time
+
+from twisted.internet import protocol, reactor
+
+# A worker that dies sooner than this after starting is restarted with an
+# increasing delay, so a broken shard can't spin.
+STABLE_AFTER = 60
+MIN_RESTART_DELAY = 1
+MAX_RESTART_DELAY = 300
+
+
+def shard_argument(argv):
+    '''
+    Returns the shard a worker was started for with --shard <n>, or None
+    if there is no --shard.
+    '''
+    if '--shard' not in argv:
+        return None
+    try:
+        return int(argv[argv.index('--shard') + 1])
+    except (IndexError, ValueError):
+        raise ValueError("--shard needs a shard number.")
+
+
+def apply_shard(config, shard):
+    '''
+    Overrides the config with one shard's settings from config.SHARDS.
+    '''
+    if not 0 <= shard < len(config.SHARDS):
+        raise ValueError("There is no shard {} in SHARDS.".format(shard))
+    for option, value in config.SHARDS[shard].items():
+        setattr(config, option, value)
+
+
+class WorkerProtocol(protocol.ProcessProtocol):
+    '''
+    Relays a worker's output, tagged with its shard, and tells the
+    supervisor when it exits.
+    '''
+
+    def __init__(self, supervisor, shard):
+        self._supervisor = supervisor
+        self._shard = shard
+        self._prefix = '[shard {}] '.format(shard)
+        self._partial = {1: '', 2: ''}
+
+    def childDataReceived(self, fd, data):
+        lines = (self._partial.get(fd, '') + data).split('\n')
+        self._partial[fd] = lines.pop()
+        stream = sys.stderr if fd == 2 else sys.stdout
+        for line in lines:
+            stream.write(self._prefix + line + '\n')
+        stream.flush()
+
+    def processEnded(self, reason):
+        self._supervisor.worker_ended(self._shard, reason.value.exitCode)
+
+
+class Supervisor(object):
+    '''
+    This class runs one bot process per shard and restarts any that
+    crash, without touching the others.
+
+    A worker that exits cleanly (after ?die) is left stopped.
+
+    reactor and clock can be replaced for testing.
+    '''
+
+    def __init__(self, script, shards, reactor=reactor, clock=time.time):
+        self._script = script
+        self._shards = shards
+        self._reactor = reactor
+        self._clock = clock
+        self._workers = {}
+        self._started = {}
+        self._delays = {}
+        self._restarts = set()
+        self._stopping = False
+
+    def start(self):
+        self._reactor.addSystemEventTrigger('before', 'shutdown', self.stop)
+        for shard in range(self._shards):
+            self._spawn(shard)
+
+    def _spawn(self, shard):
+        self._restarts.discard(shard)
+        if self._stopping:
+            return
+        print("Starting shard {}.".format(shard))
+        args = [sys.executable, '-u', self._script, '--shard', str(shard)]
+        self._workers[shard] = self._reactor.spawnProcess(
+            WorkerProtocol(self, shard), sys.executable, args,
+            env=os.environ, path=os.getcwd())
+        self._started[shard] = self._clock()
+
+    def worker_ended(self, shard, exit_code):
+        del self._workers[shard]
+        if self._stopping:
+            return
+        if exit_code == 0:
+            print("Shard {} exited.".format(shard))
+            if not self._workers and not self._restarts:
+                self._reactor.stop()
+            return
+        if self._clock() - self._started[shard] > STABLE_AFTER:
+            delay = MIN_RESTART_DELAY
+        else:
+            delay = min(self._delays.get(shard, MIN_RESTART_DELAY / 2.0) * 2,
+                        MAX_RESTART_DELAY)
+        self._delays[shard] = delay
+        print("Shard {} died (exit code {}), restarting in {}s."
+              .format(shard, exit_code, delay))
+        self._restarts.add(shard)
+        self._reactor.callLater(delay, self._spawn, shard)
+
+    def stop(self):
+        '''
+        Stops every worker. Called when the supervisor shuts down.
+        '''
+        self._stopping = True
+        for worker in self._workers.values():
+            try:
+                worker.signalProcess('TERM')
+            except Exception as e:
+                print("Failed to stop worker: {}".format(e))
@@ -0,0 +1,241 @@
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+
+from lib.questions import stamp_digest
+
+# Telemetry files start with a header: the number of questions and the
+# digest of the questions' stamp. One fixed-size record per question id
+# follows, all little-endian:
+#
+#   the first 8 bytes of the MD5 of the question line, which identifies
+#   the question wherever it moves
+#   asks, solves, clues given before the solves (summed), skips
+#   mean seconds to solve, as a 32-bit float
+#
+# 240k questions take under 5MB.
+MAGIC = 'TQS\x00'
+VERSION = 2
+HEADER = struct.Struct('<4sII16s')
+KEY = struct.Struct('<8s')
+COUNTS = struct.Struct('<HHHHf')
+RECORD = struct.Struct('<8sHHHHf')
+# Counts stop here rather than wrapping.
+MAX_COUNT = 65535
+# Clues a question can be solved after, at most.
+MAX_CLUES = 3
+
+# Questions asked fewer times than this are always asked when drawn.
+MIN_ASKS = 3
+# Chance of asking a question nobody has solved in MIN_ASKS or more asks.
+DEAD_WEIGHT = 0.25
+
+
+def question_key(question, answer):
+    '''
+    Returns the 8 byte key a question's record is kept under.
+    '''
+    return hashlib.md5(question + '`' + answer).digest()[:KEY.size]
+
+
+def _difficulty(asks, solves, clues):
+    if asks < MIN_ASKS:
+        return None
+    # Every ask that wasn't solved counts as a whole; a solve counts for
+    # the share of the clues it needed.
+    unsolved = max(0, asks - solves)
+    return min(1.0, (unsolved + clues / float(MAX_CLUES + 1)) / asks)
+
+
+class QuestionStats(object):
+    '''
+    This class records how each question fares: how often it is asked,
+    solved and skipped, how many clues it took, and how long.
+
+    The records are a memory-mapped file in SAVE_DIR, so recording an
+    event is one unpack and one pack at a fixed offset, with no system
+    call; the kernel writes the changes back.
+
+    Records are found by question id, but each also holds its question's
+    key. When the question files change, ids may name other questions,
+    so the file is rewritten for the new ids, each question keeping its
+    record wherever it moved; only questions that were removed or edited
+    lose theirs. That reads every question, so for reloads it should be
+    done off the reactor thread.
+    '''
+
+    def __init__(self, path, questions):
+        self._path = path
+        self._count = len(questions)
+        self._handle = None
+        size = HEADER.size + self._count * RECORD.size
+        try:
+            self._map = self._open(questions, size)
+        except (IOError, OSError, mmap.error) as e:
+            print("Couldn't open question statistics: {}".format(e))
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+            # Keep recording, in memory only.
+            self._map = bytearray(size)
+
+    def _open(self, questions, size):
+        '''
+        Maps the file, first rewriting it if it was made for other
+        questions.
+        '''
+        header = HEADER.pack(MAGIC, VERSION, self._count,
+                             stamp_digest(questions.stamp))
+        try:
+            with open(self._path, 'rb') as handle:
+                current = handle.read(HEADER.size) == header
+        except (IOError, OSError):
+            current = False
+        if not current:
+            self._rebuild(questions, header)
+        self._handle = open(self._path, 'r+b')
+        return mmap.mmap(self._handle.fileno(), size)
+
+    def _old_records(self):
+        '''
+        Returns {key: counts} for every question the file has stats for.
+        '''
+        records = {}
+        try:
+            with open(self._path, 'rb') as handle:
+                magic, version = HEADER.unpack(
+                    handle.read(HEADER.size))[:2]
+                if (magic, version) != (MAGIC, VERSION):
+                    print("Question statistics started again: the file "
+                          "is from an older version.")
+                    return records
+                data = handle.read()
+        except (IOError, OSError, struct.error):
+            return records
+        empty = COUNTS.pack(0, 0, 0, 0, 0.0)
+        for offset in xrange(0, len(data) - RECORD.size + 1, RECORD.size):
+            counts = data[offset + KEY.size:offset + RECORD.size]
+            if counts != empty:
+                records[data[offset:offset + KEY.size]] = counts
+        return records
+
+    def _rebuild(self, questions, header):
+        '''
+        Writes the file afresh for a question source, carrying over the
+        record of every question that is still there.
+        '''
+        old = self._old_records()
+        empty = COUNTS.pack(0, 0, 0, 0, 0.0)
+        kept = 0
+        directory, name = os.path.split(self._path)
+        fd, temp_path = tempfile.mkstemp(prefix=name + '.', suffix='.tmp',
+                                         dir=directory or '.')
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(header)
+            for question_id in xrange(self._count):
+                # A question that can't be read, because its file was
+                # edited, starts afresh after the next reload.
+                key = question_key(*(questions.get(question_id) or
+                                     ('', '')))
+                counts = old.get(key)
+                if counts is None:
+                    counts = empty
+                else:
+                    kept += 1
+                handle.write(key + counts)
+        os.rename(temp_path, self._path)
+        if old:
+            print("Question statistics carried over for {} of {} "
+                  "questions.".format(kept, len(old)))
+
+    def _offset(self, question_id):
+        if question_id is None or not 0 <= question_id < self._count:
+            # From questions that have since been reloaded.
+            return None
+        return HEADER.size + question_id * RECORD.size + KEY.size
+
+    def asked(self, question_id):
+        offset = self._offset(question_id)
+        if offset is None:
+            return
+        asks, solves, clues, skips, seconds = COUNTS.unpack_from(self._map,
+                                                                 offset)
+        COUNTS.pack_into(self._map, offset, min(asks + 1, MAX_COUNT),
+                         solves, clues, skips, seconds)
+
+    def solved(self, question_id, clues, elapsed):
+        '''
+        Records that a question was solved after some clues, elapsed
+        seconds after it was asked.
+        '''
+        offset = self._offset(question_id)
+        if offset is None:
+            return
+        asks, solves, total_clues, skips, seconds = COUNTS.unpack_from(
+            self._map, offset)
+        if solves < MAX_COUNT:
+            solves += 1
+            total_clues = min(total_clues + clues, MAX_COUNT)
+            seconds += (elapsed - seconds) / solves
+        COUNTS.pack_into(self._map, offset, asks, solves, total_clues, skips,
+                         seconds)
+
+    def skipped(self, question_id):
+        offset = self._offset(question_id)
+        if offset is None:
+            return
+        asks, solves, clues, skips, seconds = COUNTS.unpack_from(self._map,
+                                                                 offset)
+        COUNTS.pack_into(self._map, offset, asks, solves, clues,
+                         min(skips + 1, MAX_COUNT), seconds)
+
+    def get(self, question_id):
+        '''
+        Returns (asks, solves, clues, skips, mean seconds to solve) for a
+        question. clues is the total over every solve.
+        '''
+        offset = self._offset(question_id)
+        if offset is None:
+            return 0, 0, 0, 0, 0.0
+        return COUNTS.unpack_from(self._map, offset)
+
+    def difficulty(self, question_id):
+        '''
+        Returns how hard a question has proved, from 0 (always solved
+        before any clue) to 1 (never solved), or None if it hasn't been
+        asked MIN_ASKS times.
+        '''
+        asks, solves, clues, skips, seconds = self.get(question_id)
+        return _difficulty(asks, solves, clues)
+
+    def weight(self, question_id):
+        '''
+        Returns the chance, from 0 to 1, that a question should be asked
+        when it is drawn: 1 for questions of middling difficulty, half
+        that for ones always solved straight away, DEAD_WEIGHT for ones
+        nobody solves, and less for ones that are often skipped.
+        '''
+        asks, solves, clues, skips, seconds = self.get(question_id)
+        difficulty = _difficulty(asks, solves, clues)
+        if difficulty is None:
+            return 1.0
+        if not solves:
+            weight = DEAD_WEIGHT
+        else:
+            weight = 0.5 + 2 * difficulty * (1 - difficulty)
+        return weight * (1 - 0.5 * min(skips, asks) / asks)
+
+    def flush(self):
+        if self._handle is not None:
+            self._map.flush()
+
+    def close(self):
+        if self._handle is not None:
+            self._map.close()
+            self._handle.close()
+            self._handle = None
+
+    def __len__(self):
+        return self._count
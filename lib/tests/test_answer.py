@@ -12,3 +12,71 @@ class TestAnswer(TestCase):
     def test_masking_spaces(self):
         answer = Answer("test spaces")
         self.assertEqual(answer.current_clue(), "**** ******")
+
+    def test_matches_exact(self):
+        answer = Answer("Moonraker")
+        self.assertTrue(answer.matches("moonraker"))
+        self.assertTrue(answer.matches("  MOONRAKER "))
+        self.assertFalse(answer.matches("goldfinger"))
+
+    def test_matches_normalized(self):
+        answer = Answer("The Rolling-Stones")
+        self.assertTrue(answer.matches("rolling stones"))
+        self.assertTrue(answer.matches("the rolling stones!"))
+        answer = Answer("three")
+        self.assertTrue(answer.matches("3"))
+        answer = Answer("getting hard (male)")
+        self.assertTrue(answer.matches("getting hard"))
+        self.assertTrue(answer.matches("getting hard male"))
+
+    def test_matches_typos(self):
+        answer = Answer("shaken not stirred")
+        self.assertTrue(answer.matches("shaken not stired"))
+        self.assertFalse(answer.matches("shaken and stirred"))
+        # Short answers have to be exact.
+        answer = Answer("cat")
+        self.assertFalse(answer.matches("bat"))
+        answer = Answer("Moonraker")
+        self.assertTrue(answer.matches("moonracer"))
+
+    def test_no_typos_in_numbers_or_short_words(self):
+        answer = Answer("1000000")
+        self.assertTrue(answer.matches("1,000,000"))
+        self.assertFalse(answer.matches("1000001"))
+        answer = Answer("Apollo 13")
+        self.assertFalse(answer.matches("apollo 12"))
+        answer = Answer("Iceland")
+        self.assertFalse(answer.matches("ireland"))
+        answer = Answer("The Beatles")
+        self.assertFalse(answer.matches("beetles"))
+
+    def test_clues_reveal_letters(self):
+        answer = Answer("a.b-c d!")
+        clues = [answer.give_clue() for i in range(6)]
+        self.assertEqual(clues[0].count('*'), 3)
+        self.assertEqual(clues[3], "a.b-c d!")
+        self.assertEqual(clues[5], "a.b-c d!")
+
+    def test_clue_limits_for_short_answers(self):
+        for text, clues in (("ab", 0), ("abcd", 1), ("abcdef", 2)):
+            answer = Answer(text)
+            for i in range(5):
+                answer.give_clue()
+            self.assertEqual(answer.current_clue().count('*'),
+                             len(text) - clues)
+
+    def test_checkpoint_restore(self):
+        answer = Answer("Bond, James Bond")
+        answer.give_clue()
+        answer.give_clue()
+        state = answer.checkpoint()
+        restored = Answer()
+        restored.restore(state)
+        self.assertEqual(restored.answer, "Bond, James Bond")
+        self.assertEqual(restored.current_clue(), answer.current_clue())
+        # Clues carry on from the restored mask.
+        clue = restored.give_clue()
+        self.assertEqual(clue.count('*'), state['mask'].count('*') - 1)
+        for i in range(20):
+            restored.give_clue()
+        self.assertEqual(restored.current_clue(), "Bond, James Bond")
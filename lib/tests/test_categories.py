@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+from collections import Counter
+from unittest import TestCase
+
+from lib.categories import (CategoryIndex, CATEGORIES_SUFFIX, category_name,
+                            category_of)
+
+
+class Questions(object):
+    '''
+    A question source holding its questions in a list.
+    '''
+
+    def __init__(self, questions, path, stamp):
+        self._questions = questions
+        self.path = path
+        self.stamp = stamp
+
+    def get(self, question_id):
+        return self._questions[question_id], 'answer'
+
+    def __len__(self):
+        return len(self._questions)
+
+
+class TestCategoryOf(TestCase):
+
+    def test_prefixes(self):
+        self.assertEqual(category_of("007: who played Bond"), "007")
+        self.assertEqual(category_of("Entertainment: Pulp Fiction: Book"),
+                         "entertainment")
+        self.assertEqual(category_of("TV / Movies: Name the show"),
+                         "tv-movies")
+        self.assertEqual(category_of("TV/Movies: Name the show"),
+                         "tv-movies")
+        self.assertEqual(category_of("a coat hanger is this long"), None)
+        self.assertEqual(category_of("Quotes:) 'Have fun'"), None)
+        self.assertEqual(category_of("At 10:30 what happens"), None)
+        self.assertEqual(category_of("Category: Sports : Who won"), "sports")
+        self.assertEqual(category_of("category:Science & Nature: What"),
+                         "science-nature")
+        self.assertEqual(category_name("Science & Nature"), "science-nature")
+
+
+class TestCategoryIndex(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.questions = Questions(
+            ["007: first", "no category", "Music: second", "007: third",
+             "Music: fourth", "Music: fifth"],
+            os.path.join(self.directory, '.index'), [['questions_00', 10, 1]])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_build(self):
+        index = CategoryIndex.build(self.questions, 1)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(list(index.ids('007')), [0, 3])
+        self.assertEqual(list(index.ids('music')), [2, 4, 5])
+        self.assertEqual(index.largest(1), [('music', 3)])
+        self.assertTrue('007' in index)
+        self.assertFalse('sports' in index)
+        # Categories with too few questions are left out.
+        index = CategoryIndex.build(self.questions, 3)
+        self.assertEqual(len(index), 1)
+        self.assertFalse('007' in index)
+
+    def test_cache(self):
+        CategoryIndex.open(self.questions, 1)
+        path = self.questions.path + CATEGORIES_SUFFIX
+        self.assertTrue(os.path.exists(path))
+        index = CategoryIndex.load(path, self.questions.stamp, 1)
+        self.assertEqual(list(index.ids('music')), [2, 4, 5])
+        self.assertEqual(CategoryIndex.load(path, [['questions_00', 11, 1]],
+                                            1), None)
+        self.assertEqual(CategoryIndex.load(path, self.questions.stamp, 3),
+                         None)
+
+    def test_sampler(self):
+        index = CategoryIndex.build(self.questions, 1)
+        sampler = index.sampler({'music': 1})
+        self.assertEqual(len(sampler), 3)
+        self.assertEqual(set(sampler.draw() for i in range(200)),
+                         set([2, 4, 5]))
+        sampler = index.sampler({'music': 1, '007': 6})
+        drawn = Counter(sampler.draw() for i in range(3000))
+        # 007 has 2 questions at weight 6 against 3 at weight 1.
+        self.assertTrue(drawn[0] + drawn[3] > 3 * (drawn[2] + drawn[4] +
+                                                   drawn[5]))
+        self.assertRaises(KeyError, index.sampler, {'sports': 1})
+        self.assertRaises(ValueError, index.sampler, {'music': 0})
+        for weight in (float('nan'), float('inf'), -1):
+            self.assertRaises(ValueError, index.sampler,
+                              {'music': 1, '007': weight})
@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from lib import checkpoint
+
+
+class TestCheckpoint(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'checkpoint.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        state = {'sessions': {'#trivia': {'question': 'Caf\xe9 au lait?',
+                                          'voters': ['alice', 'bob'],
+                                          'remaining': 4.5,
+                                          'asked_ago': None}},
+                 'prefetched': [(3, 'question', 'answer')],
+                 }
+        self.assertTrue(checkpoint.save(self.path, state))
+        loaded = checkpoint.load(self.path)
+        session = loaded['sessions']['#trivia']
+        self.assertEqual(session['question'], 'Caf\xe9 au lait?')
+        self.assertTrue(isinstance(session['question'], str))
+        self.assertEqual(session['voters'], ['alice', 'bob'])
+        self.assertEqual(session['remaining'], 4.5)
+        self.assertEqual(loaded['prefetched'], [[3, 'question', 'answer']])
+
+    def test_resumed_once(self):
+        checkpoint.save(self.path, {'sessions': {}})
+        self.assertNotEqual(checkpoint.load(self.path), None)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(checkpoint.load(self.path), None)
+
+    def test_old_checkpoint_ignored(self):
+        checkpoint.save(self.path, {'sessions': {}})
+        self.assertEqual(checkpoint.load(self.path, max_age=-1), None)
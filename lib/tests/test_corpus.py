@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from lib.corpus import Corpus, CorpusError, compile_corpus
+
+
+class FakeQuestions(object):
+
+    def __init__(self, pairs):
+        self.pairs = pairs
+
+    def get(self, question_id):
+        return self.pairs[question_id]
+
+    def __len__(self):
+        return len(self.pairs)
+
+
+class TestCorpus(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'questions.corpus')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        pairs = [("first question", "first answer"),
+                 ("", "empty question"),
+                 ("third question", "3")]
+        self.assertEqual(compile_corpus(FakeQuestions(pairs), self.path), 3)
+        corpus = Corpus(self.path)
+        self.assertEqual(len(corpus), 3)
+        for question_id, pair in enumerate(pairs):
+            self.assertEqual(corpus.get(question_id), pair)
+        self.assertRaises(IndexError, corpus.get, 3)
+        corpus.close()
+
+    def test_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write("question`answer\n")
+        self.assertRaises(CorpusError, Corpus, self.path)
+
+    def test_refresh_after_recompile(self):
+        compile_corpus(FakeQuestions([("question", "answer")]), self.path)
+        corpus = Corpus(self.path)
+        self.assertFalse(corpus.changed())
+        compile_corpus(FakeQuestions([("question", "answer"),
+                                      ("another", "one")]), self.path)
+        self.assertTrue(corpus.changed())
+        refreshed = corpus.refresh()
+        self.assertEqual(len(refreshed), 2)
+        self.assertEqual(corpus.get(0), ("question", "answer"))
+        corpus.close()
+        refreshed.close()
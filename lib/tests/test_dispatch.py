@@ -0,0 +1,24 @@
+from unittest import TestCase
+
+from lib.dispatch import parse_command, sanitize
+
+
+class TestDispatch(TestCase):
+
+    def test_sanitize(self):
+        self.assertEqual(sanitize("\x02bold\x02 \x0304red\x03"), "bold 04red")
+
+    def test_question_mark_commands(self):
+        self.assertEqual(parse_command("?set bob 5", "bot"),
+                         ("set", ["bob", "5"]))
+        self.assertEqual(parse_command("?", "bot"), None)
+
+    def test_nickname_commands(self):
+        self.assertEqual(parse_command("bot: set bob 5", "bot"),
+                         ("set", ["bob", "5"]))
+        self.assertEqual(parse_command("bot set bob 5", "bot"),
+                         ("set", ["bob", "5"]))
+        self.assertEqual(parse_command("bot", "bot"), None)
+
+    def test_chat(self):
+        self.assertEqual(parse_command("is the bot awake?", "bot"), None)
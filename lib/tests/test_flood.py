@@ -0,0 +1,48 @@
+from unittest import TestCase
+
+from lib import flood
+from lib.flood import FloodControl
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestFloodControl(TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.flood = FloodControl({'guess': (2, 4), 'command': (0.5, 1),
+                                   'chat': None}, self.clock)
+
+    def test_burst_then_rate(self):
+        allowed = [self.flood.allow('alice', 'guess') for i in range(10)]
+        self.assertEqual(allowed, [True] * 4 + [False] * 6)
+        self.assertEqual(self.flood.shed['guess'], 6)
+        self.clock.now += 1
+        allowed = [self.flood.allow('alice', 'guess') for i in range(3)]
+        self.assertEqual(allowed, [True, True, False])
+        # Other users and kinds have their own buckets.
+        self.assertTrue(self.flood.allow('bob', 'guess'))
+        self.assertTrue(self.flood.allow('alice', 'command'))
+        self.assertFalse(self.flood.allow('alice', 'command'))
+        self.assertTrue(self.flood.allow('alice', 'chat'))
+        self.assertTrue(self.flood.allow('alice', 'unknown'))
+        self.assertEqual(self.flood.worst(5), [('alice', 8)])
+
+    def test_idle_users_forgotten(self):
+        for i in range(6):
+            self.flood.allow('alice', 'guess')
+        self.flood.allow('bob', 'guess')
+        self.assertEqual(self.flood.users(), 2)
+        self.clock.now += flood.SWEEP_INTERVAL
+        self.flood.allow('carol', 'guess')
+        self.assertEqual(self.flood.users(), 1)
+        # A forgotten user starts with a full bucket.
+        allowed = [self.flood.allow('alice', 'guess') for i in range(5)]
+        self.assertEqual(allowed, [True] * 4 + [False])
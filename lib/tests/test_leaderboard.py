@@ -0,0 +1,56 @@
+from random import randrange, shuffle
+from unittest import TestCase
+
+from lib.leaderboard import IndexableSkiplist, Leaderboard
+
+
+class TestIndexableSkiplist(TestCase):
+
+    def test_matches_sorted_list(self):
+        skiplist = IndexableSkiplist()
+        values = [randrange(100) for i in range(300)]
+        for value in values:
+            skiplist.insert(value)
+        shuffle(values)
+        for value in values[:150]:
+            skiplist.remove(value)
+        expected = sorted(values[150:])
+        self.assertEqual(len(skiplist), 150)
+        self.assertEqual([skiplist[i] for i in range(150)], expected)
+        self.assertEqual(skiplist.slice(10, 20), expected[10:20])
+        for value in expected:
+            self.assertEqual(skiplist.index(value), expected.index(value))
+
+    def test_built_from_sorted_values(self):
+        skiplist = IndexableSkiplist(range(0, 100, 2))
+        skiplist.insert(51)
+        skiplist.remove(10)
+        expected = sorted(set(range(0, 100, 2)) - set([10])) + [51]
+        expected.sort()
+        self.assertEqual([skiplist[i] for i in range(len(skiplist))],
+                         expected)
+        self.assertEqual(skiplist.index(51), expected.index(51))
+
+
+class TestLeaderboard(TestCase):
+
+    def setUp(self):
+        self.board = Leaderboard([('alice', 5), ('bob', 10), ('carol', 5),
+                                  ('dave', 1)])
+
+    def test_top(self):
+        self.assertEqual(self.board.top(2), [('bob', 10), ('carol', 5)])
+        self.assertEqual(len(self.board.top()), 4)
+
+    def test_rank_follows_updates(self):
+        self.assertEqual(self.board.rank('alice'), (3, 5))
+        self.board['alice'] = 11
+        self.assertEqual(self.board.rank('alice'), (1, 11))
+        self.assertEqual(self.board.rank('bob'), (2, 10))
+        self.assertEqual(self.board.rank('erin'), None)
+
+    def test_around(self):
+        self.assertEqual(self.board.around('carol', 1),
+                         [(1, 'bob', 10), (2, 'carol', 5), (3, 'alice', 5)])
+        self.assertEqual(self.board.around('dave', 1),
+                         [(3, 'alice', 5), (4, 'dave', 1)])
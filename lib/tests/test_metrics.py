@@ -0,0 +1,45 @@
+from unittest import TestCase
+
+from lib.metrics import Registry
+
+
+class TestMetrics(TestCase):
+
+    def test_registry_returns_existing(self):
+        metrics = Registry()
+        counter = metrics.counter('guesses', 'Guesses.')
+        self.assertTrue(metrics.counter('guesses') is counter)
+        counter.inc()
+        counter.inc(2)
+        self.assertEqual(counter.value, 3)
+
+    def test_histogram(self):
+        histogram = Registry().histogram('fetch', buckets=(0.001, 0.01, 0.1))
+        for value in (0.0005, 0.002, 0.002, 0.05, 3.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [1, 2, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.max, 3.0)
+        self.assertEqual(histogram.quantile(0.5), 0.01)
+        self.assertEqual(histogram.quantile(1.0), 3.0)
+
+    def test_prometheus(self):
+        metrics = Registry()
+        metrics.counter('skips', 'Questions skipped.').inc()
+        metrics.gauge('players', 'Players.', lambda: 7)
+        metrics.histogram('save', 'Saves.', buckets=(0.1,)).observe(0.05)
+        self.assertEqual(metrics.prometheus().splitlines(), [
+            '# HELP triviabot_players Players.',
+            '# TYPE triviabot_players gauge',
+            'triviabot_players 7',
+            '# HELP triviabot_save Saves.',
+            '# TYPE triviabot_save histogram',
+            'triviabot_save_bucket{le="0.1"} 1',
+            'triviabot_save_bucket{le="+Inf"} 1',
+            'triviabot_save_sum 0.05',
+            'triviabot_save_count 1',
+            '# HELP triviabot_skips_total Questions skipped.',
+            '# TYPE triviabot_skips_total counter',
+            'triviabot_skips_total 1',
+            ])
+        self.assertEqual(metrics.summary()[:2], ['skips 1', 'players 7'])
@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+from lib.minhash import (NearDuplicateIndex, UnionFind, normalize_question,
+                         signature, similarity)
+
+
+class TestMinHash(TestCase):
+
+    def test_normalize_question(self):
+        self.assertEqual(normalize_question("007: How did Dr No die?"),
+                         "how did dr no die")
+        self.assertEqual(normalize_question("TV / Movies:  Who played 'Q'"),
+                         "who played q")
+
+    def test_signature(self):
+        first = signature("What is the holy book of Islam")
+        self.assertEqual(len(first), 32)
+        self.assertEqual(similarity(first, first), 1.0)
+        self.assertEqual(first, signature("General: what is the HOLY book "
+                                          "of islam?"))
+        self.assertTrue(similarity(first, signature("Who wrote Madame "
+                                                    "Bovary")) < 0.5)
+
+    def test_union_find(self):
+        sets = UnionFind()
+        for i in range(4):
+            sets.add()
+        sets.union(3, 1)
+        sets.union(1, 2)
+        self.assertEqual(sets.find(3), 1)
+        self.assertEqual(sets.find(2), 1)
+        self.assertEqual(sets.find(0), 0)
+        self.assertFalse(sets.union(2, 3))
+
+
+class TestNearDuplicateIndex(TestCase):
+
+    def test_clusters(self):
+        index = NearDuplicateIndex()
+        questions = [("Who wrote Madame Bovary", "gustave flaubert"),
+                     ("What is the holy book of Islam", "Koran"),
+                     ("Religion: What is the holy book of Islam ", "koran"),
+                     ("AUTHORS: Who wrote Madame Bovary", "Gustav Flaubert"),
+                     ("What is the holy book of Islam", "Quran Sharif"),
+                     ("Trivia : what is the holy book of islam?", "the koran"),
+                     ]
+        for question, answer in questions:
+            index.add(question, answer)
+        self.assertEqual(index.clusters(), [[0, 3], [1, 2, 5]])
+
+    def test_numbers_must_match(self):
+        index = NearDuplicateIndex()
+        index.add("If you were born on 01 June what star sign are you",
+                  "Gemini")
+        index.add("If you were born on 02 June what star sign are you",
+                  "Gemini")
+        self.assertEqual(index.clusters(), [])
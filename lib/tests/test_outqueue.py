@@ -0,0 +1,131 @@
+from unittest import TestCase
+
+from lib.outqueue import (OutputScheduler, GAME, REPLY, BULK, SEPARATOR,
+                          payload_limit)
+
+
+class FakeCall(object):
+
+    def __init__(self, clock, delay, function):
+        self.time = clock.now + delay
+        self.function = function
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+        self.calls = []
+
+    def __call__(self):
+        return self.now
+
+    def call_later(self, delay, function):
+        call = FakeCall(self, delay, function)
+        self.calls.append(call)
+        return call
+
+    def run(self):
+        while self.calls:
+            call = self.calls.pop(0)
+            if not call.cancelled:
+                self.now = max(self.now, call.time)
+                call.function()
+
+
+class TestOutputScheduler(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.sent = []
+        self.output = OutputScheduler(
+            lambda dest, text: self.sent.append((dest, text)),
+            self.clock.call_later, 0.4, self.clock)
+
+    def test_priorities_and_packing(self):
+        self.output.enqueue('alice', 'standings', BULK)
+        self.output.enqueue('#trivia', 'Next question:', GAME)
+        self.output.enqueue('#trivia', 'What?', GAME)
+        self.output.enqueue('bob', 'help', REPLY)
+        self.clock.run()
+        self.assertEqual(self.sent, [('#trivia', 'Next question: | What?'),
+                                     ('bob', 'help'),
+                                     ('alice', 'standings')])
+        self.assertEqual(self.clock.now, 0.8)
+
+    def test_packing_respects_line_limit(self):
+        text = 'x' * ((payload_limit('#trivia') - 3) // 2)
+        for i in range(3):
+            self.output.enqueue('#trivia', text, GAME)
+        self.clock.run()
+        self.assertEqual(len(self.sent), 2)
+
+    def test_superseded_messages_are_dropped(self):
+        self.output.enqueue('#trivia', 'first', GAME)
+        self.output.enqueue('bob', 'help', GAME)
+        self.output.enqueue('#trivia', 'Clue: ****', GAME, key='question')
+        self.output.enqueue('#trivia', 'Clue: a***', GAME, key='question')
+        self.output.drop('#trivia', 'nothing')
+        # The dropped clue is still queued, but isn't waiting to be sent.
+        self.assertEqual(self.output.depth(), 3)
+        self.clock.run()
+        self.assertEqual(self.output.depth(), 0)
+        self.assertEqual(self.sent, [('#trivia', 'first'),
+                                     ('bob', 'help'),
+                                     ('#trivia', 'Clue: a***')])
+        self.assertEqual(self.output.messages_dropped, 1)
+
+    def test_replies_replace_whole_replies(self):
+        self.output.enqueue('#trivia', 'first', GAME)
+        self.output.enqueue_all('bob', ['1: alice', '2: bob'], BULK,
+                                key='standings')
+        self.assertTrue(self.output.pending('bob', 'standings'))
+        self.assertFalse(self.output.pending('carol', 'standings'))
+        self.output.enqueue_all('bob', ['1: bob', '2: alice'], BULK,
+                                key='standings')
+        self.clock.run()
+        self.assertEqual(self.sent, [('#trivia', 'first'),
+                                     ('bob', '1: bob | 2: alice')])
+        self.assertFalse(self.output.pending('bob', 'standings'))
+        self.assertEqual(self.output.messages_dropped, 2)
+
+    def test_keyed_steps_send_every_line(self):
+        # Each step of the game is one keyed message: a newer clue
+        # replaces the whole of an unsent step, but the lines of a step
+        # never replace each other.
+        self.output.enqueue('#trivia', SEPARATOR.join(
+            ['Next question:', 'What?', 'Clue: ****']), GAME,
+            key='question', tracked=True)
+        self.clock.run()
+        for clue in ('a***', 'ab**'):
+            self.output.enqueue('#trivia', SEPARATOR.join(
+                ['Question:', 'What?', 'Clue: ' + clue]), GAME,
+                key='question')
+        self.clock.run()
+        self.assertEqual(self.sent, [
+            ('#trivia', 'Next question: | What? | Clue: ****'),
+            ('#trivia', 'Question: | What? | Clue: ab**')])
+        self.assertEqual(self.output.messages_dropped, 1)
+        self.assertEqual(self.output.tracked_count, 1)
+
+    def test_ctcp_is_never_packed(self):
+        self.output.enqueue('#trivia', 'first', REPLY)
+        self.output.enqueue('#trivia', '\x01ACTION looks\x01', REPLY)
+        self.output.enqueue('#trivia', 'second', REPLY)
+        self.clock.run()
+        self.assertEqual(self.sent, [('#trivia', 'first'),
+                                     ('#trivia', '\x01ACTION looks\x01'),
+                                     ('#trivia', 'second')])
+
+    def test_tracked_delay(self):
+        self.output.enqueue('bob', 'help', REPLY)
+        self.output.enqueue('#trivia', 'What?', GAME, tracked=True)
+        self.output.enqueue('#trivia', 'Who?', GAME, tracked=True)
+        self.clock.run()
+        stats = self.output.stats()
+        self.assertEqual(stats['question_delay_max'], 0.0)
+        self.assertEqual(stats['lines_sent'], 2)
@@ -0,0 +1,29 @@
+from unittest import TestCase
+
+from lib.pacing import Pacer
+
+
+class TestPacer(TestCase):
+
+    def test_fixed_intervals(self):
+        pacer = Pacer([30, 20, 10], 5, adaptive=False)
+        pacer.solved(2)
+        self.assertEqual([pacer.delay(n) for n in range(4)], [30, 20, 10, 10])
+
+    def test_no_history_uses_intervals(self):
+        pacer = Pacer([30, 30, 30, 30], 10)
+        self.assertEqual(pacer.delay(0), 30)
+
+    def test_fast_channel_gets_shorter_waits(self):
+        pacer = Pacer([30, 30, 30, 30], 10)
+        for i in range(5):
+            pacer.solved(12)
+        self.assertEqual(pacer.delay(1), 18)
+
+    def test_bounds(self):
+        pacer = Pacer([30, 30, 30, 30], 10)
+        pacer.solved(1)
+        self.assertEqual(pacer.delay(0), 10)
+        for i in range(20):
+            pacer.unsolved(120)
+        self.assertEqual(pacer.delay(0), 30)
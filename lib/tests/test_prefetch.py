@@ -0,0 +1,90 @@
+from unittest import TestCase
+
+from twisted.internet import defer
+
+from lib import prefetch
+from lib.prefetch import QuestionPrefetcher
+
+
+class TestQuestionPrefetcher(TestCase):
+
+    def setUp(self):
+        self.next_id = 0
+        # Refills are held here instead of going to a worker thread, so
+        # each test decides when they run and finish.
+        self.refills = []
+        self._deferToThread = prefetch.deferToThread
+        prefetch.deferToThread = self.defer_to_thread
+        self.observed = []
+        self.prefetcher = QuestionPrefetcher(self.fetch, depth=3,
+                                             observe=self.observed.append)
+
+    def tearDown(self):
+        prefetch.deferToThread = self._deferToThread
+
+    def fetch(self):
+        question_id = self.next_id
+        self.next_id += 1
+        return question_id, 'question {}'.format(question_id), 'answer'
+
+    def defer_to_thread(self, function, *args):
+        d = defer.Deferred()
+        self.refills.append((function, args, d))
+        return d
+
+    def finish_refill(self):
+        function, args, d = self.refills.pop(0)
+        d.callback(function(*args))
+
+    def test_get_on_empty_is_a_miss(self):
+        self.assertEqual(self.prefetcher.get()[0], 0)
+        self.assertEqual(self.prefetcher.misses, 1)
+        self.assertEqual(len(self.observed), 1)
+        # The miss started a refill, which hasn't finished yet.
+        self.assertEqual(len(self.refills), 1)
+        self.assertEqual(self.prefetcher.stats()['depth'], 0)
+
+    def test_fills_to_depth(self):
+        self.prefetcher.fill()
+        # A second fill while one is running does nothing.
+        self.prefetcher.fill()
+        self.assertEqual(len(self.refills), 1)
+        self.finish_refill()
+        stats = self.prefetcher.stats()
+        self.assertEqual(stats['depth'], 3)
+        self.assertEqual(stats['refills'], 1)
+        self.assertEqual([self.prefetcher.get()[0] for i in range(3)],
+                         [0, 1, 2])
+        self.assertEqual(self.prefetcher.misses, 0)
+        # Fetch times are observed when the refill is handed back.
+        self.assertEqual(len(self.observed), 3)
+        # Each get() topped the buffer up by one.
+        self.assertEqual(len(self.refills), 1)
+        self.assertEqual(self.refills[0][1][0], 1)
+
+    def test_old_generation_is_discarded(self):
+        self.prefetcher.fill()
+        swapped = []
+        self.prefetcher.reset(lambda: swapped.append(True))
+        self.assertEqual(swapped, [True])
+        self.assertEqual(self.prefetcher.generation, 1)
+        # The refill started before reset() arrives afterwards and is
+        # thrown away, and a refill for the new generation starts.
+        self.finish_refill()
+        self.assertEqual(self.prefetcher.stats()['depth'], 0)
+        self.assertEqual(self.prefetcher.refills, 0)
+        self.assertEqual(len(self.refills), 1)
+        self.finish_refill()
+        self.assertEqual(self.prefetcher.get()[0], 3)
+
+    def test_restore_keeps_order(self):
+        self.prefetcher.fill()
+        self.finish_refill()
+        saved = self.prefetcher.buffered()
+        self.assertEqual([question[0] for question in saved], [0, 1, 2])
+        self.prefetcher.clear()
+        self.prefetcher.fill()
+        self.finish_refill()
+        self.prefetcher.restore(saved[:2])
+        self.assertEqual([self.prefetcher.get()[0] for i in range(5)],
+                         [0, 1, 3, 4, 5])
@@ -0,0 +1,33 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from lib.profiler import Profiler
+
+
+def busy():
+    return sum(i * i for i in range(20000))
+
+
+class TestProfiler(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_profile(self):
+        profiler = Profiler(self.directory)
+        self.assertFalse(profiler.running)
+        profiler.start()
+        self.assertTrue(profiler.running)
+        busy()
+        path, elapsed, summary = profiler.stop()
+        self.assertFalse(profiler.running)
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(os.path.dirname(path) == self.directory)
+        self.assertTrue(summary)
+        self.assertTrue(any('busy' in line or 'genexpr' in line
+                            for line in summary))
@@ -0,0 +1,147 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from lib.questions import (QuestionIndex, INDEX_NAME, VALID, BROKEN,
+                           EMPTY_ANSWER, MULTIPLE_BACKTICKS, NON_PRINTABLE,
+                           classify, normalize_line)
+
+
+class TestQuestionIndex(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'questions_00'), 'w') as f:
+            f.write("first question`first answer\n"
+                    "broken question\n"
+                    "second question` second answer \r\n")
+        with open(os.path.join(self.directory, 'questions_01'), 'w') as f:
+            f.write("too`many`backticks\n"
+                    "third question`third answer")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_skips_broken_lines(self):
+        index = QuestionIndex.build(self.directory)
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.get(0), ("first question", "first answer"))
+        self.assertEqual(index.get(1), ("second question", "second answer"))
+        self.assertEqual(index.get(2), ("third question", "third answer"))
+
+    def test_cache_round_trip(self):
+        QuestionIndex.open(self.directory)
+        self.assertTrue(os.path.exists(os.path.join(self.directory,
+                                                    INDEX_NAME)))
+        index = QuestionIndex.load(self.directory)
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.get(2), ("third question", "third answer"))
+        # The temporary file the index was written to was renamed.
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         [INDEX_NAME, 'questions_00', 'questions_01'])
+
+    def test_cache_invalidated_by_changes(self):
+        QuestionIndex.open(self.directory)
+        with open(os.path.join(self.directory, 'questions_02'), 'w') as f:
+            f.write("fourth question`fourth answer\n")
+        self.assertEqual(QuestionIndex.load(self.directory), None)
+
+    def test_refresh_rescans_changed_files(self):
+        index = QuestionIndex.open(self.directory)
+        self.assertFalse(index.changed())
+        with open(os.path.join(self.directory, 'questions_01'), 'a') as f:
+            f.write("\nfourth question`fourth answer\n")
+        with open(os.path.join(self.directory, 'questions_02'), 'w') as f:
+            f.write("fifth question`fifth answer\n")
+        self.assertTrue(index.changed())
+        refreshed = index.refresh()
+        self.assertFalse(refreshed.changed())
+        self.assertEqual(len(refreshed), 5)
+        self.assertEqual(refreshed.skipped, 2)
+        self.assertEqual(refreshed.get(1), ("second question", "second answer"))
+        self.assertEqual(refreshed.get(3), ("fourth question", "fourth answer"))
+        self.assertEqual(refreshed.get(4), ("fifth question", "fifth answer"))
+        # The old index still reads the files that haven't changed until
+        # it is closed.
+        self.assertEqual(index.get(0), ("first question", "first answer"))
+        self.assertFalse(index.stale)
+        self.assertEqual(index.get(2), None)
+        self.assertTrue(index.stale)
+        self.assertEqual(len(QuestionIndex.load(self.directory)), 5)
+
+    def test_file_edited_in_place(self):
+        index = QuestionIndex.build(self.directory)
+        self.assertEqual(index.get(1), ("second question", "second answer"))
+        # Truncated and rewritten while open, with different lines at the
+        # indexed offsets.
+        with open(os.path.join(self.directory, 'questions_00'), 'r+') as f:
+            f.truncate(0)
+            f.write("new`line\n")
+        self.assertEqual(index.get(1), None)
+        self.assertEqual(index.get(0), None)
+        self.assertTrue(index.stale)
+        self.assertEqual(index.get(2), ("third question", "third answer"))
+        self.assertTrue(index.changed())
+        refreshed = index.refresh()
+        self.assertFalse(refreshed.stale)
+        self.assertEqual(len(refreshed), 2)
+        self.assertEqual(refreshed.get(0), ("new", "line"))
+        os.remove(os.path.join(self.directory, 'questions_01'))
+        self.assertEqual(index.get(2), None)
+        index.close()
+
+    def test_stale_file_is_rescanned(self):
+        index = QuestionIndex.build(self.directory)
+        # Broken in place without changing its size, within the second
+        # the index was built, so only the read notices.
+        path = os.path.join(self.directory, 'questions_01')
+        stat = os.stat(path)
+        with open(path, 'r+') as f:
+            f.seek(len("too`many`backticks\n"))
+            f.write("third question third answer")
+        os.utime(path, (stat.st_atime, stat.st_mtime))
+        self.assertFalse(index.changed())
+        self.assertEqual(index.get(2), None)
+        self.assertTrue(index.changed())
+        refreshed = index.refresh()
+        self.assertEqual(len(refreshed), 2)
+        self.assertFalse(refreshed.changed())
+
+    def test_open_refreshes_stale_cache(self):
+        QuestionIndex.open(self.directory)
+        with open(os.path.join(self.directory, 'questions_02'), 'w') as f:
+            f.write("fourth question`fourth answer\n")
+        self.assertEqual(len(QuestionIndex.load(self.directory,
+                                                stale=True)), 3)
+        index = QuestionIndex.open(self.directory)
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.get(3), ("fourth question", "fourth answer"))
+        self.assertEqual(len(QuestionIndex.load(self.directory)), 4)
+
+
+class TestClassify(TestCase):
+
+    def test_classes(self):
+        self.assertEqual(classify("question`answer"), VALID)
+        self.assertEqual(classify("no answer here"), BROKEN)
+        self.assertEqual(classify("`answer"), BROKEN)
+        self.assertEqual(classify("question` "), EMPTY_ANSWER)
+        self.assertEqual(classify("a`b`c"), MULTIPLE_BACKTICKS)
+        self.assertEqual(classify("question\x03`answer"), NON_PRINTABLE)
+        self.assertEqual(classify("E=mc\xc2\xb2 stands for`energy"), VALID)
+
+    def test_normalize_line(self):
+        self.assertEqual(normalize_line("  what  is\tit ` an  answer "),
+                         "what is it`an answer")
+
+    def test_index_skips_empty_answers(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(directory, 'questions_00'), 'w') as f:
+                f.write("question`\nquestion`answer\n")
+            index = QuestionIndex.build(directory)
+            self.assertEqual(len(index), 1)
+            self.assertEqual(index.get(0), ("question", "answer"))
+        finally:
+            shutil.rmtree(directory)
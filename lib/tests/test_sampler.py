@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from lib.sampler import Deck, MAX_PASSES
+
+
+class TestDeck(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'deck')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_no_repeats(self):
+        deck = Deck(self.path, 50)
+        drawn = [deck.draw() for i in range(50)]
+        self.assertEqual(sorted(drawn), list(range(50)))
+        self.assertEqual(deck.remaining(), 0)
+        # The next draw starts a new deck.
+        self.assertTrue(0 <= deck.draw() < 50)
+        self.assertEqual(deck.remaining(), 49)
+
+    def test_resumes_after_restart(self):
+        deck = Deck(self.path, 50)
+        first = [deck.draw() for i in range(20)]
+        deck.close()
+        deck = Deck(self.path, 50)
+        rest = [deck.draw() for i in range(30)]
+        self.assertEqual(sorted(first + rest), list(range(50)))
+
+    def test_reshuffles_when_size_changes(self):
+        deck = Deck(self.path, 50)
+        deck.draw()
+        deck.close()
+        deck = Deck(self.path, 60)
+        self.assertEqual(deck.remaining(), 60)
+
+    def test_reshuffles_when_questions_change(self):
+        deck = Deck(self.path, 50, [['questions_00', 100, 1]])
+        deck.draw()
+        deck.close()
+        deck = Deck(self.path, 50, [['questions_00', 100, 1]])
+        self.assertEqual(deck.remaining(), 49)
+        deck.close()
+        # Same number of questions, but a file was edited.
+        deck = Deck(self.path, 50, [['questions_00', 101, 2]])
+        self.assertEqual(deck.remaining(), 50)
+        self.assertEqual(os.listdir(self.directory), ['deck'])
+
+    def test_weighted_draws(self):
+        deck = Deck(self.path, 50)
+        deck.draw(lambda question_id: 1.0)
+        self.assertEqual(deck.remaining(), 49)
+        # A question that always loses out is passed over, MAX_PASSES
+        # times at most.
+        deck.draw(lambda question_id: 0.0)
+        self.assertEqual(deck.remaining(), 49 - 1 - MAX_PASSES)
@@ -0,0 +1,58 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from lib.scoredb import SqliteScores
+
+
+class TestSqliteScores(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'scores.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_batched_changes(self):
+        scores = SqliteScores(self.path)
+        scores.load()
+        self.assertEqual(scores.add('alice', 5), 5)
+        self.assertEqual(scores.add('alice', 3), 8)
+        scores.set('bob', 10)
+        self.assertEqual(scores.add('bob', 1), 11)
+        scores.close()
+        scores = SqliteScores(self.path)
+        scores.load()
+        self.assertEqual(scores.get('alice'), 8)
+        self.assertEqual(scores.get('bob'), 11)
+        self.assertEqual(scores.get('carol'), None)
+        self.assertEqual(len(scores), 2)
+
+    def test_ranking(self):
+        scores = SqliteScores(self.path)
+        scores.load()
+        scores.set('alice', 5)
+        scores.set('bob', 10)
+        scores.set('carol', 5)
+        self.assertEqual(scores.top(2), [('bob', 10), ('carol', 5)])
+        self.assertEqual(scores.rank('bob'), (1, 10))
+        self.assertEqual(scores.rank('alice'), (3, 5))
+        self.assertEqual(scores.rank('dave'), None)
+
+    def test_imports_json_scores(self):
+        with open(os.path.join(self.directory, 'scores.json'), 'w') as f:
+            json.dump({'alice': 4}, f)
+        scores = SqliteScores(self.path)
+        scores.load()
+        self.assertEqual(scores.get('alice'), 4)
+
+    def test_around(self):
+        scores = SqliteScores(self.path)
+        scores.load()
+        for name, score in [('alice', 5), ('bob', 10), ('carol', 5)]:
+            scores.set(name, score)
+        self.assertEqual(scores.around('carol', 1),
+                         [(1, 'bob', 10), (2, 'carol', 5), (3, 'alice', 5)])
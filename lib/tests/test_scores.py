@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from lib.scores import ScoreJournal, SNAPSHOT_NAME, JOURNAL_NAME
+
+
+class TestScoreJournal(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def reopen(self, scores):
+        scores.close()
+        scores = ScoreJournal(self.directory)
+        scores.load()
+        return scores
+
+    def test_journal_replay(self):
+        scores = ScoreJournal(self.directory)
+        scores.load()
+        scores.add('alice', 5)
+        scores.add('alice', 3)
+        scores.set('bob', 10)
+        scores = self.reopen(scores)
+        self.assertEqual(scores.get('alice'), 8)
+        self.assertEqual(scores.get('bob'), 10)
+        self.assertEqual(scores.get('carol'), None)
+
+    def test_compaction(self):
+        scores = ScoreJournal(self.directory)
+        scores.load()
+        scores.add('alice', 5)
+        scores.write_snapshot(*scores.compact())
+        scores.add('alice', 2)
+        scores = self.reopen(scores)
+        self.assertEqual(scores.get('alice'), 7)
+
+    def test_crash_before_old_journal_removed(self):
+        scores = ScoreJournal(self.directory)
+        scores.load()
+        scores.add('alice', 5)
+        snapshot, sequence = scores.compact()
+        # Write the snapshot but leave the old journal behind, as if the
+        # bot died between the two steps.
+        with open(os.path.join(self.directory, SNAPSHOT_NAME), 'w') as f:
+            json.dump({'version': 2, 'sequence': sequence,
+                       'scores': snapshot}, f)
+        scores = self.reopen(scores)
+        self.assertEqual(scores.get('alice'), 5)
+        scores.add('alice', 1)
+        scores = self.reopen(scores)
+        self.assertEqual(scores.get('alice'), 6)
+
+    def test_old_snapshot_and_torn_journal(self):
+        with open(os.path.join(self.directory, SNAPSHOT_NAME), 'w') as f:
+            json.dump({'alice': 4}, f)
+        with open(os.path.join(self.directory, JOURNAL_NAME), 'w') as f:
+            f.write('{"u": "alice", "p": 1, "n": 1, "t": 0}\n{"u": "al')
+        scores = ScoreJournal(self.directory)
+        scores.load()
+        self.assertEqual(scores.get('alice'), 5)
+        scores.add('alice', 1)
+        scores = self.reopen(scores)
+        self.assertEqual(scores.get('alice'), 6)
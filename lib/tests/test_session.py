@@ -0,0 +1,156 @@
+from unittest import TestCase
+
+from twisted.internet.task import Clock
+
+from lib.metrics import Registry
+from lib.pacing import Pacer
+from lib.session import GameSession, RETRY_DELAY
+
+
+class FakeOutput(object):
+
+    def __init__(self):
+        self.dropped = []
+
+    def drop(self, dest, key):
+        self.dropped.append((dest, key))
+
+
+class FakeTelemetry(object):
+
+    def __init__(self):
+        self.events = []
+
+    def asked(self, question_id):
+        self.events.append(('asked', question_id))
+
+    def solved(self, question_id, clues, seconds):
+        self.events.append(('solved', question_id, clues))
+
+    def skipped(self, question_id):
+        self.events.append(('skipped', question_id))
+
+
+class FakeScores(object):
+
+    def __init__(self):
+        self.added = []
+
+    def add(self, user, points):
+        self.added.append((user, points))
+
+
+class FakePrefetcher(object):
+
+    def __init__(self):
+        self.next_id = 0
+        self.failures = 0
+
+    def get(self):
+        if self.failures:
+            self.failures -= 1
+            raise IOError("can't read questions")
+        question_id = self.next_id
+        self.next_id += 1
+        return question_id, 'question {}'.format(question_id), 'answer'
+
+
+class FakeBot(object):
+
+    def __init__(self):
+        self.lines = []
+        self._output = FakeOutput()
+        self._telemetry = FakeTelemetry()
+        self._scores = FakeScores()
+        self._metrics = Registry()
+        self._prefetcher = FakePrefetcher()
+
+    def _cmsg(self, dest, msg, priority=None, key=None, tracked=False):
+        self.lines.append(msg)
+
+
+class TestGameSession(TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.bot = FakeBot()
+        pacer = Pacer([30, 20, 10, 10], 10, adaptive=False)
+        self.session = GameSession(self.bot, '#trivia', pacer, 5,
+                                   self.clock, self.clock.seconds)
+        self.session.start()
+
+    def delay(self):
+        calls = self.clock.getDelayedCalls()
+        self.assertEqual(len(calls), 1)
+        return calls[0].getTime() - self.clock.seconds()
+
+    def test_clue_intervals(self):
+        self.assertEqual(self.delay(), 0)
+        self.clock.advance(0)
+        self.assertTrue(self.bot.lines[-1].startswith('Next question:'))
+        delays = []
+        for i in range(4):
+            delays.append(self.delay())
+            self.clock.advance(delays[-1])
+        self.assertEqual(delays, [30, 20, 10, 10])
+        self.assertTrue(self.bot.lines[-1].startswith('No one got it.'))
+        # The next question comes after the gap.
+        self.assertEqual(self.delay(), 5)
+        self.clock.advance(5)
+        self.assertEqual(self.bot._telemetry.events,
+                         [('asked', 0), ('asked', 1)])
+
+    def test_gap_after_win(self):
+        self.clock.advance(0)
+        self.clock.advance(30)
+        self.session.guess('alice', 'answer')
+        self.assertEqual(self.bot._scores.added, [('alice', 3)])
+        self.assertEqual(self.bot._telemetry.events,
+                         [('asked', 0), ('solved', 0, 1)])
+        self.assertEqual(self.delay(), 5)
+        # Nothing can be guessed until the next question is asked.
+        self.session.guess('bob', 'answer')
+        self.assertEqual(self.bot._scores.added, [('alice', 3)])
+        self.clock.advance(5)
+        self.assertEqual(self.bot._telemetry.events[-1], ('asked', 1))
+
+    def test_skip(self):
+        self.clock.advance(0)
+        self.session.skip()
+        self.assertEqual(self.bot._telemetry.events,
+                         [('asked', 0), ('skipped', 0)])
+        self.assertEqual(self.bot._metrics.counter('skips').value, 1)
+        # The next question is asked straight away.
+        self.assertEqual(self.delay(), 0)
+        self.clock.advance(0)
+        self.assertEqual(self.bot._telemetry.events[-1], ('asked', 1))
+
+    def test_no_skip_between_questions(self):
+        self.clock.advance(0)
+        self.session.guess('alice', 'answer')
+        lines = len(self.bot.lines)
+        for user in ('alice', 'bob', 'carol'):
+            self.session.vote(user)
+        self.session.skip()
+        self.assertEqual(len(self.bot.lines), lines)
+        self.assertEqual(self.bot._telemetry.events,
+                         [('asked', 0), ('solved', 0, 0)])
+        self.assertEqual(self.bot._metrics.counter('skips').value, 0)
+        self.assertEqual(self.delay(), 5)
+
+    def test_stop_cancels_timer(self):
+        self.clock.advance(0)
+        self.assertTrue(self.session.stop())
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        self.assertFalse(self.session.stop())
+        self.assertTrue(self.session.start())
+
+    def test_fetch_failure_is_retried(self):
+        self.bot._prefetcher.failures = 2
+        self.clock.advance(0)
+        self.assertTrue(self.session.running)
+        self.assertEqual(self.delay(), RETRY_DELAY)
+        self.clock.advance(RETRY_DELAY)
+        self.clock.advance(RETRY_DELAY)
+        self.assertEqual(self.bot._telemetry.events, [('asked', 0)])
+        self.assertEqual(self.delay(), 30)
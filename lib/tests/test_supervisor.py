@@ -0,0 +1,108 @@
+from unittest import TestCase
+
+from twisted.internet.task import Clock
+
+from lib.supervisor import (Supervisor, apply_shard, shard_argument,
+                            MAX_RESTART_DELAY, STABLE_AFTER)
+
+
+class FakeWorker(object):
+
+    def __init__(self, args):
+        self.args = args
+        self.signals = []
+
+    def signalProcess(self, signal):
+        self.signals.append(signal)
+
+
+class FakeReactor(Clock):
+
+    def __init__(self):
+        Clock.__init__(self)
+        self.spawned = []
+        self.stopped = False
+        self.triggers = []
+
+    def spawnProcess(self, protocol, executable, args, env, path):
+        worker = FakeWorker(args)
+        self.spawned.append(worker)
+        return worker
+
+    def addSystemEventTrigger(self, phase, event, function):
+        self.triggers.append((phase, event, function))
+
+    def stop(self):
+        self.stopped = True
+
+
+class FakeConfig(object):
+
+    SHARDS = [{'GAME_CHANNELS': ['#one']},
+              {'GAME_CHANNELS': ['#two'], 'SERVER': 'irc.example.org'}]
+    GAME_CHANNELS = ['#trivia']
+    SERVER = 'irc.freenode.net'
+
+
+class TestShardArguments(TestCase):
+
+    def test_shard_argument(self):
+        self.assertEqual(shard_argument(['trivia.py']), None)
+        self.assertEqual(shard_argument(['trivia.py', '--shard', '1']), 1)
+        self.assertRaises(ValueError, shard_argument,
+                          ['trivia.py', '--shard'])
+        self.assertRaises(ValueError, shard_argument,
+                          ['trivia.py', '--shard', 'one'])
+
+    def test_apply_shard(self):
+        config = FakeConfig()
+        apply_shard(config, 1)
+        self.assertEqual(config.GAME_CHANNELS, ['#two'])
+        self.assertEqual(config.SERVER, 'irc.example.org')
+        self.assertRaises(ValueError, apply_shard, FakeConfig(), 2)
+        self.assertRaises(ValueError, apply_shard, FakeConfig(), -1)
+
+
+class TestSupervisor(TestCase):
+
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.supervisor = Supervisor('trivia.py', 2, self.reactor,
+                                     self.reactor.seconds)
+        self.supervisor.start()
+
+    def test_starts_one_worker_per_shard(self):
+        self.assertEqual([worker.args[-2:] for worker in self.reactor.spawned],
+                         [['--shard', '0'], ['--shard', '1']])
+
+    def test_crash_restarts_with_backoff(self):
+        delays = []
+        for i in range(12):
+            self.supervisor.worker_ended(1, 1)
+            delays.append(self.reactor.getDelayedCalls()[0].getTime() -
+                          self.reactor.seconds())
+            self.reactor.advance(delays[-1])
+            self.assertEqual(self.reactor.spawned[-1].args[-1], '1')
+        self.assertEqual(delays[:4], [1, 2, 4, 8])
+        self.assertEqual(delays[-1], MAX_RESTART_DELAY)
+        # A worker that ran for a while before crashing starts over.
+        self.reactor.advance(STABLE_AFTER + 1)
+        self.supervisor.worker_ended(1, 1)
+        self.assertEqual(self.reactor.getDelayedCalls()[0].getTime() -
+                         self.reactor.seconds(), 1)
+
+    def test_clean_exit_is_not_restarted(self):
+        self.supervisor.worker_ended(0, 0)
+        self.assertFalse(self.reactor.getDelayedCalls())
+        self.assertFalse(self.reactor.stopped)
+        # The supervisor stops with its last worker.
+        self.supervisor.worker_ended(1, 0)
+        self.assertTrue(self.reactor.stopped)
+
+    def test_stop(self):
+        self.supervisor.worker_ended(1, 1)
+        self.supervisor.stop()
+        self.assertEqual(self.reactor.spawned[0].signals, ['TERM'])
+        # Nor is a crashed worker restarted once stopping.
+        self.reactor.advance(MAX_RESTART_DELAY)
+        self.assertEqual(len(self.reactor.spawned), 2)
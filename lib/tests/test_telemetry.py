@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from lib.telemetry import QuestionStats, DEAD_WEIGHT, HEADER, RECORD
+
+
+class FakeQuestions(object):
+
+    def __init__(self, count, stamp='first'):
+        self.questions = [('question {}'.format(i), 'answer')
+                          for i in range(count)]
+        self.stamp = stamp
+
+    def get(self, question_id):
+        return self.questions[question_id]
+
+    def __len__(self):
+        return len(self.questions)
+
+
+class TestQuestionStats(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'telemetry')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_records_events(self):
+        stats = QuestionStats(self.path, FakeQuestions(10))
+        stats.asked(3)
+        stats.solved(3, 1, 12.0)
+        stats.asked(3)
+        stats.solved(3, 3, 20.0)
+        stats.asked(3)
+        stats.skipped(3)
+        # Ids from before a reload are ignored.
+        stats.asked(10)
+        stats.asked(None)
+        self.assertEqual(stats.get(3), (3, 2, 4, 1, 16.0))
+        self.assertEqual(stats.get(4), (0, 0, 0, 0, 0.0))
+        self.assertEqual(os.path.getsize(self.path),
+                         HEADER.size + 10 * RECORD.size)
+
+    def test_persists(self):
+        stats = QuestionStats(self.path, FakeQuestions(10))
+        stats.asked(7)
+        stats.flush()
+        stats.close()
+        stats = QuestionStats(self.path, FakeQuestions(10))
+        self.assertEqual(stats.get(7)[0], 1)
+        stats.close()
+        self.assertEqual(os.listdir(self.directory), ['telemetry'])
+
+    def test_records_follow_questions(self):
+        questions = FakeQuestions(10)
+        stats = QuestionStats(self.path, questions)
+        stats.asked(2)
+        stats.asked(7)
+        stats.asked(8)
+        stats.close()
+        # An edit that keeps the count: question 7 is a new question,
+        # and nothing is carried over to it.
+        questions.questions[7] = ('question 7', 'another answer')
+        questions.stamp = 'second'
+        stats = QuestionStats(self.path, questions)
+        self.assertEqual([stats.get(i)[0] for i in (2, 7, 8)], [1, 0, 1])
+        stats.close()
+        # A question added at the front moves every id along.
+        questions.questions.insert(0, ('question new', 'answer'))
+        questions.stamp = 'third'
+        stats = QuestionStats(self.path, questions)
+        self.assertEqual([stats.get(i)[0] for i in range(11)],
+                         [0, 0, 0, 1, 0, 0, 0, 0, 0, 1, 0])
+        self.assertEqual(os.listdir(self.directory), ['telemetry'])
+
+    def test_weights(self):
+        stats = QuestionStats(self.path, FakeQuestions(10))
+        # Too few asks to judge.
+        stats.asked(0)
+        self.assertEqual(stats.weight(0), 1.0)
+        self.assertEqual(stats.difficulty(0), None)
+        # Never solved.
+        for i in range(3):
+            stats.asked(1)
+        self.assertEqual(stats.difficulty(1), 1.0)
+        self.assertEqual(stats.weight(1), DEAD_WEIGHT)
+        # Always solved before any clue.
+        for i in range(3):
+            stats.asked(2)
+            stats.solved(2, 0, 3.0)
+        self.assertEqual(stats.difficulty(2), 0.0)
+        self.assertEqual(stats.weight(2), 0.5)
+        # Solved half the time, after two clues.
+        for i in range(4):
+            stats.asked(3)
+        stats.solved(3, 2, 40.0)
+        stats.solved(3, 2, 40.0)
+        self.assertEqual(stats.difficulty(3), 0.75)
+        self.assertTrue(stats.weight(3) > stats.weight(2))
+        # Skipping makes a question less likely.
+        weight = stats.weight(3)
+        stats.skipped(3)
+        self.assertTrue(stats.weight(3) < weight)
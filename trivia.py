@@ -22,21 +22,53 @@
 # players, wait some, then continue.
 #
 
-import json
-import string
 import os
 import sys
-from os import execl, listdir, path, makedirs
-from random import choice
+import time
+from functools import partial
+from os import execl, path, makedirs
 from twisted.words.protocols import irc
 from twisted.internet import reactor
+from twisted.internet.threads import deferToThread
 from twisted.internet.protocol import ClientFactory
 from twisted.internet.task import LoopingCall
 
-from lib.answer import Answer
+from lib import checkpoint
+from lib.categories import CategoryIndex, category_name
+from lib.dispatch import parse_command, sanitize
+from lib.flood import FloodControl
+from lib.metrics import Registry, serve
+from lib.outqueue import OutputScheduler, GAME, REPLY, BULK
+from lib.pacing import Pacer
+from lib.prefetch import QuestionPrefetcher
+from lib.questions import QuestionIndex
+from lib.sampler import Deck
+from lib.scores import ScoreJournal
+from lib.session import GameSession
+from lib.supervisor import Supervisor, apply_shard, shard_argument
+from lib.telemetry import QuestionStats
 
 import config
 
+# When the bot started, or began restarting if it was exec'd by ?restart,
+# for timing how long it takes to get back to the channels.
+STARTED_AT = float(os.environ.pop('TRIVIABOT_RESTARTED_AT', time.time()))
+
+# How many questions a fetch draws before giving up, when the ones drawn
+# can't be read because their files were edited.
+FETCH_ATTEMPTS = 20
+
+# Sharded deployments run one worker per entry in SHARDS, started by the
+# supervisor with --shard <n>. A worker's shard settings override the rest
+# of the config.
+try:
+    config.SHARDS
+except:
+    config.SHARDS = []
+config.SHARD = shard_argument(sys.argv)
+if config.SHARD is not None:
+    apply_shard(config, config.SHARD)
+
 if not os.path.exists(config.SAVE_DIR):
     os.makedirs(config.SAVE_DIR)
 
@@ -46,12 +78,122 @@ elif config.USE_SSL.lower() != 'no':
     # USE_SSL wasn't yes and it's not no, so raise an error.
     raise ValueError("USE_SSL must either be 'yes' or 'no'.")
 
+# Older configs name a single channel.
+try:
+    config.GAME_CHANNELS
+except:
+    config.GAME_CHANNELS = [config.GAME_CHANNEL]
+
 # Determine text color
 try:
     config.COLOR_CODE
 except:
     config.COLOR_CODE = ''
 
+# Use the compiled question corpus, if there is one.
+try:
+    config.CORPUS
+except:
+    config.CORPUS = None
+
+# Number of questions to keep loaded ahead of time.
+try:
+    config.PREFETCH_DEPTH
+except:
+    config.PREFETCH_DEPTH = 3
+
+# How often (in seconds) score changes are written to the journal, and
+# how often the journal is folded into a new snapshot.
+try:
+    config.SCORE_COMMIT_INTERVAL
+except:
+    config.SCORE_COMMIT_INTERVAL = 5
+try:
+    config.SCORE_COMPACT_INTERVAL
+except:
+    config.SCORE_COMPACT_INTERVAL = 600
+
+# Where scores are kept: 'journal' (scores.json plus a journal) or
+# 'sqlite' (a database in SAVE_DIR).
+try:
+    config.SCORE_BACKEND
+except:
+    config.SCORE_BACKEND = 'journal'
+if config.SCORE_BACKEND not in ('journal', 'sqlite'):
+    raise ValueError("SCORE_BACKEND must either be 'journal' or 'sqlite'.")
+if config.SHARDS and config.SCORE_BACKEND != 'sqlite':
+    # Workers share scores through one SQLite database in WAL mode.
+    raise ValueError("SHARDS needs SCORE_BACKEND = 'sqlite'.")
+
+# Seconds to wait after the question and after each clue, the short gap
+# before the next question once one is answered or revealed, and the
+# shortest wait that adaptive pacing may choose.
+try:
+    config.CLUE_INTERVALS
+except:
+    config.CLUE_INTERVALS = [config.WAIT_INTERVAL] * 4
+try:
+    config.POST_WIN_DELAY
+except:
+    config.POST_WIN_DELAY = 5
+try:
+    config.MIN_CLUE_INTERVAL
+except:
+    config.MIN_CLUE_INTERVAL = 10
+try:
+    config.ADAPTIVE_PACING
+except:
+    config.ADAPTIVE_PACING = True
+
+# Where metrics are exported, in the Prometheus text format: a file
+# rewritten every METRICS_INTERVAL seconds, and/or an HTTP endpoint on
+# localhost. Both are off by default; ?stats always works.
+try:
+    config.METRICS_FILE
+except:
+    config.METRICS_FILE = None
+try:
+    config.METRICS_PORT
+except:
+    config.METRICS_PORT = None
+try:
+    config.METRICS_INTERVAL
+except:
+    config.METRICS_INTERVAL = 60
+
+# How often (in seconds) to check Q_DIR, or the compiled corpus, for
+# changes and reload the questions. 0 turns it off; ?reload still works.
+try:
+    config.RELOAD_INTERVAL
+except:
+    config.RELOAD_INTERVAL = 60
+
+# Flood control: (rate, burst) for each player's guesses and commands. A
+# player may send burst lines at once, then rate lines a second; the rest
+# are dropped unread. None turns a limit off. Admins are never limited.
+try:
+    config.GUESS_FLOOD_LIMIT
+except:
+    config.GUESS_FLOOD_LIMIT = (2, 6)
+try:
+    config.COMMAND_FLOOD_LIMIT
+except:
+    config.COMMAND_FLOOD_LIMIT = (0.2, 3)
+
+# Pass over questions that nobody ever solves, or that are often skipped,
+# and favour those of middling difficulty, going by how each question has
+# fared before (kept in SAVE_DIR/telemetry).
+try:
+    config.BALANCE_QUESTIONS
+except:
+    config.BALANCE_QUESTIONS = True
+
+# How many players ?standings lists.
+try:
+    config.STANDINGS_SIZE
+except:
+    config.STANDINGS_SIZE = 10
+
 
 class triviabot(irc.IRCClient):
     '''
@@ -62,22 +204,169 @@ class triviabot(irc.IRCClient):
     server.
     '''
 
+    # Commands the bot answers to, mapped to the method that handles them
+    # and whether only admins may use them.
+    commands = {'score': ('_score', False),
+                'help': ('_help', False),
+                'source': ('_show_source', False),
+                'standings': ('_standings', False),
+                'giveclue': ('_give_clue', False),
+                'next': ('_next_vote', False),
+                'skip': ('_next_question', False),
+                'die': ('_die', True),
+                'restart': ('_restart', True),
+                'set': ('_set_user_score', True),
+                'start': ('_start', True),
+                'stop': ('_stop', True),
+                'save': ('_save_game', True),
+                'prefetch': ('_prefetch_stats', True),
+                'queue': ('_queue_stats', True),
+                'stats': ('_stats', True),
+                'profile': ('_profile', True),
+                'reload': ('_reload', True),
+                'category': ('_category', True),
+                'flood': ('_flood_stats', True),
+                }
+
     def __init__(self):
-        self._answer = Answer()
-        self._question = ''
-        self._scores = {}
-        self._clue_number = 0
-        self._admins = list(config.ADMINS)
-        self._admins.append(config.OWNER)
-        self._game_channel = config.GAME_CHANNEL
-        self._current_points = 5
+        self._metrics = self._open_metrics()
+        self._scores = self._open_scores()
+        self._admins = set(config.ADMINS)
+        self._admins.add(config.OWNER)
+        self._flood = FloodControl({'guess': config.GUESS_FLOOD_LIMIT,
+                                    'command': config.COMMAND_FLOOD_LIMIT})
         self._questions_dir = config.Q_DIR
-        self._lc = LoopingCall(self._play_game)
+        self._questions = self._open_questions()
+        self._categories = CategoryIndex.open(self._questions)
+        # The category sampler of each channel that plays only some
+        # categories.
+        self._samplers = {}
+        self._deck = Deck(self._deck_path(), len(self._questions),
+                          self._questions.stamp)
+        self._telemetry = QuestionStats(self._telemetry_path(),
+                                        self._questions)
+        self._prefetcher = QuestionPrefetcher(self._fetch_question,
+                                              config.PREFETCH_DEPTH,
+                                              self._fetch_seconds.observe)
+        self._sessions = {}
+        for channel in config.GAME_CHANNELS:
+            pacer = Pacer(config.CLUE_INTERVALS, config.MIN_CLUE_INTERVAL,
+                          config.ADAPTIVE_PACING)
+            self._sessions[channel] = GameSession(self, channel, pacer,
+                                                  config.POST_WIN_DELAY)
+        self._output = OutputScheduler(self._send_line, reactor.callLater,
+                                       config.LINE_RATE,
+                                       observe=self._line_delay.observe)
+        # cProfile is only loaded once ?profile is used.
+        self._profiler = None
         self._quit = False
         self._restarting = False
         self._load_game()
-        self._votes = 0
-        self._voters = []
+        self._checkpoint = checkpoint.load(self._checkpoint_path())
+        self._score_commit = LoopingCall(self._commit_scores)
+        self._score_commit.start(config.SCORE_COMMIT_INTERVAL, now=False)
+        self._score_compact = LoopingCall(self._compact_scores)
+        self._score_compact.start(config.SCORE_COMPACT_INTERVAL, now=False)
+        self._reloading = False
+        self._question_check = LoopingCall(self._reload_questions)
+        if config.RELOAD_INTERVAL:
+            self._question_check.start(config.RELOAD_INTERVAL, now=False)
+        self._start_metrics_export()
+
+    def _open_metrics(self):
+        '''
+        Creates the metrics registry and the metrics the bot records.
+        '''
+        metrics = Registry()
+        self._messages_received = metrics.counter(
+            'messages_received', 'Channel and private messages received.')
+        self._message_seconds = metrics.histogram(
+            'message_seconds', 'Time to handle a received message.')
+        self._fetch_seconds = metrics.histogram(
+            'question_fetch_seconds', 'Time to draw and read a question.')
+        self._save_seconds = metrics.histogram(
+            'save_seconds', 'Time to write out score changes.')
+        self._shed = {
+            'guess': metrics.counter(
+                'guesses_shed', 'Guesses dropped by flood control.'),
+            'command': metrics.counter(
+                'commands_shed', 'Commands dropped by flood control.'),
+            }
+        self._replies_coalesced = metrics.counter(
+            'replies_coalesced', 'Replies not repeated while still queued.')
+        self._startup_seconds = metrics.gauge(
+            'startup_seconds',
+            'Time from starting, or restarting, to the first channel line.')
+        self._line_delay = metrics.histogram(
+            'line_delay_seconds', 'Time outgoing lines wait to be sent.')
+        metrics.counter('guesses', 'Messages compared with an answer.')
+        metrics.counter('correct_answers', 'Questions answered.')
+        metrics.counter('skips', 'Questions skipped.')
+        metrics.gauge('players', 'Players with a score.',
+                      lambda: len(self._scores))
+        metrics.gauge('send_queue_depth', 'Messages waiting to be sent.',
+                      lambda: self._output.depth())
+        metrics.gauge('questions_broken',
+                      'Question lines left out as broken.',
+                      lambda: getattr(self._questions, 'skipped', 0))
+        return metrics
+
+    def _start_metrics_export(self):
+        self._metrics_export = None
+        self._metrics_port = None
+        if config.METRICS_FILE:
+            self._metrics_export = LoopingCall(self._metrics.write,
+                                               config.METRICS_FILE)
+            self._metrics_export.start(config.METRICS_INTERVAL, now=False)
+        if config.METRICS_PORT:
+            try:
+                self._metrics_port = serve(self._metrics, config.METRICS_PORT)
+            except Exception as e:
+                print("Couldn't serve metrics: {}".format(e))
+
+    def _open_questions(self):
+        '''
+        Opens the compiled corpus if one is configured, otherwise the
+        indexed question files. lib.corpus is only imported if it is
+        used.
+        '''
+        if config.CORPUS and path.exists(config.CORPUS):
+            from lib.corpus import Corpus
+            corpus = Corpus(config.CORPUS)
+            print("{} questions loaded from {}.".format(len(corpus),
+                                                        config.CORPUS))
+            return corpus
+        return QuestionIndex.open(self._questions_dir)
+
+    def _deck_path(self):
+        '''
+        Each shard deals from its own deck.
+        '''
+        if config.SHARD is None:
+            return os.path.join(config.SAVE_DIR, 'deck')
+        return os.path.join(config.SAVE_DIR, 'deck.{}'.format(config.SHARD))
+
+    def _telemetry_path(self):
+        if config.SHARD is None:
+            return os.path.join(config.SAVE_DIR, 'telemetry')
+        return os.path.join(config.SAVE_DIR,
+                            'telemetry.{}'.format(config.SHARD))
+
+    def _checkpoint_path(self):
+        if config.SHARD is None:
+            return os.path.join(config.SAVE_DIR, 'checkpoint.json')
+        return os.path.join(config.SAVE_DIR,
+                            'checkpoint.{}.json'.format(config.SHARD))
+
+    def _open_scores(self):
+        '''
+        Creates the configured score store. sqlite3 is only imported if
+        it is used.
+        '''
+        if config.SCORE_BACKEND == 'sqlite':
+            from lib.scoredb import SqliteScores
+            return SqliteScores(os.path.join(config.SAVE_DIR, 'scores.db'))
+        return ScoreJournal(config.SAVE_DIR)
 
     def _get_nickname(self):
         return self.factory.nickname
@@ -85,73 +374,155 @@ class triviabot(irc.IRCClient):
     nickname = property(_get_nickname)
 
     def _get_lineRate(self):
-        return self.factory.lineRate
+        # Game output is throttled by the output scheduler, which knows
+        # what matters most, so lines handed to IRCClient go straight out.
+        return None
 
     lineRate = property(_get_lineRate)
 
-    def _cmsg(self, dest, msg):
+    def _send_line(self, dest, msg):
+        '''
+        Sends a line from the output scheduler. An action queued by
+        _action() is already a CTCP ACTION query, and goes out as a
+        PRIVMSG like any other line, just as describe() would send it.
+        '''
+        if self.factory.started_at is not None and dest in self._sessions:
+            self._back_in_channel()
+        self.msg(dest, msg)
+
+    def _back_in_channel(self):
+        '''
+        Records how long it took from starting, or from ?restart, to the
+        first line sent to a channel.
+        '''
+        seconds = time.time() - self.factory.started_at
+        self.factory.started_at = None
+        self._startup_seconds.set(seconds)
+        print("First channel line {:.2f}s after starting.".format(seconds))
+
+    def _cmsg(self, dest, msg, priority=REPLY, key=None, tracked=False):
         """
         Write a colorized message.
         """
 
-        self.msg(dest, "{}{}".format(config.COLOR_CODE, msg))
+        self._output.enqueue(dest, "{}{}".format(config.COLOR_CODE, msg),
+                             priority, key, tracked)
 
-    def _gmsg(self, msg):
-        """
-        Write a message to the channel playing the trivia game.
-        """
+    def _action(self, dest, action, priority=REPLY, key=None):
+        '''
+        Queues a colorized /me action.
+        '''
+        self._output.enqueue(dest, irc.ctcpStringify(
+            [('ACTION', "{}{}".format(config.COLOR_CODE, action))]),
+            priority, key)
 
-        self._cmsg(self._game_channel, msg)
-
-    def _play_game(self):
-        '''
-        Implements the main loop of the game.
-        '''
-        points = {0: 5,
-                  1: 3,
-                  2: 2,
-                  3: 1
-                  }
-        if self._clue_number == 0:
-            self._votes = 0
-            self._voters = []
-            self._get_new_question()
-            self._current_points = points[self._clue_number]
-            # Blank line.
-            self._gmsg("")
-            self._gmsg("Next question:")
-            self._gmsg(self._question)
-            self._gmsg("Clue: {}".format(self._answer.current_clue()))
-            self._clue_number += 1
-        # we must be somewhere in between
-        elif self._clue_number < 4:
-            self._current_points = points[self._clue_number]
-            self._gmsg("Question:")
-            self._gmsg(self._question)
-            self._gmsg("Clue: {}".format(self._answer.give_clue()))
-            self._clue_number += 1
-        # no one must have gotten it.
-        else:
-            self._gmsg("No one got it. The answer was: {}"
-                       .format(self._answer.answer))
-            self._clue_number = 0
-            self._get_new_question()
-            # self._lc.reset()
+    def _reply(self, dest, key, lines, priority=REPLY):
+        '''
+        Write a colorized reply of several lines, replacing the same reply
+        if it is still waiting to go to dest.
+        '''
+        self._output.enqueue_all(dest, ["{}{}".format(config.COLOR_CODE, line)
+                                        for line in lines], priority, key)
+
+    def _coalesced(self, dest, key):
+        '''
+        Returns True if a reply is still waiting to go to dest, so asking
+        again needn't build it again.
+        '''
+        if self._output.pending(dest, key):
+            self._replies_coalesced.inc()
+            return True
+        return False
+
+    def _session_for(self, args, user, channel):
+        '''
+        Finds the game a command is about: the channel it was said in, or
+        for private messages, a channel given as the first argument. With
+        only one game, that game is used.
+        '''
+        session = self._sessions.get(channel)
+        if session is None and args and args[0] in self._sessions:
+            session = self._sessions[args[0]]
+        if session is None and len(self._sessions) == 1:
+            session = self._sessions.values()[0]
+        if session is None:
+            self._cmsg(user, "Which channel? One of: {}"
+                       .format(", ".join(sorted(self._sessions))))
+        return session
 
     def signedOn(self):
         '''
         Actions to perform on signon to the server.
         '''
-        self.join(self._game_channel)
         self.msg("NickServ", "identify {}".format(config.IDENT_STRING))
         print("Signed on as {}.".format(self.nickname))
-        if self.factory.running:
-            self._start(None, None, None)
-        else:
-            self._gmsg("Welcome to {}!".format(self._game_channel))
-            self._gmsg("Have an admin start the game when you are ready.")
-            self._gmsg("For how to use this bot, just say ?help or")
-            self._gmsg("{} help.".format(self.nickname))
+        for channel in sorted(self._sessions):
+            self.join(channel)
+        resumed = self._resume()
+        for channel, session in sorted(self._sessions.items()):
+            if channel in resumed:
+                continue
+            if channel in self.factory.running:
+                session.prefetcher.fill()
+                session.start()
+            else:
+                session.say("Welcome to {}!".format(channel))
+                session.say("Have an admin start the game when you are ready.")
+                session.say("For how to use this bot, just say ?help or")
+                session.say("{} help.".format(self.nickname))
+
+    def _resume(self):
+        '''
+        Carries on the games that were running before ?restart, from the
+        checkpoint saved then. Returns the channels resumed.
+        '''
+        state, self._checkpoint = self._checkpoint, None
+        if state is None:
+            return set()
+        if state.get('questions') != self._questions.stamp:
+            # The questions changed while restarting, so the saved ids no
+            # longer name the same questions. The games carry on with the
+            # saved text, and the new deck deals the next questions.
+            state['prefetched'] = []
+            for session_state in state['sessions'].values():
+                session_state['question_id'] = None
+        self._prefetcher.restore([tuple(question)
+                                  for question in state['prefetched']])
+        resumed = set()
+        for channel, session_state in state['sessions'].items():
+            session = self._sessions.get(channel)
+            if session is None:
+                continue
+            if session_state.get('categories'):
+                try:
+                    self._set_categories(session, session_state['categories'])
+                except (KeyError, ValueError):
+                    pass
+            if session.resume(session_state):
+                resumed.add(channel)
+                self.factory.running.add(channel)
+        if resumed:
+            self._prefetcher.fill()
+            for channel in resumed:
+                self._sessions[channel].prefetcher.fill()
+            print("Resumed the games in {}.".format(
+                ", ".join(sorted(resumed))))
+        return resumed
+
+    def _save_checkpoint(self):
+        '''
+        Saves the games being played, and the questions already drawn for
+        them, so the restarted bot carries on where this one stopped.
+        Scores are saved as usual, when the score store is closed.
+        '''
+        sessions = {}
+        for channel, session in self._sessions.items():
+            sessions[channel] = session.checkpoint()
+        checkpoint.save(self._checkpoint_path(),
+                        {'sessions': sessions,
+                         'prefetched': self._prefetcher.buffered(),
+                         'questions': self._questions.stamp,
+                         })
 
     def joined(self, channel):
         '''
@@ -164,56 +535,39 @@ class triviabot(irc.IRCClient):
         Parses out each message and initiates doing the right thing
         with it.
         '''
-        user, temp = user.split('!')
+        start = time.time()
+        self._messages_received.inc()
+        user = user.split('!', 1)[0]
+        # Flooded lines are dropped before anything else is done with
+        # them. Whether a line is a command is only guessed at here.
+        if user not in self._admins:
+            if msg.startswith('?') or msg.lstrip().startswith(self.nickname):
+                kind = 'command'
+            else:
+                kind = 'guess'
+            if not self._flood.allow(user, kind):
+                self._shed[kind].inc()
+                return
         print(user + " : " + channel + " : " + msg)
         # need to strip out non-printable characters if present.
-        printable = string.printable
-        msg = ''.join(filter(lambda x: x in printable, msg))
+        msg = sanitize(msg)
 
         # parses each incoming line, and sees if it's a command for the bot.
         try:
-            if (msg[0] == "?"):
-                command = msg.replace('?', '').split()[0]
-                args = msg.replace('?', '').split()[1:]
-                self.select_command(command, args, user, channel)
+            command = parse_command(msg, self.nickname)
+            if command is not None:
+                self.select_command(command[0], command[1], user, channel)
                 return
-            elif (msg.split()[0].find(self.nickname) == 0):
-                command = msg.split()[1]
-                args = msg.replace(self.nickname, '').split()[2:]
-                self.select_command(command, args, user, channel)
-                return
-            # if not, try to match the message to the answer.
-            else:
-                if msg.lower().strip() == self._answer.answer.lower():
-                    self._winner(user, channel)
-                    self._save_game()
+            # if not, try to match the message to the answer of the game
+            # in that channel.
+            session = self._sessions.get(channel)
+            if session is not None:
+                session.guess(user, msg)
         except Exception as e:
             print(e)
             return
-
-    def _winner(self, user, channel):
-        '''
-        Congratulates the winner for guessing correctly and assigns
-        points appropriately, then signals that it was guessed.
-        '''
-        if channel != self._game_channel:
-            self.msg(channel,
-                     "I'm sorry, answers must be given in the game channel.")
-            return
-        self._gmsg("{} GOT IT!".format(user.upper()))
-        self._gmsg("""If there was any doubt, the correct answer was: {}""".format(self._answer.answer))
-        try:
-            self._scores[user] += self._current_points
-        except:
-            self._scores[user] = self._current_points
-        if self._current_points == 1:
-            self._gmsg("{} point has been added to your score!"
-                       .format(str(self._current_points)))
-        else:
-            self._gmsg("{} points have been added to your score!"
-                       .format(str(self._current_points)))
-        self._clue_number = 0
-        self._get_new_question()
+        finally:
+            self._message_seconds.observe(time.time() - start)
 
     def ctcpQuery(self, user, channel, msg):
         '''
@@ -230,18 +584,20 @@ class triviabot(irc.IRCClient):
         Only responds to the user since there could be a game in
         progress.
         '''
-        try:
-            self._admins.index(user)
-        except:
-            self._cmsg(user, "I'm {}'s trivia bot.".format(config.OWNER))
-            self._cmsg(user, "Commands: score, standings, giveclue, help, "
-                       "next, source")
+        if self._coalesced(user, 'help'):
+            return
+        if user not in self._admins:
+            self._reply(user, 'help', [
+                "I'm {}'s trivia bot.".format(config.OWNER),
+                "Commands: score, standings, giveclue, help, next, source"])
             return
-        self._cmsg(user, "I'm {}'s trivia bot.".format(config.OWNER))
-        self._cmsg(user, "Commands: score, standings, giveclue, help, next, "
-                   "skip, source")
-        self._cmsg(user, "Admin commands: die, set <user> <score>, start, stop, "
-                   "save")
+        self._reply(user, 'help', [
+            "I'm {}'s trivia bot.".format(config.OWNER),
+            "Commands: score, standings, giveclue, help, next, skip, source",
+            "Admin commands: die, set <user> <score>, start [channel], "
+            "stop [channel], save, prefetch, queue, stats, "
+            "profile [seconds], reload, "
+            "category [channel] [off | name[=weight] ...], flood"])
 
     def _show_source(self, args, user, channel):
         '''
@@ -259,131 +615,103 @@ class triviabot(irc.IRCClient):
         Need to differentiate between priviledged users and regular
         users.
         '''
-        # set up command dicts.
-        unpriviledged_commands = {'score': self._score,
-                                  'help': self._help,
-                                  'source': self._show_source,
-                                  'standings': self._standings,
-                                  'giveclue': self._give_clue,
-                                  'next': self._next_vote,
-                                  'skip': self._next_question
-                                  }
-        priviledged_commands = {'die': self._die,
-                                'restart': self._restart,
-                                'set': self._set_user_score,
-                                'start': self._start,
-                                'stop': self._stop,
-                                'save': self._save_game,
-                                }
         print(command, args, user, channel)
         try:
-            self._admins.index(user)
-            is_admin = True
-        except:
-            is_admin = False
+            method, priviledged = self.commands[command]
+        except KeyError:
+            # Only the latest of these waits to go to a channel, so a
+            # burst of unknown commands can't fill the queue.
+            self._action(channel, "looks at {} oddly.".format(user),
+                         key='unknown')
+            return
 
-        # the following takes care of sorting out functions and
-        # priviledges.
-        if not is_admin and command in priviledged_commands:
-            self.msg(channel, "{}: You don't tell me what to do."
-                     .format(user))
+        if priviledged and user not in self._admins:
+            self._output.enqueue(channel, "{}: You don't tell me what to do."
+                                 .format(user), REPLY, 'refused')
             return
-        elif is_admin and command in priviledged_commands:
-            priviledged_commands[command](args, user, channel)
-        elif command in unpriviledged_commands:
-            unpriviledged_commands[command](args, user, channel)
-        else:
-            self.describe(channel, "{}looks at {} oddly."
-                          .format(config.COLOR_CODE, user))
+        getattr(self, method)(args, user, channel)
 
     def _next_vote(self, args, user, channel):
-        '''Implements user voting for the next question.
-
-        Need to keep track of who voted, and how many votes.
-
         '''
-        if not self._lc.running:
-            self._gmsg("We aren't playing right now.")
-            return
-        try:
-            self._voters.index(user)
-            self._gmsg("You already voted, {}, give someone else a chance to "
-                       "hate this question".format(user))
-            return
-        except:
-            if self._votes < 2:
-                self._votes += 1
-                self._voters.append(user)
-                print(self._voters)
-                self._gmsg("{}, you have voted. {} more votes needed to "
-                           "skip.".format(user, str(3 - self._votes)))
-            else:
-                self._votes = 0
-                self._voters = []
-                self._next_question(None, None, None)
+        Votes to skip the current question.
+        '''
+        session = self._session_for(args, user, channel)
+        if session is not None:
+            session.vote(user)
 
     def _start(self, args, user, channel):
         '''
         Starts the trivia game.
-
-        TODO: Load scores from last game, if any.
         '''
-        if self._lc.running:
+        session = self._session_for(args, user, channel)
+        if session is None:
             return
-        else:
-            self._lc.start(config.WAIT_INTERVAL)
-            self.factory.running = True
+        session.prefetcher.fill()
+        if session.start():
+            self.factory.running.add(session.channel)
 
-    def _stop(self, *args):
+    def _stop(self, args, user, channel):
         '''
         Stops the game and thanks people for playing,
         then saves the scores.
         '''
-        if not self._lc.running:
+        session = self._session_for(args, user, channel)
+        if session is None or not session.stop():
             return
-        else:
-            self._lc.stop()
-            self._gmsg('Thanks for playing trivia!')
-            self._gmsg('Current rankings were:')
-            self._standings(None, self._game_channel, None)
-            self._gmsg('''Scores have been saved, and see you next game!''')
-            self._save_game()
-            self.factory.running = False
+        self.factory.running.discard(session.channel)
+        session.say('Thanks for playing trivia!')
+        session.say('Current rankings were:')
+        # Ahead of the game lines that follow, not behind them.
+        self._standings(None, session.channel, None, GAME)
+        session.say('''Scores have been saved, and see you next game!''')
+        self._save_game()
 
     def _save_game(self, *args):
         '''
-        Saves the game to the data directory.
+        Writes pending score changes to the journal and starts folding
+        the journal into a new snapshot.
         '''
-        with open(os.path.join(config.SAVE_DIR, 'scores.json'), 'w') as savefile:
-            json.dump(self._scores, savefile)
-            print("Scores have been saved.")
+        start = time.time()
+        self._scores.flush()
+        self._compact_scores()
+        self._save_seconds.observe(time.time() - start)
+        print("Scores have been saved.")
+
+    def _commit_scores(self):
+        start = time.time()
+        self._scores.flush()
+        self._save_seconds.observe(time.time() - start)
+        self._telemetry.flush()
+
+    def _compact_scores(self):
+        '''
+        Rewrites the score snapshot in a worker thread, so replaying the
+        journal on startup stays quick.
+        '''
+        snapshot = self._scores.compact()
+        if snapshot is None:
+            return
+        d = deferToThread(self._scores.write_snapshot, *snapshot)
+        d.addErrback(self._compact_failed)
+
+    def _compact_failed(self, failure):
+        print("Failed to compact scores: {}".format(failure.getErrorMessage()))
 
     def _load_game(self):
         '''
         Loads the running data from previous games.
         '''
-        # ensure initialization
-        self._scores = {}
         if not path.exists(config.SAVE_DIR):
             print("Save directory doesn't exist.")
             return
-        try:
-            with open(os.path.join(config.SAVE_DIR, 'scores.json'), 'r') as savefile:
-                temp_dict = json.load(savefile)
-        except:
-            print("Save file doesn't exist.")
-            return
-        for name in temp_dict.keys():
-            self._scores[str(name)] = int(temp_dict[name])
-        print(self._scores)
-        print("Scores loaded.")
+        self._scores.load()
 
     def _set_user_score(self, args, user, channel):
         '''
         Administrative action taken to adjust scores, if needed.
         '''
         try:
-            self._scores[args[0]] = int(args[1])
+            self._scores.set(args[0], int(args[1]))
         except:
             self._cmsg(user, args[0] + " not in scores database.")
             return
@@ -410,6 +738,27 @@ class triviabot(irc.IRCClient):
         '''
         global reactor
         if self._restarting:
+            self._save_checkpoint()
+        # A new connection gets new sessions; these must not keep asking
+        # questions into this one.
+        for session in self._sessions.values():
+            session.stop()
+        self._output.stop()
+        if self._profiler is not None and self._profiler.running:
+            self._profiler.stop()
+        self._score_commit.stop()
+        self._score_compact.stop()
+        if self._question_check.running:
+            self._question_check.stop()
+        if self._metrics_export is not None:
+            self._metrics_export.stop()
+        if self._metrics_port is not None:
+            self._metrics_port.stopListening()
+        self._scores.close()
+        self._deck.close()
+        self._telemetry.close()
+        if self._restarting:
+            os.environ['TRIVIABOT_RESTARTED_AT'] = repr(time.time())
             try:
                 execl(sys.executable, *([sys.executable]+sys.argv))
             except Exception as e:
@@ -419,67 +768,360 @@ class triviabot(irc.IRCClient):
 
     def _score(self, args, user, channel):
         '''
-        Tells the user their score.
+        Tells the user their score and rank.
         '''
-        try:
-            self._cmsg(user, "Your current score is: {}"
-                       .format(str(self._scores[user])))
-        except:
+        standing = self._scores.rank(user)
+        if standing is None:
             self._cmsg(user, "You aren't in my database.")
+        else:
+            rank, score = standing
+            self._cmsg(user, "Your current score is: {} (rank {} of {})"
+                       .format(str(score), rank, len(self._scores)))
 
     def _next_question(self, args, user, channel):
         '''
         Administratively skips the current question.
         '''
-        if not self._lc.running:
-            self._gmsg("We are not playing right now.")
+        session = self._session_for(args, user, channel)
+        if session is not None:
+            session.skip()
+
+    def _standings(self, args, user, channel, priority=BULK):
+        '''
+        Tells the user the top of the standings, and where they stand if
+        they aren't in it. A reply at a higher priority than BULK replaces
+        any still waiting, rather than waiting behind it.
+        '''
+        if priority == BULK and self._coalesced(user, 'standings'):
+            return
+        lines = ["The current trivia standings are: "]
+        top = self._scores.top(config.STANDINGS_SIZE)
+        for rank, (player, score) in enumerate(top, start=1):
+            lines.append("{}: {}: {}".format(rank, player, score))
+        standing = self._scores.rank(user)
+        if standing is not None and standing[0] > config.STANDINGS_SIZE:
+            lines.append("...")
+            for rank, player, score in self._scores.around(user, 1):
+                lines.append("{}: {}: {}".format(rank, player, score))
+        self._reply(user, 'standings', lines, priority)
+
+    def _give_clue(self, args, user, channel):
+        if self._coalesced(channel, 'giveclue'):
             return
-        self._gmsg("Question has been skipped. The answer was: {}".format(self._answer.answer))
-        self._clue_number = 0
-        self._lc.stop()
-        self._lc.start(config.WAIT_INTERVAL)
+        session = self._session_for(args, user, channel)
+        if session is not None:
+            session.give_clue(channel)
+
+    def _fetch_question(self):
+        '''
+        Draws the next question from the deck and reads it. Called from
+        the prefetcher's worker thread.
+        '''
+        return self._read_question(self._deck.draw)
 
-    def _standings(self, args, user, channel):
+    def _fetch_category_question(self, channel):
         '''
-        Tells the user the complete standings in the game.
+        Draws a question from a channel's categories and reads it. Called
+        from the worker thread of that channel's prefetcher.
+        '''
+        return self._read_question(self._samplers[channel].draw)
 
-        TODO: order them.
+    def _read_question(self, draw):
+        '''
+        Draws question ids with draw(weight) until one can be read, and
+        returns it as a (question_id, question, answer) tuple. Broken
+        lines are left out when the index is built, so a question only
+        can't be read if its file was edited since; another is drawn, and
+        the questions are reloaded without waiting for the next check.
         '''
-        self._cmsg(user, "The current trivia standings are: ")
-        sorted_scores = sorted(self._scores.iteritems(), key=lambda (k, v): (v, k), reverse=True)
-        for rank, (player, score) in enumerate(sorted_scores, start=1):
-            formatted_score = "{}: {}: {}".format(rank, player, score)
-            self._cmsg(user, formatted_score)
+        questions = self._questions
+        try:
+            for attempt in range(FETCH_ATTEMPTS):
+                question_id = draw(self._question_weight())
+                question = questions.get(question_id)
+                if question is not None:
+                    return (question_id,) + question
+            raise IOError("The question files have changed since they "
+                          "were indexed.")
+        finally:
+            if questions.stale:
+                reactor.callFromThread(self._reload_questions)
 
-    def _give_clue(self, args, user, channel):
-        if not self._lc.running:
-            self._gmsg("we are not playing right now.")
+    def _question_weight(self):
+        '''
+        Returns what the samplers weigh questions by, if anything.
+        '''
+        if config.BALANCE_QUESTIONS:
+            return self._telemetry.weight
+        return None
+
+    def _set_categories(self, session, weights):
+        '''
+        Makes a channel ask only questions from the given categories,
+        {name: weight}, with their own prefetch buffer, or every question
+        again if weights is None. Raises KeyError or ValueError, leaving
+        the channel as it was, if weights names no questions.
+        '''
+        channel = session.channel
+        if weights is None:
+            session.prefetcher = self._prefetcher
+        else:
+            sampler = self._categories.sampler(weights)
+            if session.prefetcher is self._prefetcher:
+                self._samplers[channel] = sampler
+                session.prefetcher = QuestionPrefetcher(
+                    partial(self._fetch_category_question, channel),
+                    config.PREFETCH_DEPTH, self._fetch_seconds.observe)
+            else:
+                session.prefetcher.reset(
+                    partial(self._samplers.__setitem__, channel, sampler))
+        session.categories = weights
+        if session.running:
+            session.prefetcher.fill()
+
+    def _category(self, args, user, channel):
+        '''
+        Shows the categories a channel's game asks from, restricts it to
+        some categories, optionally weighted, or turns that off.
+        '''
+        session = self._session_for(args, user, channel)
+        if session is None:
+            return
+        if args and args[0] == session.channel:
+            args = args[1:]
+        if not args:
+            self._category_stats(session, user)
             return
-        self._cmsg(channel, "Question: ")
-        self._cmsg(channel, self._question)
-        self._cmsg(channel, "Clue: " + self._answer.current_clue())
-
-    def _get_new_question(self):
-        '''
-        Selects a new question from the questions directory and
-        sets it.
-        '''
-        damaged_question = True
-        while damaged_question:
-            # randomly select file
-            filename = choice(listdir(self._questions_dir))
-            fd = open(os.path.join(config.Q_DIR, filename))
-            lines = fd.read().splitlines()
-            myline = choice(lines)
-            fd.close()
+        if args == ['off']:
+            weights = None
+        else:
+            weights = {}
             try:
-                self._question, temp_answer = myline.split('`')
+                for arg in args:
+                    name, _, weight = arg.partition('=')
+                    weight = float(weight or 1)
+                    # NaN fails every comparison, so it is caught too.
+                    if not 0 < weight < float('inf'):
+                        raise ValueError(weight)
+                    weights[category_name(name)] = weight
             except ValueError:
-                print("Broken question:")
-                print(myline)
-                continue
-            self._answer.set_answer(temp_answer.strip())
-            damaged_question = False
+                self._cmsg(user, "Usage: category [channel] "
+                           "[off | name[=weight] ...]")
+                return
+            unknown = [name for name in weights
+                       if name not in self._categories]
+            if unknown:
+                self._cmsg(user, "No such category: {}"
+                           .format(", ".join(sorted(unknown))))
+                return
+        try:
+            self._set_categories(session, weights)
+        except ValueError as e:
+            self._cmsg(user, str(e))
+            return
+        self._category_stats(session, user)
+
+    def _category_stats(self, session, user):
+        if session.categories is None:
+            self._cmsg(user, "{} asks from all {} questions.".format(
+                session.channel, len(self._questions)), BULK)
+        else:
+            playing = []
+            for name, weight in sorted(session.categories.items()):
+                playing.append("{} ({} questions{})".format(
+                    name, self._categories.size(name),
+                    ", weight {:g}".format(weight) if weight != 1 else ""))
+            self._cmsg(user, "{} asks from: {}".format(
+                session.channel, ", ".join(playing)), BULK)
+        self._cmsg(user, "Largest of {} categories: {}".format(
+            len(self._categories), ", ".join(
+                "{} {}".format(name, size)
+                for name, size in self._categories.largest(15))), BULK)
+
+    def _flood_stats(self, args, user, channel):
+        '''
+        Tells an admin how much flood control has dropped, and from whom.
+        '''
+        self._cmsg(user, "Flood control: {} guesses and {} commands dropped, "
+                   "{} replies coalesced, {} players tracked.".format(
+                       self._shed['guess'].value,
+                       self._shed['command'].value,
+                       self._replies_coalesced.value, self._flood.users()))
+        worst = self._flood.worst(5)
+        if worst:
+            self._cmsg(user, "Most dropped: {}".format(", ".join(
+                "{} ({})".format(player, shed) for player, shed in worst)))
+
+    def _prefetch_stats(self, args, user, channel):
+        '''
+        Tells an admin how the question prefetch buffer is doing.
+        '''
+        stats = self._prefetcher.stats()
+        self._cmsg(user, "Prefetch buffer: {depth}/{target_depth} questions, "
+                   "{refills} refills, {misses} misses.".format(**stats))
+        self._cmsg(user, "Refill latency: last {:.1f}ms, mean {:.1f}ms."
+                   .format(stats['last_refill_latency'] * 1000,
+                           stats['mean_refill_latency'] * 1000))
+
+    def _queue_stats(self, args, user, channel):
+        '''
+        Tells an admin how the output queue is doing.
+        '''
+        stats = self._output.stats()
+        self._cmsg(user, "Output queue: {depth} waiting, {lines_sent} lines "
+                   "sent carrying {messages_sent} messages, "
+                   "{messages_dropped} stale messages dropped."
+                   .format(**stats))
+        self._cmsg(user, "Question delay: last {:.2f}s, mean {:.2f}s, "
+                   "max {:.2f}s.".format(stats['question_delay_last'],
+                                         stats['question_delay_mean'],
+                                         stats['question_delay_max']))
+
+    def _stats(self, args, user, channel):
+        '''
+        Tells an admin the bot's metrics.
+        '''
+        for line in self._metrics.summary():
+            self._cmsg(user, line, BULK)
+
+    def _reload(self, args, user, channel):
+        '''
+        Reloads the questions now, if they have changed.
+        '''
+        if not self._reload_questions(user):
+            self._cmsg(user, "Already reloading.")
+
+    def _reload_questions(self, user=None):
+        '''
+        Checks for changed question files in a worker thread and, if
+        there are any, builds the new index there too. Returns False if a
+        reload is already running.
+        '''
+        if self._reloading:
+            return False
+        self._reloading = True
+        d = deferToThread(self._refreshed_questions, self._questions)
+        d.addCallback(self._swap_questions, user)
+        d.addErrback(self._reload_failed, user)
+        return True
+
+    def _refreshed_questions(self, questions):
+        '''
+        Runs in a worker thread. Returns the updated questions, their
+        categories, a deck dealt from them and their question statistics,
+        or None if nothing changed. Dealing a deck writes every id, and
+        carrying the statistics over reads every question, so both are
+        done here rather than on the reactor thread.
+        '''
+        if not questions.changed():
+            return None
+        questions = questions.refresh()
+        return (questions, CategoryIndex.open(questions),
+                Deck(self._deck_path(), len(questions), questions.stamp),
+                QuestionStats(self._telemetry_path(), questions))
+
+    def _swap_questions(self, result, user):
+        '''
+        Puts reloaded questions in place. Runs between fetches, so the
+        questions being asked now are unaffected; the next ones come from
+        the new questions.
+        '''
+        self._reloading = False
+        if result is None:
+            if user is not None:
+                self._cmsg(user, "Questions are up to date.")
+            return
+        questions, categories, deck, telemetry = result
+        old_questions = self._questions
+        filtered = [session for session in self._sessions.values()
+                    if session.prefetcher is not self._prefetcher]
+
+        def swap():
+            self._deck.close()
+            self._questions = questions
+            self._categories = categories
+            # Question ids change with the questions, so the new deck
+            # was dealt for them, the question statistics were moved to
+            # the new ids, and the categories are sampled afresh. Events
+            # recorded since the statistics were moved are lost.
+            self._deck = deck
+            self._telemetry.close()
+            self._telemetry = telemetry
+            for session in self._sessions.values():
+                session.reloaded(questions)
+            for session in filtered:
+                self._resample(session)
+
+        def swap_within(prefetchers):
+            # Every prefetcher is held still while anything changes.
+            if prefetchers:
+                prefetchers[0].reset(partial(swap_within, prefetchers[1:]))
+            else:
+                swap()
+        swap_within([self._prefetcher] +
+                    [session.prefetcher for session in filtered])
+        old_questions.close()
+        print("Reloaded questions: {} now.".format(len(questions)))
+        if user is not None:
+            self._cmsg(user, "Reloaded questions: {} now."
+                       .format(len(questions)))
+
+    def _resample(self, session):
+        '''
+        Points a channel's category sampler at reloaded categories,
+        leaving out any that are gone. With none left, the channel asks
+        from every question again.
+        '''
+        weights = dict((name, weight)
+                       for name, weight in session.categories.items()
+                       if name in self._categories)
+        try:
+            self._samplers[session.channel] = self._categories.sampler(
+                weights)
+            session.categories = weights
+        except ValueError:
+            print("No questions left in the categories of {}."
+                  .format(session.channel))
+            session.categories = None
+            session.prefetcher = self._prefetcher
+
+    def _reload_failed(self, failure, user):
+        self._reloading = False
+        print("Failed to reload questions: {}"
+              .format(failure.getErrorMessage()))
+        if user is not None:
+            self._cmsg(user, "Failed to reload questions: {}"
+                       .format(failure.getErrorMessage()))
+
+    def _profile(self, args, user, channel):
+        '''
+        Profiles the reactor thread for a number of seconds, then saves
+        the profile in SAVE_DIR and tells the admin where the time went.
+        '''
+        if self._profiler is None:
+            from lib.profiler import Profiler
+            self._profiler = Profiler(config.SAVE_DIR)
+        if self._profiler.running:
+            self._cmsg(user, "Already profiling.")
+            return
+        try:
+            seconds = float(args[0]) if args else 30
+        except ValueError:
+            self._cmsg(user, "Usage: profile [seconds]")
+            return
+        seconds = max(1, min(seconds, 600))
+        self._profiler.start()
+        reactor.callLater(seconds, self._profile_done, user)
+        self._cmsg(user, "Profiling for {:g} seconds.".format(seconds))
+
+    def _profile_done(self, user):
+        if not self._profiler.running:
+            return
+        profile_path, elapsed, summary = self._profiler.stop()
+        self._cmsg(user, "Profiled {:.0f}s, saved to {}. Top functions:"
+                   .format(elapsed, profile_path), BULK)
+        for line in summary:
+            self._cmsg(user, line, BULK)
 
 
 class ircbotFactory(ClientFactory):
@@ -487,8 +1129,10 @@ class ircbotFactory(ClientFactory):
 
     def __init__(self, nickname=config.DEFAULT_NICK):
         self.nickname = nickname
-        self.running = False
-        self.lineRate = config.LINE_RATE
+        # Channels with a game running, so they carry on after a reconnect.
+        self.running = set()
+        # Cleared once the first line reaches a channel.
+        self.started_at = STARTED_AT
 
     def clientConnectionLost(self, connector, reason):
         print("Lost connection ({})".format(reason))
@@ -500,9 +1144,12 @@ class ircbotFactory(ClientFactory):
 
 
 if __name__ == "__main__":
+    if config.SHARDS and config.SHARD is None:
+        # Run as the supervisor of one worker process per shard.
+        Supervisor(os.path.abspath(__file__), len(config.SHARDS)).start()
     # SSL will be attempted in all cases unless "NO" is explicity specified
     # in the config
-    if config.USE_SSL.lower() == "no":
+    elif config.USE_SSL.lower() == "no":
         reactor.connectTCP(config.SERVER, config.SERVER_PORT, ircbotFactory())
     else:
         reactor.connectSSL(config.SERVER, config.SERVER_PORT,
@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+
+# Benchmarks the bot's hot paths offline and writes the results as JSON, so
+# runs can be compared across commits:
+#
+#   utils/bench.py -o before.json
+#   ... change things ...
+#   utils/bench.py -o after.json -c before.json
+#
+# With -c, any benchmark more than --tolerance slower than the earlier run
+# is reported and the exit status is 1.
+#
+# The bot is built from example_config.py with SAVE_DIR in a temporary
+# directory, and talks to a StringTransport instead of a server.
+
+import imp
+import json
+import optparse
+import os
+import random
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+
+def measure(function, calls):
+    '''
+    Calls function calls times and returns the timings.
+    '''
+    start = timeit.default_timer()
+    for i in xrange(calls):
+        function()
+    seconds = timeit.default_timer() - start
+    return {'calls': calls,
+            'seconds': seconds,
+            'per_call_us': seconds / calls * 1e6,
+            'per_second': calls / seconds if seconds else None,
+            }
+
+
+class Quiet(object):
+    '''
+    Swallows the bot's console output while a benchmark runs.
+    '''
+
+    def __enter__(self):
+        self._stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+
+    def __exit__(self, *exc_info):
+        sys.stdout.close()
+        sys.stdout = self._stdout
+
+
+def load_config(questions, save_dir, backend):
+    '''
+    Loads example_config.py as the config module trivia.py imports.
+    '''
+    config = imp.load_source('config', os.path.join(ROOT,
+                                                   'example_config.py'))
+    config.Q_DIR = questions
+    config.SAVE_DIR = save_dir
+    config.CORPUS = None
+    config.USE_SSL = 'no'
+    config.SHARDS = []
+    config.SCORE_BACKEND = backend
+    # Simulated players send far faster than flood control allows; the
+    # shed path has its own benchmark.
+    config.GUESS_FLOOD_LIMIT = None
+    config.COMMAND_FLOOD_LIMIT = None
+    sys.modules['config'] = config
+    return config
+
+
+def make_bot(trivia, clock):
+    '''
+    Returns a connected bot whose output goes to a StringTransport, with
+    the output scheduler driven by clock.
+    '''
+    from twisted.test.proto_helpers import StringTransport
+    from lib.outqueue import OutputScheduler
+    bot = trivia.triviabot()
+    bot.factory = trivia.ircbotFactory()
+    bot.makeConnection(StringTransport())
+    bot._output.stop()
+    bot._output = OutputScheduler(bot._send_line, clock.callLater,
+                                  trivia.config.LINE_RATE, clock.seconds)
+    return bot
+
+
+def drain(bot, clock):
+    '''
+    Sends everything queued and empties the transport.
+    '''
+    while bot._output.depth():
+        clock.advance(1)
+    bot.transport.clear()
+
+
+def bench_questions(bot, calls):
+    return {'fetch_question': measure(bot._fetch_question, calls)}
+
+
+def bench_answers(calls):
+    from lib.answer import Answer
+    answers = {'short': 'Paris',
+               'long': 'The Hitchhiker\'s Guide to the Galaxy by Douglas '
+                       'Adams',
+               'symbols': '#$%^&*()_+-=[]{};:",.<>/?\\|~`!@' * 3,
+               }
+    results = {}
+    for name, text in sorted(answers.items()):
+        results['answer_init_' + name] = measure(lambda: Answer(text),
+                                                 calls)
+
+        def clues():
+            answer = Answer(text)
+            for i in range(3):
+                answer.give_clue()
+        results['answer_clues_' + name] = measure(clues, calls)
+    return results
+
+
+def chat_lines(count, nickname):
+    '''
+    Returns a seeded mix of lines a busy channel sends: mostly chat and
+    wrong guesses, with a few commands.
+    '''
+    rng = random.Random(1)
+    words = ['the', 'answer', 'is', 'lol', 'what', 'no', 'idea', 'paris',
+             'london', 'einstein', 'blue', 'seven', '42', 'maybe', 'hmm']
+    lines = []
+    for i in range(count):
+        user = 'player{}!user@host'.format(rng.randrange(200))
+        roll = rng.random()
+        if roll < 0.02:
+            text = rng.choice(['?score', '?giveclue',
+                               '{} score'.format(nickname)])
+        elif roll < 0.6:
+            text = rng.choice(words)
+        else:
+            text = ' '.join(rng.choice(words)
+                            for j in range(rng.randrange(2, 15)))
+            if rng.random() < 0.1:
+                text += '\x02\x03' + rng.choice(string.punctuation)
+        lines.append((user, text))
+    return lines
+
+
+def bench_privmsg(bot, clock, channel, calls):
+    session = bot._sessions[channel]
+    session._running = True
+    session._get_new_question()
+    session._clue_number = 1
+    # Nobody may win, or the rest of the lines would hit the gap between
+    # questions.
+    session._answer.set_answer('xyzzy plugh')
+    lines = chat_lines(calls, bot.nickname)
+    position = [0]
+
+    def privmsg():
+        user, text = lines[position[0]]
+        position[0] += 1
+        bot.privmsg(user, channel, text)
+    result = measure(privmsg, calls)
+    session._running = False
+    drain(bot, clock)
+    return {'privmsg': result}
+
+
+def bench_flood(bot, clock, channel, calls):
+    '''
+    One player pasting guesses, nearly all of which flood control drops.
+    '''
+    from lib.flood import FloodControl
+    flood = bot._flood
+    bot._flood = FloodControl({'guess': (2, 6), 'command': (0.2, 3)})
+
+    def privmsg():
+        bot.privmsg('flooder!user@host', channel, 'is it paris')
+    result = measure(privmsg, calls)
+    bot._flood = flood
+    drain(bot, clock)
+    return {'privmsg_flooded': result}
+
+
+def fill_scores(bot, players):
+    rng = random.Random(players)
+    for i in xrange(players):
+        bot._scores.add('player{}'.format(i), rng.randrange(1, 5000))
+    bot._scores.flush()
+
+
+def bench_scores(trivia, bot, clock, players_list, channel):
+    from twisted.internet import defer
+    # Write snapshots in this thread, so saves are timed end to end.
+    trivia.deferToThread = defer.maybeDeferred
+    results = {}
+    for players in players_list:
+        shutil.rmtree(trivia.config.SAVE_DIR)
+        os.makedirs(trivia.config.SAVE_DIR)
+        bot._scores.close()
+        bot._scores = bot._open_scores()
+        bot._scores.load()
+        fill_scores(bot, players)
+
+        def save_game():
+            # A save with nothing changed since the last one writes no
+            # snapshot, so each timed save follows a point being scored.
+            bot._scores.add('player0', 1)
+            bot._save_game()
+        results['save_game_{}'.format(players)] = measure(save_game, 3)
+
+        def load():
+            bot._scores.close()
+            bot._scores = bot._open_scores()
+            bot._load_game()
+        results['load_game_{}'.format(players)] = measure(load, 3)
+
+        user = 'player{}'.format(players // 2)
+
+        def standings():
+            bot._standings(None, user, channel)
+            drain(bot, clock)
+        results['standings_{}'.format(players)] = measure(standings, 100)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=ROOT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Prints how each benchmark changed since baseline and returns the
+    names of those that got more than tolerance slower.
+    '''
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        before = baseline[name]['per_call_us']
+        after = results[name]['per_call_us']
+        change = (after - before) / before if before else 0.0
+        print('{0:28} {1:12.2f}us -> {2:12.2f}us {3:+7.1%}'.format(
+            name, before, after, change))
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+op = optparse.OptionParser()
+op.add_option('-p', '--path', dest='path', type=str,
+              default=os.path.join(ROOT, 'questions'),
+              help='Directory with question files')
+op.add_option('-o', '--output', dest='output', type=str,
+              default='bench.json', help='JSON file to write results to')
+op.add_option('-c', '--compare', dest='compare', type=str, default=None,
+              help='Earlier results to compare against')
+op.add_option('-t', '--tolerance', dest='tolerance', type=float,
+              default=0.2, help='Slowdown counted as a regression')
+op.add_option('-b', '--backend', dest='backend', type=str,
+              default='journal', help='Score backend: journal or sqlite')
+op.add_option('-n', '--players', dest='players', type=str,
+              default='1000,10000,100000',
+              help='Player counts for the score benchmarks')
+op.add_option('-q', '--quick', dest='quick', action='store_true',
+              default=False, help='Fewer calls, for a smoke test')
+options, args = op.parse_args()
+
+save_dir = tempfile.mkdtemp()
+try:
+    config = load_config(options.path, save_dir, options.backend)
+    with Quiet():
+        import trivia
+        from twisted.internet.task import Clock
+        clock = Clock()
+        bot = make_bot(trivia, clock)
+    channel = config.GAME_CHANNELS[0]
+    calls = 1000 if options.quick else 20000
+    players = [int(count) for count in options.players.split(',')]
+
+    results = {}
+    with Quiet():
+        results.update(bench_questions(bot, calls))
+        results.update(bench_answers(calls))
+        results.update(bench_privmsg(bot, clock, channel, calls * 5))
+        results.update(bench_flood(bot, clock, channel, calls * 5))
+        results.update(bench_scores(trivia, bot, clock, players, channel))
+        bot._deck.close()
+        bot._scores.close()
+finally:
+    shutil.rmtree(save_dir)
+
+report = {'commit': git_commit(),
+          'python': sys.version.split()[0],
+          'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+          'backend': options.backend,
+          'questions': len(bot._questions),
+          'results': results,
+          }
+with open(options.output, 'w') as handle:
+    json.dump(report, handle, indent=1, sort_keys=True)
+
+if options.compare is None:
+    for name in sorted(results):
+        print('{0:28} {1:12.2f}us {2:14.0f}/s'.format(
+            name, results[name]['per_call_us'], results[name]['per_second']))
+else:
+    with open(options.compare) as handle:
+        baseline = json.load(handle)['results']
+    regressions = compare(results, baseline, options.tolerance)
+    if regressions:
+        print('Slower than {0}: {1}'.format(options.compare,
+                                             ', '.join(regressions)))
+        sys.exit(1)
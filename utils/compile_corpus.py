@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+# Compiles the plain text question files into a single packed corpus that
+# the bot memory-maps. Point CORPUS in config.py at the output file.
+
+import logging
+import optparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+from lib.corpus import compile_corpus
+from lib.questions import QuestionIndex
+
+
+logging.basicConfig(format='%(asctime)s\t%(name)s\t%(levelname)s\t%(message)s')
+logger = logging.getLogger('compile_corpus')
+logger.setLevel(logging.INFO)
+
+
+op = optparse.OptionParser()
+op.add_option('-p', '--path', dest='path', type=str,
+              default='questions', help='Directory with question files')
+op.add_option('-o', '--output', dest='output', type=str,
+              default='questions.corpus', help='Compiled corpus to write')
+options, args = op.parse_args()
+
+start = time.time()
+logger.info('Indexing {0} ...'.format(options.path))
+index = QuestionIndex.build(options.path)
+count = compile_corpus(index, options.output)
+logger.info('Wrote {0} questions to {1} in {2:.2f}s'.format(
+    count, options.output, time.time() - start))
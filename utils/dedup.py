@@ -2,13 +2,32 @@
 
 # Short deduplication script. Runs over every file in the target directory and
 # spits out duplicate lines and files which contained them.
+#
+# Files are hashed in parallel and compared by 64 bit line hashes, keeping
+# the first copy of each line in file name order. With -d, each file that
+# had duplicates is rewritten once, atomically.
+#
+# With --near, questions that differ only in case, punctuation, category
+# prefix or answer formatting are grouped too, using MinHash signatures
+# and locality-sensitive hashing (lib/minhash.py). The first question of
+# each group is kept.
 
-from collections import defaultdict
+from array import array
+import hashlib
+import json
 import logging
+import multiprocessing
 import os
 import optparse
-import subprocess
+import struct
 import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+from lib.minhash import NearDuplicateIndex, signature
+from lib.questions import is_valid_line
 
 
 logging.basicConfig(format='%(asctime)s\t%(name)s\t%(levelname)s\t%(message)s')
@@ -16,19 +35,127 @@ logger = logging.getLogger('dedup')
 logger.setLevel(logging.INFO)
 
 
-def collate(d, path):
-    with open(path, "rU") as handle:
+def line_hash(line):
+    '''
+    Returns a 64 bit hash of a line, ignoring its line ending.
+    '''
+    return struct.unpack('<Q', hashlib.md5(line).digest()[:8])[0]
+
+
+def hash_file(path):
+    '''
+    Returns (path, hashes), with the hash of each line of a file in order.
+    Blank lines hash to 0 and are never treated as duplicates.
+    '''
+    hashes = array('L')
+    with open(path, 'rb') as handle:
         for line in handle:
-            d[line].append(path)
+            line = line.rstrip('\r\n')
+            hashes.append(line_hash(line) if line.strip() else 0)
+    return path, hashes
+
+
+def sign_file(path):
+    '''
+    Returns (path, questions), with (line number, question, answer,
+    signature) for each valid line of a file.
+    '''
+    questions = []
+    with open(path, 'rb') as handle:
+        for number, line in enumerate(handle):
+            line = line.rstrip('\r\n')
+            if is_valid_line(line):
+                question, answer = line.split('`')
+                questions.append((number, question, answer,
+                                  signature(question)))
+    return path, questions
+
 
+def rewrite_file(job):
+    '''
+    Drops the given line numbers (counting from 0) from a file. Returns
+    (path, dropped lines). The file is only written if write is set, and
+    is replaced atomically.
+    '''
+    path, drop, write = job
+    dropped = []
+    # A dotfile, so an interrupted run doesn't leave what looks like
+    # another question file behind.
+    directory, name = os.path.split(path)
+    temp_path = os.path.join(directory, '.' + name + '.dedup')
+    out = open(temp_path, 'wb') if write else None
+    try:
+        with open(path, 'rb') as handle:
+            for number, line in enumerate(handle):
+                if number in drop:
+                    dropped.append(line.rstrip('\r\n'))
+                elif out is not None:
+                    out.write(line)
+    finally:
+        if out is not None:
+            out.close()
+    if out is not None:
+        os.rename(temp_path, path)
+    return path, dropped
 
-def readdir(directory):
-    d = defaultdict(list)
+
+def list_files(directory):
+    paths = []
     for root, dirs, files in os.walk(directory):
         for name in files:
-            path = os.path.join(root, name)
-            collate(d, path)
-    return d
+            if not name.startswith('.'):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def find_duplicates(pool, paths):
+    '''
+    Returns {path: set of line numbers to drop}, keeping the first copy
+    of each line.
+    '''
+    seen = set()
+    drops = {}
+    # imap keeps file order, so "first" doesn't depend on which worker
+    # finishes first.
+    for path, hashes in pool.imap(hash_file, paths):
+        for number, value in enumerate(hashes):
+            if not value:
+                continue
+            if value in seen:
+                drops.setdefault(path, set()).add(number)
+            else:
+                seen.add(value)
+    return drops
+
+
+def find_near_duplicates(pool, paths, threshold, clusters_path):
+    '''
+    Returns {path: set of line numbers to drop}, keeping the first
+    question of each group of near-duplicates. The groups are written to
+    clusters_path as JSON if it is set.
+    '''
+    index = NearDuplicateIndex(threshold)
+    places = []
+    for path, questions in pool.imap(sign_file, paths):
+        for number, question, answer, sig in questions:
+            index.add(question, answer, sig)
+            places.append((path, number, question, answer))
+    clusters = index.clusters()
+    drops = {}
+    for cluster in clusters:
+        for member in cluster[1:]:
+            path, number = places[member][:2]
+            drops.setdefault(path, set()).add(number)
+    if clusters_path is not None:
+        with open(clusters_path, 'wb') as handle:
+            json.dump([[[places[member][0], places[member][1] + 1,
+                         places[member][2].decode('utf-8', 'replace'),
+                         places[member][3].decode('utf-8', 'replace')]
+                        for member in cluster]
+                       for cluster in clusters], handle, indent=1)
+    logger.warning('{0} groups of near-duplicates among {1} questions'
+                   .format(len(clusters), len(index)))
+    return drops
 
 
 op = optparse.OptionParser()
@@ -38,6 +165,17 @@ op.add_option('-l', '--log-level', dest='log_level', type=str,
               default='warning', help='Logging output level')
 op.add_option('-d', '--destructive', dest='delete', action="store_true",
               default=False, help='Setting this will delete all but one copy')
+op.add_option('-j', '--jobs', dest='jobs', type=int, default=None,
+              help='Worker processes (default: one per CPU)')
+op.add_option('-n', '--near', dest='near', action='store_true',
+              default=False,
+              help='Group near-duplicate questions, not just identical lines')
+op.add_option('-t', '--threshold', dest='threshold', type=float,
+              default=0.85, help='Similarity for --near (0 to 1)')
+op.add_option('-c', '--clusters', dest='clusters', type=str, default=None,
+              help='With --near, write the groups found to this JSON file, '
+                   'as [file, line, question, answer] lists, the one kept '
+                   'first')
 options, args = op.parse_args()
 
 if options.log_level.upper() in ['DEBUG', 'INFO', 'WARNING', 'ERROR',
@@ -45,24 +183,28 @@ if options.log_level.upper() in ['DEBUG', 'INFO', 'WARNING', 'ERROR',
     logger.setLevel(getattr(logging, options.log_level.upper()))
 
 
+start = time.time()
 logger.info('Reading {0} ...'.format(options.path))
-d = readdir(options.path)
+pool = multiprocessing.Pool(options.jobs)
+paths = list_files(options.path)
+if options.near:
+    drops = find_near_duplicates(pool, paths, options.threshold,
+                                 options.clusters)
+else:
+    drops = find_duplicates(pool, paths)
 
 logger.info("Done. Duplicates:")
-
-for line, paths in d.iteritems():
-    if len(paths) > 1:
+jobs = [(path, drop, options.delete) for path, drop in sorted(drops.items())]
+total = 0
+for path, dropped in pool.imap_unordered(rewrite_file, jobs):
+    total += len(dropped)
+    logger.warning('{0}: {1} duplicate lines{2}'.format(
+        path, len(dropped), ' removed' if options.delete else ''))
+    for line in dropped:
         logger.info(line)
-        logger.info(", ".join(paths))
-        purge = paths[:-1]  # keep the copy in the last file
-        cmd = [ 'sed', '-i', "{/" + line.strip() + "/d}", ] + purge
-        logger.warning(' '.join(cmd)) 
-        if options.delete:
-            proc = subprocess.Popen(cmd,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE,)
-            (out, err) = proc.communicate()
-            if out:
-                logger.info(out)
-            if err:
-                logger.error(err)
+pool.close()
+pool.join()
+
+print('{0} duplicate lines in {1} of {2} files{3}, {4:.2f}s'.format(
+    total, len(drops), len(paths), ' removed' if options.delete else '',
+    time.time() - start))
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+
+# Runs the bot against a stand-in IRC server on localhost, with simulated
+# players chatting, guessing and sending ? commands, and reports:
+#
+#   - how long a correct guess takes to come back as "GOT IT"
+#   - how long a question takes to reach the channel once it is asked
+#   - how many messages wait in the bot's output queue
+#   - CPU time per message sent to the bot
+#
+# Everything the players say, and when, is drawn from --seed, so two runs
+# with the same options send the same traffic. Latencies still depend on
+# the machine.
+
+import imp
+import json
+import optparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from twisted.internet import protocol, reactor
+from twisted.internet.task import LoopingCall
+from twisted.protocols.basic import LineReceiver
+
+SERVER_NAME = 'fake.irc'
+ADMIN = 'loadsim'
+CHAT = ['lol', 'hi all', 'no idea', 'this one is hard', 'brb', 'what?',
+        'is it paris', 'haha', 'good one', 'ugh']
+WRONG = ['paris', 'london', 'einstein', 'blue', 'seven', '42', 'the moon',
+         'napoleon', 'gold', 'shakespeare']
+COMMANDS = ['?score', '?standings', '?giveclue', '?help']
+
+
+def percentiles(values):
+    '''
+    Returns a summary of a list of latencies, in milliseconds.
+    '''
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+
+    def at(fraction):
+        return values[min(len(values) - 1, int(fraction * len(values)))] * 1000
+    return {'count': len(values),
+            'mean_ms': sum(values) / len(values) * 1000,
+            'p50_ms': at(0.5),
+            'p90_ms': at(0.9),
+            'p99_ms': at(0.99),
+            'max_ms': values[-1] * 1000,
+            }
+
+
+class FakeIRCServer(LineReceiver):
+    '''
+    Just enough of an IRC server for the bot: registration, JOIN, PING
+    and PRIVMSG. Lines the bot sends to the channel go to the simulator,
+    and the simulator's players speak through say().
+    '''
+
+    delimiter = '\r\n'
+
+    def connectionMade(self):
+        self.nickname = None
+        self.factory.simulator.server = self
+
+    def lineReceived(self, line):
+        prefix, _, rest = line.partition(' ')
+        command = prefix.upper()
+        if command == 'NICK':
+            self.nickname = rest.strip()
+            self.sendLine(':{} 001 {} :Welcome'.format(SERVER_NAME,
+                                                        self.nickname))
+        elif command == 'JOIN':
+            for channel in rest.split()[0].split(','):
+                self.sendLine(':{}!bot@localhost JOIN {}'
+                              .format(self.nickname, channel))
+                self.factory.simulator.joined(channel)
+        elif command == 'PING':
+            self.sendLine(':{} PONG {}'.format(SERVER_NAME, rest))
+        elif command == 'PRIVMSG':
+            target, _, text = rest.partition(' :')
+            self.factory.simulator.bot_said(target, text)
+
+    def say(self, user, target, text):
+        self.sendLine(':{0}!{0}@localhost PRIVMSG {1} :{2}'
+                      .format(user, target, text))
+
+
+class Simulator(object):
+    '''
+    Plays N players against the bot, at a total of players * rate
+    messages a second.
+    '''
+
+    def __init__(self, options, channel):
+        self.options = options
+        self.channel = channel
+        self.rng = random.Random(options.seed)
+        self.server = None
+        self.bot = None
+        self.started = None
+        self.messages = 0
+        self.correct_guesses = 0
+        self.wins = 0
+        self.questions = 0
+        self.bot_lines = 0
+        self.win_latency = []
+        self.question_latency = []
+        self.backlog = []
+        self._guessed_at = None
+        # Players can only answer a question once it reaches the channel.
+        self._visible = False
+        self._cpu = None
+        self._sampler = LoopingCall(self._sample)
+
+    def joined(self, channel):
+        if channel != self.channel or self.started is not None:
+            return
+        self.server.say(ADMIN, channel, '?start')
+        self.started = time.time()
+        self._cpu = sum(os.times()[:2])
+        self._sampler.start(0.1)
+        self._next_message()
+        reactor.callLater(self.options.duration, self.finish)
+
+    def _session(self):
+        return self.bot._sessions[self.channel]
+
+    def _next_message(self):
+        self._send_message()
+        total_rate = self.options.players * self.options.rate
+        reactor.callLater(self.rng.expovariate(total_rate),
+                          self._next_message)
+
+    def _send_message(self):
+        rng = self.rng
+        player = 'player{}'.format(rng.randrange(self.options.players))
+        roll = rng.random()
+        knows = rng.random() < self.options.know
+        session = self._session()
+        if roll < self.options.commands:
+            text = rng.choice(COMMANDS)
+        elif roll < self.options.commands + self.options.guesses:
+            live = (self._visible and session.running and
+                    session._clue_number > 0)
+            if knows and live:
+                text = session._answer.answer
+                if self._guessed_at is None:
+                    self._guessed_at = time.time()
+                self.correct_guesses += 1
+            else:
+                text = rng.choice(WRONG)
+        else:
+            text = rng.choice(CHAT)
+        self.messages += 1
+        self.server.say(player, self.channel, text)
+
+    def bot_said(self, target, text):
+        if target != self.channel:
+            return
+        self.bot_lines += 1
+        now = time.time()
+        if 'GOT IT!' in text:
+            self.wins += 1
+            if self._guessed_at is not None:
+                self.win_latency.append(now - self._guessed_at)
+            self._guessed_at = None
+            self._visible = False
+        if 'The answer was:' in text:
+            self._visible = False
+        if 'Next question:' in text:
+            self.questions += 1
+            self.question_latency.append(now - self._session()._asked_at)
+            self._visible = True
+
+    def _sample(self):
+        self.backlog.append(self.bot._output.depth())
+
+    def report(self):
+        elapsed = time.time() - self.started
+        cpu = sum(os.times()[:2]) - self._cpu
+        options = self.options
+        return {'options': {'players': options.players,
+                            'rate': options.rate,
+                            'guesses': options.guesses,
+                            'commands': options.commands,
+                            'know': options.know,
+                            'duration': options.duration,
+                            'seed': options.seed,
+                            'line_rate': options.line_rate,
+                            },
+                'elapsed': elapsed,
+                'messages': self.messages,
+                'messages_per_second': self.messages / elapsed,
+                'cpu_seconds': cpu,
+                'cpu_per_message_us': (cpu / self.messages * 1e6
+                                       if self.messages else None),
+                'bot_lines': self.bot_lines,
+                'questions': self.questions,
+                'correct_guesses': self.correct_guesses,
+                'wins': self.wins,
+                'guess_to_win': percentiles(self.win_latency),
+                'question_to_channel': percentiles(self.question_latency),
+                'backlog_mean': (sum(self.backlog) / float(len(self.backlog))
+                                 if self.backlog else 0),
+                'backlog_max': max(self.backlog) if self.backlog else 0,
+                'output_queue': self.bot._output.stats(),
+                }
+
+    def finish(self):
+        self._sampler.stop()
+        self.result = self.report()
+        reactor.stop()
+
+
+def load_config(options, save_dir, port, channel):
+    '''
+    Loads example_config.py as the config module trivia.py imports,
+    pointed at the fake server.
+    '''
+    config = imp.load_source('config', os.path.join(ROOT,
+                                                   'example_config.py'))
+    config.Q_DIR = options.path
+    config.SAVE_DIR = save_dir
+    config.CORPUS = None
+    config.SERVER = '127.0.0.1'
+    config.SERVER_PORT = port
+    config.USE_SSL = 'no'
+    config.SHARDS = []
+    config.GAME_CHANNELS = [channel]
+    config.ADMINS = [ADMIN]
+    config.LINE_RATE = options.line_rate
+    config.CLUE_INTERVALS = [options.interval] * 4
+    config.POST_WIN_DELAY = options.gap
+    sys.modules['config'] = config
+    return config
+
+
+op = optparse.OptionParser()
+op.add_option('-p', '--path', dest='path', type=str,
+              default=os.path.join(ROOT, 'questions'),
+              help='Directory with question files')
+op.add_option('-n', '--players', dest='players', type=int, default=200,
+              help='Number of simulated players')
+op.add_option('-r', '--rate', dest='rate', type=float, default=0.1,
+              help='Messages a second from each player')
+op.add_option('-g', '--guesses', dest='guesses', type=float, default=0.5,
+              help='Fraction of messages that are guesses')
+op.add_option('-c', '--commands', dest='commands', type=float, default=0.02,
+              help='Fraction of messages that are ? commands')
+op.add_option('-k', '--know', dest='know', type=float, default=0.05,
+              help='Chance a guess is the right answer')
+op.add_option('-d', '--duration', dest='duration', type=float, default=60,
+              help='Seconds to run for')
+op.add_option('-s', '--seed', dest='seed', type=int, default=1,
+              help='Seed for everything the players do')
+op.add_option('--line-rate', dest='line_rate', type=float, default=0.4,
+              help='LINE_RATE for the bot')
+op.add_option('--interval', dest='interval', type=float, default=30,
+              help='Seconds between clues')
+op.add_option('--gap', dest='gap', type=float, default=5,
+              help='POST_WIN_DELAY for the bot')
+op.add_option('-o', '--output', dest='output', type=str,
+              default='loadsim.json', help='JSON file to write results to')
+op.add_option('-v', '--verbose', dest='verbose', action='store_true',
+              default=False, help="Show the bot's console output")
+options, args = op.parse_args()
+
+channel = '#loadsim'
+simulator = Simulator(options, channel)
+server_factory = protocol.ServerFactory()
+server_factory.protocol = FakeIRCServer
+server_factory.simulator = simulator
+port = reactor.listenTCP(0, server_factory, interface='127.0.0.1')
+
+save_dir = tempfile.mkdtemp()
+stdout = sys.stdout
+try:
+    load_config(options, save_dir, port.getHost().port, channel)
+    if not options.verbose:
+        sys.stdout = open(os.devnull, 'w')
+    import trivia
+
+    class SimulatedFactory(trivia.ircbotFactory):
+
+        def buildProtocol(self, addr):
+            bot = trivia.ircbotFactory.buildProtocol(self, addr)
+            simulator.bot = bot
+            return bot
+
+        def clientConnectionLost(self, connector, reason):
+            pass
+
+    reactor.connectTCP('127.0.0.1', port.getHost().port, SimulatedFactory())
+    reactor.run()
+finally:
+    if sys.stdout is not stdout:
+        sys.stdout.close()
+        sys.stdout = stdout
+    shutil.rmtree(save_dir)
+
+result = simulator.result
+with open(options.output, 'w') as handle:
+    json.dump(result, handle, indent=1, sort_keys=True)
+print('{messages} messages in {elapsed:.1f}s ({messages_per_second:.0f}/s), '
+      '{cpu_per_message_us:.0f}us CPU each'.format(**result))
+print('{questions} questions, {wins} won, {bot_lines} lines from the bot'
+      .format(**result))
+for name in ('guess_to_win', 'question_to_channel'):
+    summary = result[name]
+    if summary['count']:
+        print('{0}: p50 {1:.1f}ms, p99 {2:.1f}ms, max {3:.1f}ms'.format(
+            name, summary['p50_ms'], summary['p99_ms'], summary['max_ms']))
+print('Output backlog: mean {backlog_mean:.1f}, max {backlog_max}'
+      .format(**result))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+# Checks every line of the question files, in parallel, and writes a clean
+# copy of the questions with only valid, normalized lines, plus a JSON
+# report of every line that was left out and why. Point Q_DIR in config.py
+# at the clean copy.
+
+import json
+import logging
+import multiprocessing
+import optparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+from lib.questions import (CLASSES, VALID, classify, list_question_files,
+                           normalize_line)
+
+
+logging.basicConfig(format='%(asctime)s\t%(name)s\t%(levelname)s\t%(message)s')
+logger = logging.getLogger('validate')
+logger.setLevel(logging.INFO)
+
+
+def validate_file(job):
+    '''
+    Classifies every line of one file, writing the valid ones, normalized,
+    to the output file if there is one. Returns (name, counts, rejected),
+    where rejected lists [line number, class, line] for each bad line.
+    '''
+    source, output, name = job
+    counts = dict((kind, 0) for kind in CLASSES)
+    rejected = []
+    out = None
+    if output is not None:
+        # Dotfiles are never read as question files.
+        temp_path = os.path.join(output, '.' + name + '.tmp')
+        out = open(temp_path, 'wb')
+    try:
+        with open(os.path.join(source, name), 'rb') as handle:
+            for number, line in enumerate(handle, 1):
+                line = line.rstrip('\r\n')
+                kind = classify(line)
+                counts[kind] += 1
+                if kind != VALID:
+                    rejected.append([number, kind,
+                                     line.decode('utf-8', 'replace')])
+                elif out is not None:
+                    out.write(normalize_line(line) + '\n')
+    finally:
+        if out is not None:
+            out.close()
+    if out is not None:
+        os.rename(temp_path, os.path.join(output, name))
+    return name, counts, rejected
+
+
+op = optparse.OptionParser()
+op.add_option('-p', '--path', dest='path', type=str,
+              default='questions', help='Directory with question files')
+op.add_option('-o', '--output', dest='output', type=str, default=None,
+              help='Directory to write the clean question files to')
+op.add_option('-r', '--report', dest='report', type=str,
+              default='validation.json', help='JSON report to write')
+op.add_option('-j', '--jobs', dest='jobs', type=int, default=None,
+              help='Worker processes (default: one per CPU)')
+options, args = op.parse_args()
+
+if options.output is not None:
+    if os.path.abspath(options.output) == os.path.abspath(options.path):
+        op.error('The output directory must differ from the input.')
+    if not os.path.exists(options.output):
+        os.makedirs(options.output)
+
+start = time.time()
+names = [name for name, size, mtime in list_question_files(options.path)]
+jobs = [(options.path, options.output, name) for name in names]
+logger.info('Validating {0} files in {1} ...'.format(len(names),
+                                                   options.path))
+pool = multiprocessing.Pool(options.jobs)
+totals = dict((kind, 0) for kind in CLASSES)
+files = {}
+for name, counts, rejected in pool.imap(validate_file, jobs):
+    for kind, count in counts.iteritems():
+        totals[kind] += count
+    files[name] = {'counts': counts, 'rejected': rejected}
+pool.close()
+pool.join()
+elapsed = time.time() - start
+
+report = {'source': options.path,
+          'output': options.output,
+          'totals': totals,
+          'files': files,
+          'elapsed': elapsed,
+          }
+with open(options.report, 'wb') as handle:
+    json.dump(report, handle, indent=1, sort_keys=True)
+
+for kind in CLASSES:
+    logger.info('{0}: {1}'.format(kind, totals[kind]))
+logger.info('Checked {0} lines in {1:.2f}s, report in {2}'.format(
+    sum(totals.values()), elapsed, options.report))